@@ -1,14 +1,51 @@
-import joblib
-import pandas as pd
+import argparse
+import logging
 
-loaded_pipeline = joblib.load('churn_pipeline.pkl')
+import config
+from batch_scoring import score_partitioned
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, is_dataset, load_chests, load_games
+from inference import load_pipeline
+from parallel_scoring import score_parallel
 
-# возьмем условно новые df
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", default=config.GAMES_DATA, help="csv или каталог parquet (columnar.py)")
+    parser.add_argument("--chests", default=config.CHESTS_DATA)
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--output", help="csv или .parquet; без --memory-budget-mb результат печатается")
+    parser.add_argument("--memory-budget-mb", type=int,
+                        help="считать по частям (бакеты по player_id) в пределах этого бюджета памяти")
+    parser.add_argument("--workers", type=int, default=1, help="число процессов для скоринга")
+    parser.add_argument("--typed", action="store_true",
+                        help="компактные типы (category/float32/datetime64), см. ingest.py")
+    parser.add_argument("--since", help="только события с этой даты (started_at/open_at)")
+    parser.add_argument("--until", help="только события до этой даты, не включая")
+    parser.add_argument("--as-of", help="дата отсчёта days_since_last; по умолчанию текущее время, "
+                                        "с ней повторный прогон даёт те же вероятности")
+    args = parser.parse_args()
 
-new_games_df = pd.read_csv('data/online-games.csv')
-new_chests_df = pd.read_csv('data/chests.csv')
+    if args.memory_budget_mb and (is_dataset(args.games) or is_dataset(args.chests) or args.since or args.until):
+        parser.error("--memory-budget-mb works only with csv input and without --since/--until")
+    # бакеты считаются по одному: с несколькими процессами в памяти было бы по бакету на процесс
+    # и бюджет не выдерживался бы; бакеты читаются обычным read_csv, без компактных типов
+    if args.memory_budget_mb and (args.workers > 1 or args.typed):
+        parser.error("--memory-budget-mb cannot be combined with --workers > 1 or --typed")
 
-probs = loaded_pipeline.predict_proba(new_games_df, new_chests_df)
-print(probs)
+    if args.memory_budget_mb:
+        logging.basicConfig(level=logging.INFO)
+        loaded_pipeline = load_pipeline(args.model)
+        output = args.output or "predictions.csv"
+        rows = score_partitioned(loaded_pipeline, args.games, args.chests, output, args.memory_budget_mb,
+                                 as_of=args.as_of)
+        print(f"{rows} players scored -> {output}")
+    else:
+        # возьмем условно новые df
 
-#probs.to_csv('alldata.csv')
+        new_games_df = load_games(args.games, GAMES_FEATURE_COLUMNS, args.since, args.until, typed=args.typed)
+        new_chests_df = load_chests(args.chests, CHESTS_FEATURE_COLUMNS, args.since, args.until, typed=args.typed)
+
+        probs = score_parallel(args.model, new_games_df, new_chests_df, workers=args.workers, as_of=args.as_of)
+        print(probs)
+
+        if args.output:
+            probs.to_csv(args.output)
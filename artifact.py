@@ -0,0 +1,107 @@
+import argparse
+import json
+import logging
+import os
+
+import lightgbm as lgb
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from pipeline import ChurnPipeline
+
+logger = logging.getLogger(__name__)
+
+# артефакт модели без pickle: каталог с
+#   manifest.json  - версия формата, имена фич, имена файлов
+#   model.txt      - бустер LightGBM в родном текстовом формате
+#   scaler_mean.npy, scaler_scale.npy - параметры StandardScaler
+# массивы открываются через mmap, поэтому несколько воркеров uvicorn делят одни страницы
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class BoosterClassifier:
+    # минимальная замена LGBMClassifier для инференса поверх lgb.Booster
+    def __init__(self, booster):
+        self.booster_ = booster
+
+    def predict_proba(self, X):
+        proba = self.booster_.predict(X)
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X):
+        return (self.booster_.predict(X) > 0.5).astype(int)
+
+
+def is_artifact(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST))
+
+
+def export_artifact(pipeline, directory):
+    if pipeline.feature_names_ is None:
+        raise AttributeError("Pipeline not fitted")
+    os.makedirs(directory, exist_ok=True)
+    booster = pipeline.model.booster_ if hasattr(pipeline.model, "booster_") else pipeline.model
+    booster.save_model(os.path.join(directory, "model.txt"))
+    np.save(os.path.join(directory, "scaler_mean.npy"), np.asarray(pipeline.scaler.mean_, dtype=np.float64))
+    np.save(os.path.join(directory, "scaler_scale.npy"), np.asarray(pipeline.scaler.scale_, dtype=np.float64))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "feature_names": list(pipeline.feature_names_),
+        "model": "model.txt",
+        "scaler_mean": "scaler_mean.npy",
+        "scaler_scale": "scaler_scale.npy",
+        "n_samples_seen": int(pipeline.scaler.n_samples_seen_),
+        "lightgbm_version": lgb.__version__,
+    }
+    # манифест пишется последним: каталог без него не считается артефактом
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Artifact exported to {directory}")
+    return manifest
+
+
+def load_artifact(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format_version')}")
+
+    feature_names = manifest["feature_names"]
+    mean = np.load(os.path.join(directory, manifest["scaler_mean"]), mmap_mode="r", allow_pickle=False)
+    scale = np.load(os.path.join(directory, manifest["scaler_scale"]), mmap_mode="r", allow_pickle=False)
+    if len(mean) != len(feature_names) or len(scale) != len(feature_names):
+        raise ValueError("Scaler parameters do not match feature_names")
+
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.scale_ = scale
+    scaler.var_ = np.square(scale)
+    scaler.n_features_in_ = len(feature_names)
+    scaler.feature_names_in_ = np.array(feature_names, dtype=object)
+    scaler.n_samples_seen_ = manifest.get("n_samples_seen", 0)
+
+    booster = lgb.Booster(model_file=os.path.join(directory, manifest["model"]))
+
+    pipeline = ChurnPipeline(model=BoosterClassifier(booster))
+    pipeline.scaler = scaler
+    pipeline.feature_names_ = feature_names
+    return pipeline
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Экспорт ChurnPipeline из pickle в каталог-артефакт")
+    parser.add_argument("model", nargs="?", default="churn_pipeline.pkl")
+    parser.add_argument("output", nargs="?", default="churn_model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_artifact(joblib.load(args.model), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
+from inference import load_pipeline
+from preprocess import NAT, pair_counts, player_ids, reference_time
+
+logger = logging.getLogger(__name__)
+
+# скоринг всех игроков на много дат отсчёта за один проход: игры (в long-формате) и сундуки
+# один раз разбираются препроцессорами и сортируются по времени, даты идут по возрастанию, и к
+# накопленным по игрокам суммам, счётчикам, гистограммам часа/дня недели, min/max открытия и
+# счётчикам типов сундуков добавляются только события между соседними датами (bincount по срезу).
+# Фичи на дату as_of собираются из накоплений теми же finalize препроцессоров: то же, что
+# predict_proba(события не позже as_of, as_of=as_of), без crosstab и groupby по всей истории на
+# каждую дату. Игры без started_at и сундуки без open_at учитываются с первой даты.
+#   python backfill.py --start 2025-06-01 --end 2025-10-01 --freq 7D --output backfill.csv
+#   python backfill.py --as-of 2025-09-01 2025-10-01
+
+
+def as_of_dates(dates=None, start=None, end=None, freq="7D"):
+    if dates:
+        values = [reference_time(d) for d in dates]
+    else:
+        values = list(pd.date_range(reference_time(start), reference_time(end), freq=freq))
+    return sorted(set(values))
+
+
+class RunningFeatures:
+    # накопленные агрегаты по игрокам; добавление событий - по отсортированным по времени срезам
+    def __init__(self, pipeline, games_df, chests_df):
+        self.games_processor = pipeline.games_processor
+        self.chests_processor = pipeline.chests_processor
+
+        games_long = self.games_processor.to_long(games_df)
+        _, valid0 = player_ids(games_df["users.0._id"])
+        _, valid1 = player_ids(games_df["users.1._id"])
+        started = games_df["started_at"].to_numpy(dtype=np.float64, na_value=np.nan)
+        # секунды эпохи; игры без started_at -> -inf
+        games_ts = np.concatenate([started[valid0], started[valid1]])
+        games_ts[np.isnan(games_ts)] = -np.inf
+        chests = self.chests_processor.normalize(chests_df)
+        # NaT (NAT) сортируется первым, то есть попадает в первую дату
+        chests_ts = chests["open_at"].to_numpy(dtype="datetime64[ns]").view("int64")
+
+        # игроки по возрастанию id, как после groupby препроцессоров
+        codes, self.players = pd.factorize(
+            np.concatenate([games_long["player_id"].to_numpy(), chests["user._id"].to_numpy()]), sort=True)
+        n = len(self.players)
+        games_codes, chests_codes = codes[:len(games_long)], codes[len(games_long):]
+
+        order = np.argsort(games_ts, kind="stable")
+        self.games_ts = games_ts[order]
+        self.games_codes = games_codes[order]
+        self.is_win = games_long["is_win"].to_numpy()[order]
+        self.mean_values = [games_long[col].to_numpy(dtype=np.float64)[order]
+                            for col in self.games_processor.mean_features.values()]
+        # час и день недели с -1 (нет started_at) -> индекс гистограммы со сдвигом на 1
+        self.hours = games_long["start_hour"].to_numpy().astype(np.int64)[order] + 1
+        self.dows = games_long["start_dow"].to_numpy().astype(np.int64)[order] + 1
+
+        order = np.argsort(chests_ts, kind="stable")
+        self.chests_ts = chests_ts[order]
+        self.chests_codes = chests_codes[order]
+        type_codes, self.chest_types = pd.factorize(chests["chest.type"].to_numpy(), sort=True)
+        with_codes, self.open_with = pd.factorize(chests["opened_with"].to_numpy(), sort=True)
+        self.type_codes, self.with_codes = type_codes[order], with_codes[order]
+
+        self.games_played = np.zeros(n, dtype=np.int64)
+        self.wins = np.zeros(n, dtype=np.int64)
+        self.sums = np.zeros((len(self.mean_values), n))
+        self.counts = np.zeros((len(self.mean_values), n), dtype=np.int64)
+        self.hour_hist = np.zeros((n, 25), dtype=np.int64)
+        self.dow_hist = np.zeros((n, 8), dtype=np.int64)
+        self.total_chests = np.zeros(n, dtype=np.int64)
+        self.first_open = np.full(n, np.iinfo(np.int64).max)
+        self.last_open = np.full(n, NAT)
+        self.type_counts = np.zeros((n, len(self.chest_types)), dtype=np.int64)
+        self.with_counts = np.zeros((n, len(self.open_with)), dtype=np.int64)
+        self.games_pos = self.chests_pos = 0
+
+    def advance(self, as_of):
+        # события со временем <= as_of
+        bound = as_of.timestamp()
+        n = len(self.players)
+
+        end = int(np.searchsorted(self.games_ts, bound, side="right"))
+        part = slice(self.games_pos, end)
+        codes = self.games_codes[part]
+        self.games_played += np.bincount(codes, minlength=n)
+        self.wins += np.bincount(codes, weights=self.is_win[part], minlength=n).astype(np.int64)
+        for i, values in enumerate(self.mean_values):
+            values = values[part]
+            known = ~np.isnan(values)
+            self.sums[i] += np.bincount(codes[known], weights=values[known], minlength=n)
+            self.counts[i] += np.bincount(codes[known], minlength=n)
+        self.hour_hist += np.bincount(codes * 25 + self.hours[part], minlength=n * 25).reshape(n, 25)
+        self.dow_hist += np.bincount(codes * 8 + self.dows[part], minlength=n * 8).reshape(n, 8)
+        self.games_pos = end
+
+        end = int(np.searchsorted(self.chests_ts, as_of.value, side="right"))
+        part = slice(self.chests_pos, end)
+        codes, ts = self.chests_codes[part], self.chests_ts[part]
+        self.total_chests += np.bincount(codes, minlength=n)
+        dated = ts != NAT
+        np.minimum.at(self.first_open, codes[dated], ts[dated])
+        np.maximum.at(self.last_open, codes[dated], ts[dated])
+        self.type_counts += pair_counts(codes, self.type_codes[part], n, len(self.chest_types))
+        self.with_counts += pair_counts(codes, self.with_codes[part], n, len(self.open_with))
+        self.chests_pos = end
+
+    def features(self, as_of):
+        # как join препроцессоров в ChurnPipeline.transform
+        rows = np.flatnonzero(self.games_played > 0)
+        agg_feat = pd.DataFrame({
+            "player_id": self.players[rows],
+            "games_played": self.games_played[rows],
+            "wins": self.wins[rows],
+        })
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for i, name in enumerate(self.games_processor.mean_features):
+                counts = self.counts[i, rows]
+                agg_feat[name] = np.where(counts > 0, self.sums[i, rows] / counts, np.nan)
+        # мода: самое частое значение, при равенстве - меньшее (argmax берёт первый максимум)
+        agg_feat["start_hour_mode"] = self.hour_hist[rows].argmax(axis=1) - 1
+        agg_feat["start_dow_mode"] = self.dow_hist[rows].argmax(axis=1) - 1
+        games_features = self.games_processor.finalize(agg_feat)
+
+        rows = np.flatnonzero(self.total_chests > 0)
+        ids = self.players[rows]
+        last = self.last_open[rows]
+        # у игрока только сундуки без open_at: min/max остаются NaT, как в groupby
+        first = np.where(last == NAT, NAT, self.first_open[rows])
+        agg_chests = pd.DataFrame({
+            "user._id": ids,
+            "total_chests": self.total_chests[rows],
+            "unique_chests": (self.type_counts[rows] > 0).sum(axis=1),
+            "last_open": last.view("datetime64[ns]"),
+            "first_open": first.view("datetime64[ns]"),
+        })
+        type_counts = pd.DataFrame(self.type_counts[rows], columns=self.chest_types).add_prefix("chest_")
+        with_counts = pd.DataFrame(self.with_counts[rows], columns=self.open_with).add_prefix("open_with_")
+        chests_features = self.chests_processor.finalize(agg_chests, type_counts, with_counts, as_of)
+        chests_features.index = chests_features.index.astype(str)
+        return games_features.join(chests_features, how="left")
+
+
+def backfill(pipeline, games_df, chests_df, dates):
+    start = time.perf_counter()
+    running = RunningFeatures(pipeline, games_df, chests_df)
+    logger.info(f"Prepared {len(running.players)} players in {time.perf_counter() - start:.2f}s")
+
+    parts = []
+    for as_of in dates:
+        start = time.perf_counter()
+        running.advance(as_of)
+        proba = pipeline.predict_proba_features(running.features(as_of))
+        logger.info(f"{as_of}: {len(proba)} players in {time.perf_counter() - start:.2f}s")
+        parts.append(pd.DataFrame({"player_id": proba.index, "as_of": as_of, "prob_churn": proba.to_numpy()}))
+    if not parts:
+        return pd.DataFrame(columns=["player_id", "as_of", "prob_churn"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Вероятности оттока всех игроков на ряд дат отсчёта")
+    parser.add_argument("--games", default=config.GAMES_DATA, help="csv или каталог parquet (columnar.py)")
+    parser.add_argument("--chests", default=config.CHESTS_DATA)
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--as-of", nargs="+", help="явный список дат")
+    parser.add_argument("--start", help="первая дата ряда")
+    parser.add_argument("--end", help="последняя дата ряда (включительно)")
+    parser.add_argument("--freq", default="7D", help="шаг ряда, как в pd.date_range")
+    parser.add_argument("--output", default="backfill.csv", help="csv или .parquet (нужен pyarrow)")
+    args = parser.parse_args()
+    if not args.as_of and not (args.start and args.end):
+        parser.error("either --as-of or --start/--end is required")
+
+    logging.basicConfig(level=logging.INFO)
+    dates = as_of_dates(args.as_of, args.start, args.end, args.freq)
+    # события после последней даты не нужны
+    until = dates[-1] + pd.Timedelta(seconds=1)
+    games_df = load_games(args.games, GAMES_FEATURE_COLUMNS, end=until, undated=True)
+    chests_df = load_chests(args.chests, CHESTS_FEATURE_COLUMNS, end=until, undated=True)
+
+    result = backfill(load_pipeline(args.model), games_df, chests_df, dates)
+    if args.output.endswith(".parquet"):
+        result.to_parquet(args.output, index=False)
+    else:
+        result.to_csv(args.output, index=False)
+    print(f"{len(result)} rows ({len(dates)} dates) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import glob
+import logging
+import math
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from payload import games_columns, chests_columns
+
+logger = logging.getLogger(__name__)
+
+# пакетный скоринг больших выгрузок по частям:
+# 1) csv читается кусками, строки раскладываются по бакетам hash(player_id) % n_buckets;
+#    игра попадает в бакеты обоих игроков (users.0._id и users.1._id)
+# 2) каждый бакет считается через ChurnPipeline отдельно, в ответ идут только игроки
+#    этого бакета - у них в бакете вся история, у соперников из других бакетов - нет
+# 3) результаты сразу дописываются в csv/parquet
+
+INVALID_IDS = ["unknown", "nan", "none"]
+GAMES_ID_COLUMNS = ["users.0._id", "users.1._id"]
+CHESTS_ID_COLUMNS = ["user._id"]
+
+# во сколько раз данные в pandas вместе с промежуточными frame'ами препроцессинга больше csv
+MEMORY_FACTOR = 10
+
+
+def player_bucket(ids, n_buckets):
+    # бакет считается по той же строке, по которой группируют препроцессоры; -1 - невалидный id
+    ids = pd.Series(ids)
+    as_str = ids.astype(str)
+    valid = ids.notna().to_numpy() & ~as_str.str.lower().str.strip().isin(INVALID_IDS).to_numpy()
+    buckets = pd.util.hash_pandas_object(as_str, index=False).to_numpy() % np.uint64(n_buckets)
+    return np.where(valid, buckets.astype(np.int64), -1)
+
+
+def plan_buckets(paths, memory_budget_mb):
+    total = sum(os.path.getsize(p) for p in paths)
+    budget = memory_budget_mb * 1024 * 1024
+    return max(1, math.ceil(total * MEMORY_FACTOR / budget))
+
+
+def plan_chunk_rows(path, memory_budget_mb, sample_bytes=1 << 20):
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    bytes_per_row = max(1, len(sample) / max(1, sample.count(b"\n")))
+    budget = memory_budget_mb * 1024 * 1024
+    return max(1000, int(budget / (MEMORY_FACTOR * bytes_per_row)))
+
+
+def partition_csv(path, id_columns, workdir, prefix, n_buckets, chunk_rows):
+    dtype = {col: str for col in id_columns}
+    for chunk_no, chunk in enumerate(pd.read_csv(path, chunksize=chunk_rows, dtype=dtype)):
+        buckets = np.stack([player_bucket(chunk[col], n_buckets) for col in id_columns])
+        for b in np.unique(buckets[buckets >= 0]):
+            part = chunk[(buckets == b).any(axis=0)]
+            part.to_pickle(os.path.join(workdir, f"{prefix}_{b}_{chunk_no}.pkl"))
+        logger.info(f"{prefix}: partitioned chunk {chunk_no} ({len(chunk)} rows)")
+
+
+def load_bucket(workdir, prefix, b, columns):
+    files = sorted(glob.glob(os.path.join(workdir, f"{prefix}_{b}_*.pkl")))
+    if not files:
+        return pd.DataFrame(columns=columns)
+    return pd.concat([pd.read_pickle(f) for f in files], ignore_index=True)
+
+
+class ResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._header = True
+        self.rows = 0
+
+    def write(self, proba):
+        frame = proba.rename_axis("player_id").reset_index()
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self.rows == 0 and not self.parquet:
+            pd.DataFrame(columns=["player_id", "prob_churn"]).to_csv(self.path, index=False)
+
+
+def score_partitioned(pipeline, games_path, chests_path, output_path, memory_budget_mb=512, n_buckets=None,
+                      as_of=None):
+    if n_buckets is None:
+        n_buckets = plan_buckets([games_path, chests_path], memory_budget_mb)
+    logger.info(f"Scoring {games_path} in {n_buckets} buckets, budget {memory_budget_mb} MB")
+
+    writer = ResultWriter(output_path)
+    with tempfile.TemporaryDirectory(prefix="churn_buckets_") as workdir:
+        partition_csv(games_path, GAMES_ID_COLUMNS, workdir, "games", n_buckets,
+                      plan_chunk_rows(games_path, memory_budget_mb))
+        partition_csv(chests_path, CHESTS_ID_COLUMNS, workdir, "chests", n_buckets,
+                      plan_chunk_rows(chests_path, memory_budget_mb))
+
+        try:
+            for b in range(n_buckets):
+                games_df = load_bucket(workdir, "games", b, games_columns)
+                if games_df.empty:
+                    continue
+                chests_df = load_bucket(workdir, "chests", b, chests_columns)
+
+                proba = pipeline.predict_proba(games_df, chests_df, as_of=as_of)
+                proba = proba[player_bucket(proba.index.to_series(), n_buckets) == b]
+                writer.write(proba)
+                logger.info(f"Bucket {b + 1}/{n_buckets}: {len(games_df)} games, {len(proba)} players")
+        finally:
+            writer.close()
+    return writer.rows
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+
+import pandas as pd
+
+from inference import PoolSaturated, load_pipeline, payload_frames
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# разделитель между номером запроса и player_id внутри объединённого батча
+TAG_SEP = "\x1f"
+INVALID_IDS = ["unknown", "nan", "none"]
+
+GAMES_ID_COLUMNS = ["users.0._id", "users.1._id"]
+CHESTS_ID_COLUMNS = ["user._id"]
+
+
+def _tag_ids(ids, tag):
+    # невалидные id (nan/none/unknown) не трогаем, чтобы препроцессоры их так же отфильтровали
+    as_str = ids.astype(str)
+    valid = ids.notna() & ~as_str.str.lower().str.strip().isin(INVALID_IDS)
+    return ids.where(~valid, tag + as_str)
+
+
+def merge_frames(frames):
+    # frames: [(key, games_df, chests_df)]; id игроков получают префикс запроса,
+    # поэтому один и тот же игрок из разных запросов агрегируется раздельно
+    games_parts, chests_parts = [], []
+    for key, games_df, chests_df in frames:
+        tag = f"{key}{TAG_SEP}"
+        games_df = games_df.copy()
+        for col in GAMES_ID_COLUMNS:
+            games_df[col] = _tag_ids(games_df[col], tag)
+        chests_df = chests_df.copy()
+        for col in CHESTS_ID_COLUMNS:
+            chests_df[col] = _tag_ids(chests_df[col], tag)
+        games_parts.append(games_df)
+        chests_parts.append(chests_df)
+    return pd.concat(games_parts, ignore_index=True), pd.concat(chests_parts, ignore_index=True)
+
+
+def split_probabilities(proba_series):
+    # обратно к {key: {player_id: prob}}
+    results = {}
+    for tagged_id, prob in proba_series.items():
+        key, player_id = str(tagged_id).split(TAG_SEP, 1)
+        results.setdefault(key, {})[player_id] = prob
+    return results
+
+
+def score_batch(model_path, payloads, as_of=None):
+    # payloads: [(games, chests)]; возвращает для каждого либо dict вероятностей, либо исключение;
+    # as_of - общая дата отсчёта для всех запросов пачки
+    results = [None] * len(payloads)
+    frames = []
+    for i, (games, chests) in enumerate(payloads):
+        try:
+            games_df, chests_df = payload_frames(games, chests)
+            if games_df.empty:
+                raise ValueError("Empty games dataframe - at least 1 game required")
+            frames.append((i, games_df, chests_df))
+        except Exception as e:
+            results[i] = e
+
+    if not frames:
+        return results
+
+    pipeline = load_pipeline(model_path)
+    try:
+        with timed("merge"):
+            games_df, chests_df = merge_frames(frames)
+        logger.info(f"Batch of {len(frames)} requests, Games: {games_df.shape}, Chests: {chests_df.shape}")
+        split = split_probabilities(pipeline.predict_proba(games_df, chests_df, as_of=as_of))
+        for i, _, _ in frames:
+            results[i] = split.get(str(i), {})
+    except Exception as e:
+        # один плохой запрос не должен ронять остальные - считаем по одному
+        logger.warning(f"Batch failed ({e}), scoring requests one by one")
+        for i, games_df, chests_df in frames:
+            try:
+                results[i] = pipeline.predict_proba(games_df, chests_df, as_of=as_of).to_dict()
+            except Exception as item_error:
+                results[i] = item_error
+    return results
+
+
+# /predict/batch: формат ответа -> media type; msgpack и arrow - опциональные зависимости
+BATCH_FORMATS = {
+    "json": "application/json",
+    "msgpack": "application/x-msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("msgpack responses require msgpack: pip install msgpack")
+    return msgpack
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Arrow responses require pyarrow: pip install pyarrow")
+    return pa
+
+
+def batch_format(fmt=None, accept=None):
+    # явный format важнее заголовка Accept; без обоих - json. ValueError - неизвестный формат,
+    # ImportError - формат известен, но библиотеки нет
+    if fmt is None:
+        fmt = next((name for name, media_type in BATCH_FORMATS.items() if accept and media_type in accept), "json")
+    if fmt not in BATCH_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(BATCH_FORMATS)}")
+    if fmt == "msgpack":
+        _msgpack()
+    elif fmt == "arrow":
+        _pyarrow()
+    return fmt
+
+
+def batch_payload(item):
+    # элемент /predict/batch: {"id": ..., "games": [...], "chests": [...]}; ошибка структуры - только у элемента
+    if not isinstance(item, dict):
+        raise ValueError("Item must be a JSON object")
+    games, chests = item.get("games"), item.get("chests") or []
+    if not isinstance(games, list) or not isinstance(chests, list):
+        raise ValueError("games and chests must be lists")
+    if not all(isinstance(record, dict) for record in games) or not all(isinstance(record, dict) for record in chests):
+        raise ValueError("games and chests must be lists of JSON objects")
+    return games, chests
+
+
+def batch_results(ids, results):
+    # ids/results - по элементам запроса; результат - dict вероятностей или исключение
+    rows = []
+    for index, (item_id, result) in enumerate(zip(ids, results)):
+        row = {"index": index}
+        if item_id is not None:
+            row["id"] = item_id
+        if isinstance(result, Exception):
+            row["error"] = str(result)
+        else:
+            row["probabilities"] = result
+        rows.append(row)
+    return rows
+
+
+def encode_msgpack(body):
+    return _msgpack().packb(body, use_bin_type=True)
+
+
+def encode_arrow(body):
+    # длинная таблица, как строки /predict/stream: элемент с ошибкой - одна строка с error,
+    # успешный - по строке на игрока; поля тела кроме results - в метаданных схемы
+    pa = _pyarrow()
+    columns = {"index": [], "id": [], "player_id": [], "prob_churn": [], "error": []}
+    for row in body["results"]:
+        item_id = row.get("id")
+        item_id = None if item_id is None else str(item_id)
+        pairs = [(None, None)] if "error" in row else row["probabilities"].items()
+        for player_id, prob in pairs:
+            columns["index"].append(row["index"])
+            columns["id"].append(item_id)
+            columns["player_id"].append(player_id)
+            columns["prob_churn"].append(prob)
+            columns["error"].append(row.get("error"))
+    schema = pa.schema(
+        [("index", pa.int64()), ("id", pa.string()), ("player_id", pa.string()),
+         ("prob_churn", pa.float64()), ("error", pa.string())],
+        metadata={k: str(v) for k, v in body.items() if k != "results"},
+    )
+    table = pa.Table.from_pydict(columns, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class MicroBatcher:
+    # копит параллельные запросы до max_batch_size или max_wait_ms и отправляет их в пул одним вызовом
+    def __init__(self, pool, model_path, max_batch_size=32, max_wait_ms=5.0, max_queue=1024):
+        self.pool = pool
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._loop = None
+        self._collector = None
+        # loop держит задачи только по слабым ссылкам: без этого набора считающийся батч может
+        # собрать сборщик мусора, и его запросы не дождутся ответа
+        self._tasks = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue(maxsize=self.max_queue)
+                self._loop = loop
+            self._collector = loop.create_task(self._collect())
+
+    async def submit(self, games, chests, as_of=None, model_path=None):
+        # model_path - версия модели, выбранная для запроса (реестр мог её уже сменить); по умолчанию - своя
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait(((games, chests), (model_path or self.model_path, as_of), future))
+        except asyncio.QueueFull:
+            raise PoolSaturated(f"Batch queue is full ({self.max_queue} requests)")
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        # остановка сборщика; ждущие в очереди запросы получают ошибку
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_result(RuntimeError("Batcher is closed"))
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # следующий батч собирается, пока этот считается
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        # запросы с разной моделью или датой отсчёта считаются отдельными вызовами:
+        # модель и as_of общие на вызов score_batch
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+        await asyncio.gather(*(self._run_group(model_path, as_of, items) for (model_path, as_of), items in groups.items()))
+
+    async def _run_group(self, model_path, as_of, batch):
+        payloads = [payload for payload, _, _ in batch]
+        try:
+            results = await self.pool.run(score_batch, model_path, payloads, as_of)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_chests, make_players
+from preprocess import ChestsPreprocessor
+
+# агрегация сундуков на большом логе:
+#   crosstab - прежний путь: normalize (строки на каждую запись), groupby.agg с nunique,
+#              два pd.crosstab и цепочка merge в finalize
+#   bincount - текущий ChestsPreprocessor.transform: факторизация игроков и категорий один раз,
+#              счётчики/nunique/min-max открытия по кодам через bincount
+# каждый вариант - в отдельном процессе, пик RSS берётся из /proc (VmHWM); дата отсчёта фиксирована,
+# поэтому хэши фич вариантов должны совпасть
+# запуск из корня репозитория: python -m benchmarks.bench_chests --chests 10000000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = ["crosstab", "bincount"]
+AS_OF = "2025-11-01"
+
+
+class CrosstabChestsPreprocessor(ChestsPreprocessor):
+    def transform(self, X, as_of=None):
+        df = self.normalize(X)
+
+        agg_chests = df.groupby("user._id").agg(
+            total_chests=("chest.type", "count"),
+            unique_chests=("chest.type", "nunique"),
+            last_open=("open_at", "max"),
+            first_open=("open_at", "min")
+        ).reset_index()
+
+        chest_type_counts = pd.crosstab(df["user._id"], df["chest.type"]).add_prefix("chest_").reset_index()
+        open_with_counts = pd.crosstab(df["user._id"], df["opened_with"]).add_prefix("open_with_").reset_index()
+
+        return self.finalize(agg_chests, chest_type_counts, open_with_counts, as_of)
+
+
+def _peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def run_variant(variant, data_path, repeat):
+    warnings.filterwarnings("ignore")
+    chests = pd.read_pickle(data_path)
+    processor = CrosstabChestsPreprocessor() if variant == "crosstab" else ChestsPreprocessor()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        features = processor.transform(chests, as_of=AS_OF)
+        times.append(time.perf_counter() - start)
+    return {
+        "variant": variant,
+        "transform_s": min(times),
+        "players": len(features),
+        "columns": features.shape[1],
+        "peak_rss_mb": _peak_rss_mb(),
+        "hash": int(pd.util.hash_pandas_object(features, index=True).sum()),
+        "dtypes": [f"{c}:{t}" for c, t in features.dtypes.astype(str).items()],
+    }
+
+
+def prepare(data_path, n_chests, n_players, missing_rate, seed):
+    if os.path.exists(data_path):
+        return
+    print(f"generating {n_chests} chests for {n_players} players...", flush=True)
+    chests = make_chests(n_chests, make_players(n_players, seed=seed), seed=seed + 1)
+    chests = chests.drop(columns="user.username")
+    if missing_rate > 0:
+        rng = np.random.default_rng(seed + 2)
+        for col in ["chest.type", "opened_with", "open_at"]:
+            chests[col] = chests[col].where(rng.random(n_chests) >= missing_rate)
+    chests.to_pickle(data_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chests", type=int, default=10_000_000)
+    parser.add_argument("--players", type=int, default=500_000)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--data-dir", help="каталог для сгенерированного лога; готовый файл переиспользуется")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, os.path.join(args.data_dir, "chests.pkl"), args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        prepare(os.path.join(data_dir, "chests.pkl"), args.chests, args.players, args.missing_rate, args.seed)
+
+        print(f"{'variant':>9} {'transform, s':>13} {'players':>9} {'columns':>8} {'peak RSS':>9}")
+        results = []
+        for variant in args.variants:
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_chests", "--variant", variant,
+                 "--data-dir", data_dir, "--repeat", str(args.repeat)],
+                cwd=ROOT, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{variant:>9} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            print(f"{variant:>9} {r['transform_s']:>13.2f} {r['players']:>9} {r['columns']:>8} {r['peak_rss_mb']:>9.0f}")
+
+        if len(results) > 1:
+            same = len({(r["hash"], tuple(r["dtypes"])) for r in results}) == 1
+            base = results[0]["transform_s"]
+            print(f"identical features: {same}; "
+                  + ", ".join(f"{r['variant']} x{base / r['transform_s']:.1f}" for r in results[1:]))
+
+
+if __name__ == "__main__":
+    main()
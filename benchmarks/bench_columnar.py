@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.synthetic import make_dataset
+from columnar import (CHESTS_FEATURE_COLUMNS, CHESTS_TIME_COLUMN, GAMES_FEATURE_COLUMNS, GAMES_TIME_COLUMN,
+                      convert_csv, load_chests, load_games)
+from ingest import memory_mb
+
+# загрузка выгрузок: csv против parquet-датасета (columnar.py), все колонки против нужных препроцессорам,
+# и parquet с фильтром по последним --window-days дням (отсекаются целые разделы)
+# каждый вариант - в отдельном процессе, пик RSS берётся из /proc (VmHWM); время - лучшее из --repeat
+# запусков, чтобы первый прогон с холодным кэшем страниц не искажал сравнение
+# запуск из корня репозитория: python -m benchmarks.bench_columnar --games 1000000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = ["csv_full", "csv_projected", "parquet_full", "parquet_projected", "parquet_window", "parquet_typed"]
+
+
+def _peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def _dir_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2 ** 20
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 2 ** 20
+
+
+def run_variant(variant, data_dir, window_days):
+    warnings.filterwarnings("ignore")
+    fmt, mode = variant.split("_", 1)
+    if fmt == "csv":
+        games_path, chests_path = os.path.join(data_dir, "games.csv"), os.path.join(data_dir, "chests.csv")
+    else:
+        games_path, chests_path = os.path.join(data_dir, "parquet", "games"), os.path.join(data_dir, "parquet", "chests")
+    games_columns = None if mode == "full" else GAMES_FEATURE_COLUMNS
+    chests_columns = None if mode == "full" else CHESTS_FEATURE_COLUMNS
+
+    start = end = None
+    if mode == "window":
+        with open(os.path.join(data_dir, "range.json")) as f:
+            last_ts = json.load(f)["last_ts"]
+        end = pd.Timestamp(last_ts, unit="s").ceil("D")
+        start = end - pd.Timedelta(days=window_days)
+
+    t0 = time.perf_counter()
+    games = load_games(games_path, games_columns, start, end, typed=mode == "typed")
+    chests = load_chests(chests_path, chests_columns, start, end, typed=mode == "typed")
+    elapsed = time.perf_counter() - t0
+    return {
+        "variant": variant,
+        "load_s": elapsed,
+        "games": len(games),
+        "columns": games.shape[1],
+        "frames_mb": memory_mb(games) + memory_mb(chests),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def prepare(data_dir, n_games, seed):
+    games_csv, chests_csv = os.path.join(data_dir, "games.csv"), os.path.join(data_dir, "chests.csv")
+    if not (os.path.exists(games_csv) and os.path.exists(chests_csv)):
+        print(f"generating {n_games} games...", flush=True)
+        games, chests = make_dataset(n_games, seed=seed)
+        os.makedirs(data_dir, exist_ok=True)
+        games.to_csv(games_csv, index=False)
+        chests.to_csv(chests_csv, index=False)
+        del games, chests
+    parquet_dir = os.path.join(data_dir, "parquet")
+    if not os.path.exists(parquet_dir):
+        print("converting to parquet...", flush=True)
+        t0 = time.perf_counter()
+        convert_csv(games_csv, os.path.join(parquet_dir, "games"), GAMES_TIME_COLUMN)
+        convert_csv(chests_csv, os.path.join(parquet_dir, "chests"), CHESTS_TIME_COLUMN)
+        print(f"  converted in {time.perf_counter() - t0:.1f}s", flush=True)
+    range_path = os.path.join(data_dir, "range.json")
+    if not os.path.exists(range_path):
+        last_ts = float(pd.read_csv(games_csv, usecols=[GAMES_TIME_COLUMN])[GAMES_TIME_COLUMN].max())
+        with open(range_path, "w") as f:
+            json.dump({"last_ts": last_ts}, f)
+    print(f"csv: {_dir_mb(games_csv) + _dir_mb(chests_csv):.0f} MB, "
+          f"parquet: {_dir_mb(parquet_dir):.0f} MB", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--data-dir", help="каталог для csv/parquet; готовые файлы переиспользуются")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.data_dir, args.window_days)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        prepare(data_dir, args.games, args.seed)
+
+        print(f"{'variant':>18} {'load, s':>8} {'games':>9} {'columns':>8} {'frames, MB':>11} {'peak RSS':>9}")
+        for variant in args.variants:
+            runs = []
+            for _ in range(args.repeat):
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_columnar", "--variant", variant,
+                     "--data-dir", data_dir, "--window-days", str(args.window_days)],
+                    cwd=ROOT, capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    break
+                runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            if not runs:
+                print(f"{variant:>18} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+                continue
+            r = min(runs, key=lambda run: run["load_s"])
+            print(f"{variant:>18} {r['load_s']:>8.2f} {r['games']:>9} {r['columns']:>8} "
+                  f"{r['frames_mb']:>11.0f} {r['peak_rss_mb']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_dataset
+from engines import make_engine
+from inference import load_pipeline
+
+# движки предсказания на одной и той же масштабированной матрице фич (батчи 1/10/1000/100k игроков)
+# запуск из корня репозитория: python -m benchmarks.bench_engines
+
+
+def best_of(fn, X, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(X)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def feature_rows(pipeline, n_rows, seed=0):
+    # реальные строки фич синтетических игроков, повторённые до нужного размера
+    games, chests = make_dataset(50_000, seed=seed)
+    X, _ = pipeline.feature_matrix(pipeline.games_processor.transform(games), pipeline.chests_processor.transform(chests))
+    rng = np.random.default_rng(seed)
+    return X[rng.integers(0, len(X), size=n_rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 1000, 100_000])
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--engines", nargs="+", default=["sklearn", "booster", "numpy"])
+    parser.add_argument("--threads", type=int, default=1, help="num_threads для booster")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.model)
+    engines = {name: make_engine(name, pipeline.model, args.threads) for name in args.engines}
+    X_all = feature_rows(pipeline, max(args.sizes))
+
+    header = "".join(f"{name + ', ms':>14}" for name in engines)
+    print(f"{'rows':>8}{header}")
+    for n in args.sizes:
+        X = X_all[:n]
+        repeat = 50 if n <= 1000 else 3
+        reference = None
+        line = f"{n:>8}"
+        for name, engine in engines.items():
+            elapsed, proba = best_of(engine.predict, X, repeat)
+            if reference is None:
+                reference = proba
+            else:
+                np.testing.assert_allclose(proba, reference, rtol=0, atol=args.tolerance)
+            line += f"{elapsed * 1000:>14.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_games, to_nested_records
+from payload import games_columns, json_to_df_flatten, json_to_games_df
+
+# flatten_nested_arrays + DataFrame против SchemaExtractor на вложенном json игр
+# запуск из корня репозитория: python -m benchmarks.bench_flatten
+
+
+def as_objects(df):
+    # старый путь оставляет None в пустых числовых колонках, новый - nan
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+
+def best_of(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    records = to_nested_records(make_games(max(args.sizes)))
+
+    print(f"{'games':>8} {'flatten, ms':>12} {'extractor, ms':>14} {'speedup':>8}")
+    for n in args.sizes:
+        payload = records[:n]
+        pd.testing.assert_frame_equal(
+            as_objects(json_to_df_flatten(payload, games_columns)),
+            as_objects(json_to_games_df(payload, games_columns)),
+        )
+        t_old = best_of(json_to_df_flatten, payload, games_columns, repeat=args.repeat)
+        t_new = best_of(json_to_games_df, payload, games_columns, repeat=args.repeat)
+        print(f"{n:>8} {t_old * 1000:>12.2f} {t_new * 1000:>14.2f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
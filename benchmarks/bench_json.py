@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import warnings
+
+from benchmarks.synthetic import make_dataset, to_nested_records
+
+# задержка /predict от размера тела: REQUEST_PARSING=strict (pydantic валидирует каждую игру, ответ -
+# jsonable_encoder + json.dumps) против fast (orjson, только проверка структуры, ответ через orjson).
+# Для каждого режима поднимается отдельный uvicorn; кроме полной задержки берётся стадия parse
+# из /metrics (чтение тела и разбор до готового RequestData), кэш выключен
+# запуск из корня репозитория: python -m benchmarks.bench_json --sizes 10 100 1000 10000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ["strict", "fast"]
+PARSE_SUM = re.compile(r'^churn_stage_seconds_sum\{stage="parse"\} (\S+)$', re.M)
+PARSE_COUNT = re.compile(r'^churn_stage_seconds_count\{stage="parse"\} (\S+)$', re.M)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_bodies(sizes, seed):
+    # тело с n играми подряд и сундуками их игроков (не больше 0.7 на игру, как в data/)
+    games, chests = make_dataset(max(sizes), seed=seed)
+    bodies = {}
+    for n in sizes:
+        part = games.iloc[:n]
+        players = set(part["users.0._id"]) | set(part["users.1._id"])
+        part_chests = chests[chests["user._id"].isin(players)].iloc[:int(n * 0.7)]
+        body = {"games": to_nested_records(part), "chests": to_nested_records(part_chests)}
+        bodies[n] = json.dumps(body, default=lambda o: o.item()).encode()
+    return bodies
+
+
+def _parse_stage(url):
+    text = urllib.request.urlopen(url + "/metrics", timeout=10).read().decode()
+    total, count = PARSE_SUM.search(text), PARSE_COUNT.search(text)
+    return (float(total.group(1)), int(float(count.group(1)))) if total and count else (0.0, 0)
+
+
+def run_mode(mode, bodies, repeat, model_path):
+    port = _free_port()
+    env = dict(os.environ, MODEL_PATH=model_path, PREDICT_CACHE_SIZE="0", REQUEST_PARSING=mode,
+               INFERENCE_TIMEOUT_SEC="600")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(url + "/metrics", timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"server ({mode}) did not start")
+                time.sleep(0.2)
+
+        for n, body in bodies.items():
+            request = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(request, timeout=600).read()  # прогрев
+            parse_before = _parse_stage(url)
+            latencies = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                players = len(json.loads(urllib.request.urlopen(request, timeout=600).read())["probabilities"])
+                latencies.append(time.perf_counter() - start)
+            parse_after = _parse_stage(url)
+            count = parse_after[1] - parse_before[1]
+            results[n] = {
+                "p50_s": statistics.median(latencies),
+                "parse_s": (parse_after[0] - parse_before[0]) / count if count else None,
+                "players": players,
+            }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="игр в одном запросе")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    bodies = make_bodies(sorted(args.sizes), args.seed)
+    results = {mode: run_mode(mode, bodies, args.repeat, args.model) for mode in args.modes}
+
+    header = f"{'games':>7} {'body, KB':>9} {'players':>8}"
+    for mode in args.modes:
+        header += f" {mode + ' p50, ms':>16} {mode + ' parse, ms':>17}"
+    print(header)
+    for n, body in bodies.items():
+        line = f"{n:>7} {len(body) / 1024:>9.0f} {results[args.modes[0]][n]['players']:>8}"
+        for mode in args.modes:
+            r = results[mode][n]
+            parse = r["parse_s"] * 1000 if r["parse_s"] is not None else float("nan")
+            line += f" {r['p50_s'] * 1000:>16.1f} {parse:>17.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_chests import CrosstabChestsPreprocessor
+from benchmarks.synthetic import make_dataset
+from ingest import memory_mb, read_chests_csv, read_games_csv
+from preprocess import ChestsPreprocessor, GamesPreprocessor, epoch_to_datetime
+
+# пиковая память предобработки на большой истории:
+#   legacy - прежние to_long/normalize (полная копия X, object-строки id, float64-флаги пропусков)
+#            и агрегация сундуков через crosstab
+#   lean   - текущие препроцессоры на обычном pd.read_csv
+#   typed  - текущие препроцессоры на ingest.read_*_csv (category, float32, даты разобраны при загрузке)
+# каждый вариант - в отдельном процессе, пик RSS берётся из /proc (VmHWM)
+# запуск из корня репозитория: python -m benchmarks.bench_memory --games 1000000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = ["legacy", "lean", "typed"]
+
+
+class LegacyGamesPreprocessor(GamesPreprocessor):
+    def to_long(self, X):
+        df = X.copy()
+
+        df["users.0._id"] = df["users.0._id"].astype(str)
+        df["users.1._id"] = df["users.1._id"].astype(str)
+
+        df["isRematch"] = df["isRematch"].fillna(0).astype(int)
+        for col in self.end_stats_cols:
+            df[col + "_missing"] = df[col].isna().astype(int)
+            df[col] = df[col].fillna(0)
+
+        df.drop(columns=self.exclude_dt, inplace=True, errors='ignore')
+        df["game_finished"] = df["ended_at"].notna().astype(int)
+        df["has_winner"] = df["winner"].notna().astype(int)
+
+        for c in ["users.1.username", "users.1._id", "users.1.created_at"]:
+            df[c] = df[c].fillna("unknown")
+        for c in ["users.1.seconds_in_game", "users.1.online.online_sessions",
+                  "users.1.online_game_rating.value", "users.1.energy.count"]:
+            df[c + "_missing"] = df[c].isna().astype(int)
+            df[c] = df[c].fillna(0)
+
+        df["users.0.username"] = df["users.0.username"].fillna("unknown")
+        df["users.0.online_game_rating.value_missing"] = df["users.0.online_game_rating.value"].isna().astype(int)
+        df["users.0.online_game_rating.value"] = df["users.0.online_game_rating.value"].fillna(0)
+
+        df["started_at_dt"] = epoch_to_datetime(df["started_at"])
+        df["ended_at_dt"] = epoch_to_datetime(df["ended_at"])
+        df["users.0.created_at"] = pd.to_datetime(df["users.0.created_at"], errors='coerce').dt.tz_localize(None)
+        df["users.1.created_at"] = pd.to_datetime(df["users.1.created_at"], errors='coerce').dt.tz_localize(None)
+
+        df["duration_sec"] = (df["ended_at_dt"] - df["started_at_dt"]).dt.total_seconds().clip(lower=0).fillna(0)
+        df["start_hour"] = df["started_at_dt"].dt.hour.fillna(-1).astype(int)
+        df["start_dow"] = df["started_at_dt"].dt.dayofweek.fillna(-1).astype(int)
+        df["user0_account_age_days"] = (df["started_at_dt"] - df["users.0.created_at"]).dt.days.fillna(0)
+        df["user1_account_age_days"] = (df["started_at_dt"] - df["users.1.created_at"]).dt.days.fillna(0)
+
+        p0 = df[["users.0._id", "isRematch", "game_finished", "has_winner", "duration_sec"] + self.p0_stats_cols
+                + ["start_hour", "start_dow", "user0_account_age_days"]].rename(columns={"users.0._id": "player_id"}).copy()
+        p0 = p0[p0["player_id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
+        p1_stats = [c[:-1] + "1" for c in self.p0_stats_cols]
+        p1 = df[["users.1._id", "isRematch", "game_finished", "has_winner", "duration_sec"] + p1_stats
+                + ["start_hour", "start_dow", "user1_account_age_days"]].rename(columns={"users.1._id": "player_id"}).copy()
+        p1 = p1[p1["player_id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
+
+        players_long = pd.concat([p0, p1], ignore_index=True)
+        players_long["is_win"] = (players_long["has_winner"] == 1).astype(int)
+        return players_long
+
+
+class LegacyChestsPreprocessor(CrosstabChestsPreprocessor):
+    def normalize(self, X):
+        df = X.copy()
+        df["user._id"] = df["user._id"].astype(str)
+        df["opened_with"] = (
+            df["opened_with"].fillna("unknown").astype(str).str.strip().str.lower()
+            .replace({"game store": "store", "gamestore": "store", "shop": "store"})
+        )
+        df["chest.type"] = df["chest.type"].astype(str).str.strip().str.lower()
+        df["open_at"] = epoch_to_datetime(df["open_at"])
+        return df[df["user._id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
+
+
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def _reset_peak_rss():
+    # сброс VmHWM (Linux 4.0+), чтобы пик считался только для предобработки
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def run_variant(variant, games_csv, chests_csv):
+    warnings.filterwarnings("ignore")
+    start = time.perf_counter()
+    if variant == "typed":
+        games, chests = read_games_csv(games_csv), read_chests_csv(chests_csv)
+    else:
+        games, chests = pd.read_csv(games_csv), pd.read_csv(chests_csv)
+    load_s = time.perf_counter() - start
+    gc.collect()
+    result = {
+        "variant": variant,
+        "load_s": load_s,
+        "frames_mb": memory_mb(games) + memory_mb(chests),
+        "loaded_rss_mb": _proc_status_mb("VmRSS"),
+        "load_peak_rss_mb": _proc_status_mb("VmHWM"),
+    }
+    reset = _reset_peak_rss()
+
+    if variant == "legacy":
+        games_processor, chests_processor = LegacyGamesPreprocessor(), LegacyChestsPreprocessor()
+    else:
+        games_processor, chests_processor = GamesPreprocessor(), ChestsPreprocessor()
+    start = time.perf_counter()
+    games_features = games_processor.transform(games)
+    chests_features = chests_processor.transform(chests)
+    result["transform_s"] = time.perf_counter() - start
+    result["peak_rss_mb"] = _proc_status_mb("VmHWM")
+    if reset:
+        result["transform_extra_mb"] = result["peak_rss_mb"] - result["loaded_rss_mb"]
+    result["players"] = len(games_features)
+    result["checksum"] = float(np.nansum(games_features.to_numpy(dtype=float))
+                               + np.nansum(chests_features.drop(columns="days_since_last").to_numpy(dtype=float)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--data-dir", help="каталог для csv; если там уже есть games.csv/chests.csv, они переиспользуются")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        games_csv, chests_csv = os.path.join(args.data_dir, "games.csv"), os.path.join(args.data_dir, "chests.csv")
+        print(json.dumps(run_variant(args.variant, games_csv, chests_csv)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        games_csv, chests_csv = os.path.join(data_dir, "games.csv"), os.path.join(data_dir, "chests.csv")
+        if not (os.path.exists(games_csv) and os.path.exists(chests_csv)):
+            print(f"generating {args.games} games...", flush=True)
+            games, chests = make_dataset(args.games, seed=args.seed, missing_rate=args.missing_rate)
+            os.makedirs(data_dir, exist_ok=True)
+            games.to_csv(games_csv, index=False)
+            chests.to_csv(chests_csv, index=False)
+            del games, chests
+
+        print(f"{'variant':>8} {'load, s':>8} {'frames, MB':>11} {'loaded RSS':>11} {'load peak':>10} "
+              f"{'transform, s':>13} {'peak RSS':>9} {'+transform':>11} {'players':>8}")
+        results = []
+        for variant in args.variants:
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_memory", "--variant", variant, "--data-dir", data_dir],
+                cwd=ROOT, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{variant:>8} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            extra = r.get("transform_extra_mb")
+            print(f"{variant:>8} {r['load_s']:>8.1f} {r['frames_mb']:>11.0f} {r['loaded_rss_mb']:>11.0f} "
+                  f"{r['load_peak_rss_mb']:>10.0f} {r['transform_s']:>13.1f} {r['peak_rss_mb']:>9.0f} "
+                  f"{extra if extra is not None else float('nan'):>11.0f} {r['players']:>8}")
+
+        checksums = {r["variant"]: r["checksum"] for r in results}
+        if len(checksums) > 1:
+            values = list(checksums.values())
+            print(f"feature checksums: {checksums} (max rel diff {np.ptp(values) / max(abs(values[0]), 1):.2e})")
+
+
+if __name__ == "__main__":
+    main()
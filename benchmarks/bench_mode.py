@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_games
+from preprocess import GamesPreprocessor, epoch_to_datetime, groupby_mode
+
+# сравнение старой lambda-моды и groupby_mode на синтетических играх
+# запуск из корня репозитория: python -m benchmarks.bench_mode
+
+
+def legacy_modes(players_long):
+    return players_long.groupby("player_id", as_index=False).agg(
+        start_hour_mode=("start_hour", lambda x: x.mode().iloc[0] if not x.mode().empty else -1),
+        start_dow_mode=("start_dow", lambda x: x.mode().iloc[0] if not x.mode().empty else -1),
+    ).set_index("player_id")
+
+
+def vectorized_modes(players_long):
+    return pd.DataFrame({
+        "start_hour_mode": groupby_mode(players_long, "player_id", "start_hour"),
+        "start_dow_mode": groupby_mode(players_long, "player_id", "start_dow"),
+    }).sort_index()
+
+
+def players_long_from_games(games):
+    started = epoch_to_datetime(games["started_at"])
+    hour = started.dt.hour.fillna(-1).astype(int)
+    dow = started.dt.dayofweek.fillna(-1).astype(int)
+    parts = []
+    for side in ("users.0._id", "users.1._id"):
+        part = pd.DataFrame({"player_id": games[side], "start_hour": hour, "start_dow": dow})
+        parts.append(part[part["player_id"].notna()])
+    out = pd.concat(parts, ignore_index=True)
+    out["player_id"] = out["player_id"].astype(str)
+    return out
+
+
+def timed(fn, *args, repeat=1):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-transform", action="store_true", help="не мерить полный GamesPreprocessor.transform")
+    args = parser.parse_args()
+
+    print(f"{'games':>10} {'players':>9} {'legacy, s':>11} {'vectorized, s':>14} {'speedup':>8} {'transform, s':>13}")
+    for n in args.sizes:
+        games = make_games(n)
+        players_long = players_long_from_games(games)
+
+        t_legacy, legacy = timed(legacy_modes, players_long, repeat=args.repeat)
+        t_vec, vec = timed(vectorized_modes, players_long, repeat=args.repeat)
+        pd.testing.assert_frame_equal(legacy, vec, check_dtype=False, check_names=False)
+
+        t_transform = float("nan")
+        if not args.skip_transform:
+            t_transform, _ = timed(GamesPreprocessor().transform, games)
+
+        print(f"{n:>10} {players_long['player_id'].nunique():>9} {t_legacy:>11.3f} {t_vec:>14.3f} "
+              f"{t_legacy / t_vec:>7.1f}x {t_transform:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
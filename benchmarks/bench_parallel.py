@@ -0,0 +1,47 @@
+import argparse
+import os
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.synthetic import make_dataset
+from inference import load_pipeline
+from parallel_scoring import score_parallel
+
+# пропускная способность score_parallel на 1/2/4/8 процессах против последовательного predict_proba
+# запуск из корня репозитория: python -m benchmarks.bench_parallel --games 200000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    games, chests = make_dataset(args.games)
+
+    pipeline = load_pipeline(args.model)
+    pipeline.predict_proba(games.head(1000), chests.head(1000))  # прогрев
+    start = time.perf_counter()
+    serial = pipeline.predict_proba(games, chests)
+    t_serial = time.perf_counter() - start
+    players = len(serial)
+
+    print(f"{args.games} games, {len(chests)} chests, {players} players, {os.cpu_count()} CPU")
+    print(f"{'workers':>8} {'time, s':>9} {'players/s':>10} {'games/s':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {t_serial:>9.2f} {players / t_serial:>10.0f} {args.games / t_serial:>10.0f} {1:>7.2f}x")
+    for workers in args.workers:
+        start = time.perf_counter()
+        proba = score_parallel(args.model, games, chests, workers=workers)
+        elapsed = time.perf_counter() - start
+        # результат должен совпадать с последовательным побитово
+        pd.testing.assert_series_equal(proba, serial, check_exact=True)
+        print(f"{workers:>8} {elapsed:>9.2f} {players / elapsed:>10.0f} {args.games / elapsed:>10.0f} "
+              f"{t_serial / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
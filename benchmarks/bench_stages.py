@@ -0,0 +1,62 @@
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_dataset
+from inference import load_pipeline
+
+# задержка по стадиям инференса: препроцессоры, сборка матрицы фич и модель.
+# "dataframe" - старый путь (join + replace/fillna + reindex + scaler + LGBMClassifier.predict_proba),
+# "matrix" - feature_matrix (float32, масштабирование на месте) + booster.predict
+# запуск из корня репозитория: python -m benchmarks.bench_stages
+
+
+def best_of(fn, *args, repeat=5):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def dataframe_assemble(pipeline, games_features, chests_features):
+    games_features.index = games_features.index.astype(str)
+    chests_features.index = chests_features.index.astype(str)
+    return pipeline.transform_features(games_features.join(chests_features, how="left"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 30_000], help="число игр в запросе")
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.model)
+
+    print(f"{'games':>7} {'players':>8} {'games, ms':>10} {'chests, ms':>11} "
+          f"{'df build, ms':>13} {'df model, ms':>13} {'mx build, ms':>13} {'mx model, ms':>13} {'speedup':>8}")
+    for n in args.sizes:
+        games, chests = make_dataset(n, n_players=max(2, n // 25))
+        t_games, games_features = best_of(pipeline.games_processor.transform, games, repeat=args.repeat)
+        t_chests, chests_features = best_of(pipeline.chests_processor.transform, chests, repeat=args.repeat)
+
+        t_df, features = best_of(dataframe_assemble, pipeline, games_features.copy(), chests_features.copy(),
+                                 repeat=args.repeat)
+        t_df_model, proba_df = best_of(lambda: pipeline.model.predict_proba(features)[:, 1], repeat=args.repeat)
+
+        t_mx, (X, _) = best_of(pipeline.feature_matrix, games_features, chests_features, repeat=args.repeat)
+        t_mx_model, proba_mx = best_of(pipeline.model.booster_.predict, X, repeat=args.repeat)
+
+        np.testing.assert_allclose(proba_df, proba_mx, rtol=0, atol=1e-9)
+        speedup = (t_df + t_df_model) / (t_mx + t_mx_model)
+        print(f"{n:>7} {len(X):>8} {t_games * 1000:>10.2f} {t_chests * 1000:>11.2f} "
+              f"{t_df * 1000:>13.2f} {t_df_model * 1000:>13.2f} {t_mx * 1000:>13.2f} {t_mx_model * 1000:>13.2f} "
+              f"{speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_dataset, to_nested_records
+from pipeline import ChurnPipeline
+from preprocess import epoch_to_datetime
+from utils import make_churn_labels
+
+# сквозной бенчмарк: препроцессоры, fit/transform/predict_proba, train.py целиком и /predict под нагрузкой.
+# Результат - json с коммитом и версиями пакетов, чтобы сравнивать прогоны между коммитами:
+#   python -m benchmarks.suite --games 100000
+#   python -m benchmarks.suite --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ["games_preprocessor", "chests_preprocessor", "fit", "transform", "predict_proba", "train", "api"]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit or None, dirty
+    except OSError:
+        return None, None
+
+
+def versions():
+    import lightgbm
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "lightgbm": lightgbm.__version__,
+    }
+
+
+def summarize(times, rows=None):
+    times = np.asarray(times, dtype=float)
+    result = {
+        "runs": len(times),
+        "mean_s": float(times.mean()),
+        "p50_s": float(np.percentile(times, 50)),
+        "p95_s": float(np.percentile(times, 95)),
+        "p99_s": float(np.percentile(times, 99)),
+        "max_s": float(times.max()),
+    }
+    if rows:
+        result["rows"] = rows
+        result["rows_per_s"] = rows / result["p50_s"]
+    return result
+
+
+def measure(fn, repeat, rows=None):
+    # время - по repeat прогонам, пик памяти (python/numpy аллокации) - отдельным прогоном под tracemalloc
+    fn()  # прогрев
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    result = summarize(times, rows)
+    tracemalloc.start()
+    try:
+        fn()
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def new_pipeline():
+    pipeline = ChurnPipeline()
+    # без предупреждений LightGBM в выводе бенчмарка; параметры обучения те же
+    pipeline.model.set_params(verbose=-1)
+    return pipeline
+
+
+def churn_labels(games):
+    games = games.assign(started_at_dt=epoch_to_datetime(games["started_at"]))
+    labels = make_churn_labels(games, window_days=60)
+    return labels.set_index("player_id")["churn"]
+
+
+def case_train(games, chests):
+    # train.py как есть, в отдельном процессе на синтетических csv во временном каталоге
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "data"))
+        games.to_csv(os.path.join(tmp, "data", "online-games.csv"), index=False)
+        chests.to_csv(os.path.join(tmp, "data", "chests.csv"), index=False)
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.join(ROOT, "train.py")], cwd=tmp, env=env,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "train.py failed"}
+    result = summarize([elapsed], rows=len(games))
+    # ru_maxrss - максимум по всем завершённым дочерним процессам, в КБ
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def player_payloads(games, chests, n_players, seed=0):
+    # запросы как от клиента: все игры и сундуки одного игрока во вложенном json
+    ids = pd.concat([games["users.0._id"], games["users.1._id"]]).dropna().unique()
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for player_id in rng.choice(ids, size=min(n_players, len(ids)), replace=False):
+        player_games = games[(games["users.0._id"] == player_id) | (games["users.1._id"] == player_id)]
+        player_chests = chests[chests["user._id"] == player_id]
+        body = {"games": to_nested_records(player_games), "chests": to_nested_records(player_chests)}
+        payloads.append(json.dumps(body, default=lambda o: o.item()).encode())
+    return payloads
+
+
+def case_api(games, chests, requests, concurrency, model_path):
+    payloads = player_payloads(games, chests, n_players=min(requests, 200))
+    port = _free_port()
+    # кэш выключен, чтобы мерить скоринг, а не попадания
+    env = dict(os.environ, MODEL_PATH=model_path, PREDICT_CACHE_SIZE="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(url + "/metrics", timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    return {"error": "server did not start"}
+                time.sleep(0.2)
+
+        def post(body):
+            request = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout=60).read()
+                ok = True
+            except OSError:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        post(payloads[0])  # прогрев
+        bodies = [payloads[i % len(payloads)] for i in range(requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(post, bodies))
+        elapsed = time.perf_counter() - start
+
+        latencies = [t for t, ok in results if ok]
+        result = summarize(latencies) if latencies else {}
+        result.update({
+            "requests": requests,
+            "concurrency": concurrency,
+            "errors": sum(1 for _, ok in results if not ok),
+            "requests_per_s": requests / elapsed,
+            "server_peak_rss_mb": _peak_rss_mb(server.pid),
+        })
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def run(args):
+    warnings.filterwarnings("ignore")
+    games, chests = make_dataset(
+        args.games, n_players=args.players, chests_per_game=args.chests_per_game, seed=args.seed,
+        activity_skew=args.activity_skew, missing_rate=args.missing_rate,
+    )
+    labels = churn_labels(games)
+    fitted = new_pipeline().fit(games, chests, labels)
+    processor_games, processor_chests = fitted.games_processor, fitted.chests_processor
+
+    cases = {
+        "games_preprocessor": lambda: measure(lambda: processor_games.transform(games), args.repeat, len(games)),
+        "chests_preprocessor": lambda: measure(lambda: processor_chests.transform(chests), args.repeat, len(chests)),
+        "fit": lambda: measure(lambda: new_pipeline().fit(games, chests, labels), args.repeat, len(games)),
+        "transform": lambda: measure(lambda: fitted.transform(games, chests), args.repeat, len(games)),
+        "predict_proba": lambda: measure(lambda: fitted.predict_proba(games, chests), args.repeat, len(games)),
+        "train": lambda: case_train(games, chests),
+        "api": lambda: case_api(games, chests, args.requests, args.concurrency, args.model),
+    }
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "versions": versions(),
+        "params": {
+            "games": len(games), "chests": len(chests), "players": int(labels.shape[0]),
+            "seed": args.seed, "activity_skew": args.activity_skew, "missing_rate": args.missing_rate,
+            "chests_per_game": args.chests_per_game, "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for name in args.cases:
+        print(f"{name}...", flush=True)
+        report["results"][name] = cases[name]()
+        print(f"  {report['results'][name]}", flush=True)
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{(commit or 'nocommit')[:10]}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{(old['commit'] or '?')[:10]} -> {(new['commit'] or '?')[:10]}")
+    if old["params"] != new["params"]:
+        print(f"warning: params differ: {old['params']} vs {new['params']}")
+    print(f"{'case':>20} {'metric':>12} {'old':>12} {'new':>12} {'new/old':>8}")
+    for case, new_result in new["results"].items():
+        old_result = old["results"].get(case, {})
+        for metric in ("p50_s", "p95_s", "peak_mb", "peak_rss_mb", "server_peak_rss_mb", "requests_per_s"):
+            if metric in new_result and old_result.get(metric) and new_result[metric] is not None:
+                ratio = new_result[metric] / old_result[metric]
+                print(f"{case:>20} {metric:>12} {old_result[metric]:>12.4f} {new_result[metric]:>12.4f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=50_000)
+    parser.add_argument("--players", type=int, help="по умолчанию games / 25")
+    parser.add_argument("--chests-per-game", type=float, default=0.7)
+    parser.add_argument("--activity-skew", type=float, default=0.9, help="степень zipf для числа игр на игрока")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="доля дополнительных пропусков в статистике")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--requests", type=int, default=500, help="запросов к /predict")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--output", help="по умолчанию benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два файла результатов")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
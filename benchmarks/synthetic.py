@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+# генератор синтетических игр в формате data/online-games.csv
+
+GAMES_COLUMNS = [
+    "_id", "game_mode", "creator_id", "status", "started_at", "ended_at", "winner",
+    "score.0", "score.1", "frames_count", "isRematch", "updated_at", "created_at",
+    "end_stats.rating_points.0", "end_stats.rating_points.1",
+    "end_stats.highest_break.0", "end_stats.highest_break.1",
+    "end_stats.balls_potted.0", "end_stats.balls_potted.1",
+    "end_stats.total_points.0", "end_stats.total_points.1",
+    "end_stats.table_time.0", "end_stats.table_time.1",
+    "end_stats.pot_success.0", "end_stats.pot_success.1",
+    "end_stats.shot_time.0", "end_stats.shot_time.1",
+    "end_stats.game_id", "end_stats.updated_at", "end_stats.created_at",
+    "users.0._id", "users.0.username", "users.0.created_at",
+    "users.0.seconds_in_game", "users.0.online.online_sessions", "users.0.online_game_rating.value", "users.0.energy.count",
+    "users.1._id", "users.1.username", "users.1.created_at",
+    "users.1.seconds_in_game", "users.1.online.online_sessions", "users.1.online_game_rating.value", "users.1.energy.count"
+]
+
+START_TS = 1735689600  # 2025-01-01
+PERIOD_SEC = 300 * 24 * 3600
+
+# колонки, где missing_rate добавляет пропуски сверх естественных (недоигранные/не начатые игры)
+MISSABLE_COLUMNS = [
+    "isRematch", "end_stats.rating_points.0", "end_stats.rating_points.1",
+    "end_stats.highest_break.0", "end_stats.highest_break.1",
+    "end_stats.total_points.0", "end_stats.total_points.1",
+    "end_stats.table_time.0", "end_stats.table_time.1",
+    "end_stats.pot_success.0", "end_stats.pot_success.1",
+    "end_stats.shot_time.0", "end_stats.shot_time.1",
+    "users.0.created_at", "users.0.online_game_rating.value",
+    "users.1.created_at", "users.1.online_game_rating.value",
+]
+
+
+def _hex_ids(rng, n):
+    return np.array([f"{v:024x}" for v in rng.integers(0, 2 ** 63, size=n)], dtype=object)
+
+
+def _iso(ts):
+    return pd.to_datetime(ts, unit="s").strftime("%Y-%m-%dT%H:%M:%S.%fZ").to_numpy(dtype=object)
+
+
+def make_players(n_players, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "_id": _hex_ids(rng, n_players),
+        "username": np.array([f"player{i}" for i in range(n_players)], dtype=object),
+        "created_at": START_TS - rng.integers(0, 2 * 365 * 24 * 3600, size=n_players),
+        "rating": rng.normal(1500, 200, size=n_players).round(),
+    })
+
+
+def _activity_weights(n_players, skew):
+    # zipf-подобные веса: немного очень активных игроков и много редких; skew=0 - все одинаково активны
+    weights = 1.0 / np.arange(1, n_players + 1) ** skew
+    return weights / weights.sum()
+
+
+# активность игроков распределена с тяжёлым хвостом, как в реальных данных
+def make_games(n_games, n_players=None, unstarted_rate=0.17, unfinished_rate=0.13, seed=0,
+               activity_skew=0.9, missing_rate=0.0):
+    rng = np.random.default_rng(seed)
+    if n_players is None:
+        n_players = max(2, n_games // 25)
+    players = make_players(n_players, seed=seed + 1)
+
+    weights = _activity_weights(n_players, activity_skew)
+    p0 = rng.choice(n_players, size=n_games, p=weights)
+    p1 = rng.choice(n_players, size=n_games, p=weights)
+    p1 = np.where(p1 == p0, (p1 + 1) % n_players, p1)
+
+    created = START_TS + np.sort(rng.integers(0, PERIOD_SEC, size=n_games))
+    unstarted = rng.random(n_games) < unstarted_rate
+    unfinished = unstarted | (rng.random(n_games) < unfinished_rate)
+    started = np.where(unstarted, np.nan, created + rng.integers(5, 120, size=n_games)).astype(float)
+    duration = rng.gamma(2.0, 400.0, size=n_games)
+    ended = np.where(unfinished, np.nan, started + duration)
+
+    ids0 = players["_id"].to_numpy()[p0]
+    ids1 = np.where(unstarted, None, players["_id"].to_numpy()[p1])
+    names0 = players["username"].to_numpy()[p0]
+    names1 = np.where(unstarted, None, players["username"].to_numpy()[p1])
+    winner_side = rng.integers(0, 2, size=n_games)
+    winner = np.where(unfinished, None, np.where(winner_side == 0, ids0, ids1))
+
+    def side_stat(low, high, decimals=None):
+        vals = rng.uniform(low, high, size=(2, n_games))
+        if decimals is not None:
+            vals = vals.round(decimals)
+        vals[:, unfinished] = np.nan
+        return vals
+
+    rating = side_stat(-25, 25, 0)
+    highest = side_stat(0, 40, 0)
+    potted = side_stat(0, 20, 0)
+    points = side_stat(0, 80, 0)
+    table = side_stat(0, 1)
+    pot_success = side_stat(0, 1)
+    shot_time = side_stat(3000, 20000)
+
+    game_ids = _hex_ids(rng, n_games)
+    created_iso = _iso(created)
+    updated_iso = _iso(created + 60)
+    end_iso = np.where(unfinished, None, updated_iso)
+
+    user_created = players["created_at"].to_numpy()
+    user_rating = players["rating"].to_numpy()
+
+    df = pd.DataFrame({
+        "_id": game_ids,
+        "game_mode": np.where(rng.random(n_games) < 0.8, "15RedFrame", "6RedFrame"),
+        "creator_id": ids0,
+        "status": np.where(unstarted, -1, 2),
+        "started_at": started,
+        "ended_at": ended,
+        "winner": winner,
+        "score.0": np.where(winner_side == 0, 1, 0),
+        "score.1": np.where(winner_side == 1, 1, 0),
+        "frames_count": 1,
+        "isRematch": np.where(rng.random(n_games) < 0.05, 1.0, np.nan),
+        "updated_at": updated_iso,
+        "created_at": created_iso,
+        "end_stats.rating_points.0": rating[0], "end_stats.rating_points.1": rating[1],
+        "end_stats.highest_break.0": highest[0], "end_stats.highest_break.1": highest[1],
+        "end_stats.balls_potted.0": potted[0], "end_stats.balls_potted.1": potted[1],
+        "end_stats.total_points.0": points[0], "end_stats.total_points.1": points[1],
+        "end_stats.table_time.0": table[0], "end_stats.table_time.1": table[1],
+        "end_stats.pot_success.0": pot_success[0], "end_stats.pot_success.1": pot_success[1],
+        "end_stats.shot_time.0": shot_time[0], "end_stats.shot_time.1": shot_time[1],
+        "end_stats.game_id": np.where(unfinished, None, game_ids),
+        "end_stats.updated_at": end_iso,
+        "end_stats.created_at": end_iso,
+        "users.0._id": ids0,
+        "users.0.username": names0,
+        "users.0.created_at": _iso(user_created[p0]),
+        "users.0.seconds_in_game": rng.integers(0, 10 ** 7, size=n_games),
+        "users.0.online.online_sessions": rng.integers(0, 2000, size=n_games),
+        "users.0.online_game_rating.value": user_rating[p0],
+        "users.0.energy.count": rng.integers(0, 10000, size=n_games),
+        "users.1._id": ids1,
+        "users.1.username": names1,
+        "users.1.created_at": np.where(unstarted, None, _iso(user_created[p1])),
+        "users.1.seconds_in_game": np.where(unstarted, np.nan, rng.integers(0, 10 ** 7, size=n_games)),
+        "users.1.online.online_sessions": np.where(unstarted, np.nan, rng.integers(0, 2000, size=n_games)),
+        "users.1.online_game_rating.value": np.where(unstarted, np.nan, user_rating[p1]),
+        "users.1.energy.count": np.where(unstarted, np.nan, rng.integers(0, 10000, size=n_games)),
+    })
+    if missing_rate > 0:
+        # отдельный генератор, чтобы при missing_rate=0 данные не менялись
+        missing_rng = np.random.default_rng(seed + 100)
+        for col in MISSABLE_COLUMNS:
+            mask = missing_rng.random(n_games) < missing_rate
+            df[col] = df[col].where(~mask, None if df[col].dtype == object else np.nan)
+    return df[GAMES_COLUMNS]
+
+
+# плоские колонки "users.0._id" -> вложенный json, как его присылает клиент
+def to_nested_records(df):
+    paths = [[int(p) if p.isdigit() else p for p in col.split(".")] for col in df.columns]
+    records = []
+    for values in df.itertuples(index=False, name=None):
+        record = {}
+        for path, value in zip(paths, values):
+            if isinstance(value, float) and np.isnan(value):
+                value = None
+            node = record
+            for part, nxt in zip(path[:-1], path[1:]):
+                container = [] if isinstance(nxt, int) else {}
+                if isinstance(part, int):
+                    while len(node) <= part:
+                        node.append(None)
+                    if node[part] is None:
+                        node[part] = container
+                    node = node[part]
+                else:
+                    node = node.setdefault(part, container)
+            last = path[-1]
+            if isinstance(last, int):
+                while len(node) <= last:
+                    node.append(None)
+                node[last] = value
+            else:
+                node[last] = value
+        records.append(record)
+    return records
+
+
+CHEST_TYPES = ["daily", "small", "medium", "big"]
+CHEST_TYPE_WEIGHTS = [0.41, 0.34, 0.20, 0.05]
+OPENED_WITH = ["time", "gems", "game store"]
+OPENED_WITH_WEIGHTS = [0.82, 0.16, 0.02]
+
+
+# сундуки в формате data/chests.csv для уже сгенерированных игроков;
+# chest_types / opened_with - словари {значение: вес}, по умолчанию доли как в data/
+def make_chests(n_chests, players, seed=0, activity_skew=0.9, chest_types=None, opened_with=None):
+    rng = np.random.default_rng(seed)
+    chest_types = chest_types or dict(zip(CHEST_TYPES, CHEST_TYPE_WEIGHTS))
+    opened_with = opened_with or dict(zip(OPENED_WITH, OPENED_WITH_WEIGHTS))
+    owner = rng.choice(len(players), size=n_chests, p=_activity_weights(len(players), activity_skew))
+    return pd.DataFrame({
+        "user._id": players["_id"].to_numpy()[owner],
+        "user.username": players["username"].to_numpy()[owner],
+        "chest.type": rng.choice(list(chest_types), size=n_chests, p=_normalized(chest_types.values())),
+        "opened_with": rng.choice(list(opened_with), size=n_chests, p=_normalized(opened_with.values())),
+        "open_at": START_TS + rng.integers(0, PERIOD_SEC, size=n_chests),
+    })
+
+
+def _normalized(weights):
+    weights = np.asarray(list(weights), dtype=float)
+    return weights / weights.sum()
+
+
+# игры и сундуки с общими игроками; сундуков примерно 0.7 на игру, как в data/
+def make_dataset(n_games, n_players=None, chests_per_game=0.7, seed=0, activity_skew=0.9,
+                 missing_rate=0.0, chest_types=None, opened_with=None):
+    if n_players is None:
+        n_players = max(2, n_games // 25)
+    games = make_games(n_games, n_players=n_players, seed=seed, activity_skew=activity_skew, missing_rate=missing_rate)
+    players = make_players(n_players, seed=seed + 1)
+    chests = make_chests(int(n_games * chests_per_game), players, seed=seed + 2, activity_skew=activity_skew,
+                         chest_types=chest_types, opened_with=opened_with)
+    return games, chests
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from batching import INVALID_IDS, GAMES_ID_COLUMNS, CHESTS_ID_COLUMNS
+from inference import payload_frames
+
+# кэш вероятностей по игрокам. Фичи игрока зависят только от игр, где он участвует, и его сундуков,
+# поэтому ключ - player_id + отпечаток этих записей (после разбора в колонки схемы) + версия модели + as_of
+
+
+def model_version(model_path):
+    # sha256 файла модели или всех файлов каталога-артефакта
+    if os.path.isdir(model_path):
+        paths = [os.path.join(model_path, name) for name in sorted(os.listdir(model_path))]
+    else:
+        paths = [model_path]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _valid_ids(ids):
+    as_str = ids.astype(str)
+    valid = ids.notna() & ~as_str.str.lower().str.strip().isin(INVALID_IDS)
+    return as_str[valid]
+
+
+def _combine(df, id_columns):
+    # хэш строки складывается по игроку: порядок записей в запросе не влияет на отпечаток
+    if df.empty:
+        return pd.DataFrame(columns=["sum", "count"])
+    row_hash = pd.util.hash_pandas_object(df, index=False)
+    parts = []
+    for col in id_columns:
+        ids = _valid_ids(df[col])
+        parts.append(pd.DataFrame({"player_id": ids.to_numpy(), "hash": row_hash[ids.index].to_numpy()}))
+    long = pd.concat(parts, ignore_index=True)
+    return long.groupby("player_id")["hash"].agg(["sum", "count"])
+
+
+def fingerprint_payload(games, chests):
+    # отпечатки и разобранные DataFrame: при промахе кэша скоринг идёт по ним, без второго разбора json
+    games_df, chests_df = payload_frames(games, chests)
+    return fingerprint_frames(games_df, chests_df), (games_df, chests_df)
+
+
+def fingerprint_frames(games_df, chests_df):
+    # {player_id: (отпечаток игр, число игр, отпечаток сундуков, число сундуков)} для игроков из игр
+    games_fp = _combine(games_df, GAMES_ID_COLUMNS)
+    chests_fp = _combine(chests_df, CHESTS_ID_COLUMNS).reindex(games_fp.index, fill_value=0)
+    return {
+        player_id: (int(g_sum), int(g_cnt), int(c_sum), int(c_cnt))
+        for player_id, g_sum, g_cnt, c_sum, c_cnt in zip(
+            games_fp.index, games_fp["sum"], games_fp["count"], chests_fp["sum"], chests_fp["count"])
+    }
+
+
+class PredictionCache:
+    # LRU с TTL; используется только из event loop, поэтому без блокировок
+    def __init__(self, max_size=10000, ttl_sec=300.0, freshness_sec=60.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl_sec
+        # без as_of days_since_last считается от текущего времени: у игроков с сундуками запись живёт
+        # не дольше окна; с явным as_of ответ детерминирован и живёт полный ttl
+        self.freshness = freshness_sec
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        # (найдено, значение)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self.entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, key, value, time_dependent=False):
+        ttl = min(self.ttl, self.freshness) if time_dependent else self.ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        self.entries[key] = (self.clock() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, fingerprints, version, as_of=None):
+        # все игроки запроса из кэша или None; отсутствие игрока в ответе модели тоже кэшируется
+        result = {}
+        complete = True
+        for player_id, fp in fingerprints.items():
+            found, prob = self.get((player_id, fp, version, as_of))
+            complete = complete and found
+            if prob is not None:
+                result[player_id] = prob
+        return result if complete else None
+
+    def store(self, fingerprints, version, probabilities, as_of=None):
+        for player_id, fp in fingerprints.items():
+            # fp[3] - число сундуков игрока
+            self.put((player_id, fp, version, as_of), probabilities.get(player_id),
+                     time_dependent=as_of is None and fp[3] > 0)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
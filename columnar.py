@@ -0,0 +1,192 @@
+import argparse
+import logging
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from ingest import compact_chests, compact_games, read_chests_csv, read_games_csv
+from payload import numeric_columns
+from preprocess import ChestsPreprocessor, GamesPreprocessor, epoch_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# колоночное хранение выгрузок: csv один раз раскладывается в parquet-датасет с разбиением по дате
+# (games - по started_at, chests - по open_at, каталоги start_month=YYYY-MM; по дням файлы выходят
+# слишком мелкими), дальше скрипты читают только нужные колонки и только нужные месяцы.
+#   python columnar.py --games data/online-games.csv --chests data/chests.csv --out data/parquet
+# load_games/load_chests понимают и csv, и каталог parquet, поэтому скрипты работают с любым форматом.
+# Нужен pyarrow: pip install pyarrow
+
+PARTITION_COLUMN = "start_month"
+PARTITION_FORMAT = "%Y-%m"
+# время события, по которому строится раздел и фильтр по датам
+GAMES_TIME_COLUMN = "started_at"
+CHESTS_TIME_COLUMN = "open_at"
+INT_COLUMNS = {"open_at"}
+
+# колонки, которые читают препроцессоры: их достаточно и для обучения, и для скоринга
+GAMES_FEATURE_COLUMNS = GamesPreprocessor.input_columns
+CHESTS_FEATURE_COLUMNS = ChestsPreprocessor.input_columns
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("Parquet data requires pyarrow: pip install pyarrow")
+    return pa, ds
+
+
+def _partitioning():
+    pa, ds = _pyarrow()
+    return ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive")
+
+
+def is_dataset(path):
+    return os.path.isdir(path)
+
+
+def _schema(columns):
+    pa, _ = _pyarrow()
+    fields = []
+    for col in columns:
+        if col in INT_COLUMNS:
+            fields.append((col, pa.int64()))
+        elif col in numeric_columns:
+            fields.append((col, pa.float64()))
+        else:
+            fields.append((col, pa.string()))
+    return pa.schema(fields)
+
+
+def convert_csv(csv_path, out_dir, time_column, chunk_rows=500_000, overwrite=False):
+    pa, ds = _pyarrow()
+    if os.path.exists(out_dir) and os.listdir(out_dir):
+        if not overwrite:
+            raise FileExistsError(f"{out_dir} already exists, use overwrite=True")
+        shutil.rmtree(out_dir)
+
+    columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    schema = _schema(columns)
+    text_columns = {c: str for c in columns if c not in numeric_columns}
+    rows = 0
+    for chunk_no, chunk in enumerate(pd.read_csv(csv_path, dtype=text_columns, chunksize=chunk_rows)):
+        month = epoch_to_datetime(chunk[time_column]).dt.strftime(PARTITION_FORMAT)
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        table = table.append_column(PARTITION_COLUMN, pa.array(month, type=pa.string(), from_pandas=True))
+        ds.write_dataset(
+            table, out_dir, format="parquet", partitioning=_partitioning(),
+            basename_template=f"part-{chunk_no}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore", max_partitions=100_000,
+        )
+        rows += len(chunk)
+        logger.info(f"{csv_path}: converted chunk {chunk_no} ({len(chunk)} rows)")
+    return rows
+
+
+def _bound(time_column, ts):
+    # для целочисленной колонки x >= t и x < t равносильны сравнению с ceil(t)
+    ts = pd.Timestamp(ts).timestamp()
+    return math.ceil(ts) if time_column in INT_COLUMNS else ts
+
+
+def _date_filter(ds, time_column, start, end, undated=False):
+    # раздел отсекает файлы целиком, фильтр по времени события - строки внутри граничных месяцев
+    expr = None
+    if start is not None:
+        expr = ((ds.field(PARTITION_COLUMN) >= pd.Timestamp(start).strftime(PARTITION_FORMAT))
+                & (ds.field(time_column) >= _bound(time_column, start)))
+    if end is not None:
+        cond = ((ds.field(PARTITION_COLUMN) <= pd.Timestamp(end).strftime(PARTITION_FORMAT))
+                & (ds.field(time_column) < _bound(time_column, end)))
+        expr = cond if expr is None else expr & cond
+    if undated and expr is not None:
+        expr = expr | ds.field(time_column).is_null()
+    return expr
+
+
+def _read_dataset(path, columns, time_column, start, end, undated=False):
+    _, ds = _pyarrow()
+    dataset = ds.dataset(path, format="parquet", partitioning=_partitioning())
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != PARTITION_COLUMN]
+    table = dataset.to_table(columns=columns, filter=_date_filter(ds, time_column, start, end, undated))
+    with_nulls = {name for name in table.column_names if table.column(name).null_count}
+    # буферы arrow освобождаются по мере конвертации, пик памяти - не две полные копии
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    # пустые строки arrow отдаёт как None, csv - как NaN; приводим к NaN, чтобы признаки совпадали
+    for name in df.columns:
+        if df[name].dtype == object and name in with_nulls:
+            values = df[name].to_numpy()
+            values[pd.isna(values)] = np.nan
+            df[name] = values
+    return df
+
+
+def _filter_csv(df, time_column, start, end, undated=False):
+    if start is None and end is None:
+        return df
+    ts = pd.to_numeric(df[time_column], errors="coerce")
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (ts >= pd.Timestamp(start).timestamp()).to_numpy()
+    if end is not None:
+        mask &= (ts < pd.Timestamp(end).timestamp()).to_numpy()
+    if undated:
+        mask |= ts.isna().to_numpy()
+    return df[mask]
+
+
+def _load(path, columns, time_column, start, end, read_csv, compact, typed, undated=False):
+    # фильтр по датам требует колонку времени; если её не просили, она отбрасывается после фильтра
+    read_columns = columns
+    if columns is not None and (start is not None or end is not None) and time_column not in columns:
+        read_columns = list(columns) + [time_column]
+
+    if is_dataset(path):
+        df = _read_dataset(path, read_columns, time_column, start, end, undated)
+        if typed:
+            df = compact(df)
+    else:
+        kwargs = {"usecols": read_columns} if read_columns is not None else {}
+        df = read_csv(path, **kwargs) if typed else pd.read_csv(path, **kwargs)
+        df = _filter_csv(df, time_column, start, end, undated)
+        if read_columns is not None:
+            df = df[read_columns]
+
+    if read_columns is not columns:
+        df = df.drop(columns=time_column)
+    return df.reset_index(drop=True) if start is not None or end is not None else df
+
+
+def load_games(path, columns=None, start=None, end=None, typed=False, undated=False):
+    # columns=None - все колонки; start/end - полуинтервал [start, end) по started_at;
+    # undated=True - вместе с окном вернуть и игры без started_at (в окна они не попадают)
+    return _load(path, columns, GAMES_TIME_COLUMN, start, end, read_games_csv, compact_games, typed, undated)
+
+
+def load_chests(path, columns=None, start=None, end=None, typed=False, undated=False):
+    # то же по open_at; undated=True - вместе с окном и сундуки без open_at
+    return _load(path, columns, CHESTS_TIME_COLUMN, start, end, read_chests_csv, compact_chests, typed, undated)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", default="data/online-games.csv")
+    parser.add_argument("--chests", default="data/chests.csv")
+    parser.add_argument("--out", default="data/parquet", help="games/ и chests/ внутри этого каталога")
+    parser.add_argument("--chunk-rows", type=int, default=500_000)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    games_rows = convert_csv(args.games, os.path.join(args.out, "games"), GAMES_TIME_COLUMN,
+                             args.chunk_rows, args.overwrite)
+    chests_rows = convert_csv(args.chests, os.path.join(args.out, "chests"), CHESTS_TIME_COLUMN,
+                              args.chunk_rows, args.overwrite)
+    print(f"{games_rows} games, {chests_rows} chests -> {args.out}")
@@ -0,0 +1,67 @@
+import os
+
+# настройки сервиса через переменные окружения
+
+MODEL_PATH = os.getenv("MODEL_PATH", "churn_pipeline.pkl")
+
+# реестр моделей (registry.py): каталог версий <версия>.pkl или <версия>/ (артефакт); активна новейшая
+# по имени, если версия не закреплена через POST /admin/models/activate. Пусто - одна модель MODEL_PATH
+MODEL_DIR = os.getenv("MODEL_DIR", "")
+# как часто проверять MODEL_DIR (или файл MODEL_PATH) на новые версии и изменения; 0 - только по
+# POST /admin/models/reload
+MODEL_POLL_SEC = float(os.getenv("MODEL_POLL_SEC", "10"))
+# сколько загруженных пайплайнов держать в процессе (активная, теневая и предыдущая модели)
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "3"))
+# теневая модель: версия из MODEL_DIR или путь; доля запросов, которые она пересчитывает в фоне
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+# токен заголовка X-Admin-Token для /admin/*; пусто - admin-эндпоинты выключены
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# выгрузки для train.py и скриптов предсказаний: csv или каталог parquet (python columnar.py)
+GAMES_DATA = os.getenv("GAMES_DATA", "data/online-games.csv")
+CHESTS_DATA = os.getenv("CHESTS_DATA", "data/chests.csv")
+
+# пул для CPU-работы /predict: "thread" или "process"
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# сколько запросов может ждать/выполняться в пуле, дальше - 503
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "32"))
+INFERENCE_TIMEOUT_SEC = float(os.getenv("INFERENCE_TIMEOUT_SEC", "10"))
+
+# микробатчинг /predict: 0 или 1 - выключен
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "0"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# /predict/stream: сколько запросов и игр максимум в одной пачке
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "256"))
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+# предел отдельных записей одного запроса без смены игрока: больше - ошибка запроса (игрок не делится)
+STREAM_MAX_REQUEST_ROWS = int(os.getenv("STREAM_MAX_REQUEST_ROWS", "500000"))
+
+# /predict/batch: максимум элементов в одном теле (больше - 413); в пул уходят пачками по STREAM_CHUNK_*
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", "10000"))
+
+# разбор тела /predict и /predict/batch: "strict" - полная валидация pydantic (по умолчанию, удобно для отладки),
+# "fast" - orjson и проверка только структуры (объекты в списках games/chests), ответы тоже через orjson
+REQUEST_PARSING = os.getenv("REQUEST_PARSING", "strict")
+
+# GET /predict/{player_id}: локальное хранилище игр и сундуков (python event_store.py --games ... --chests ...)
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", "events.db")
+
+# кэш /predict по игрокам: PREDICT_CACHE_SIZE=0 (по умолчанию) - выключен
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "0"))
+PREDICT_CACHE_TTL_SEC = float(os.getenv("PREDICT_CACHE_TTL_SEC", "300"))
+# окно свежести для игроков с сундуками (days_since_last зависит от текущего времени)
+PREDICT_CACHE_FRESHNESS_SEC = float(os.getenv("PREDICT_CACHE_FRESHNESS_SEC", "60"))
+
+# движок предсказания: "booster" (lgb.Booster напрямую), "sklearn" (LGBMClassifier) или "numpy" (деревья в numpy)
+PREDICT_ENGINE = os.getenv("PREDICT_ENGINE", "booster")
+# потоков LightGBM на один вызов (booster); 0 - по умолчанию LightGBM
+PREDICT_THREADS = int(os.getenv("PREDICT_THREADS", "1"))
+
+# выборочное профилирование вызовов пула: доля вызовов под cProfile (0 - выключено);
+# .prof сохраняется, только если вызов занял не меньше PROFILE_THRESHOLD_MS
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
@@ -0,0 +1,140 @@
+import numpy as np
+
+# движки предсказания по готовой масштабированной матрице фич:
+#   sklearn - LGBMClassifier.predict_proba (обёртка с проверками входа)
+#   booster - lgb.Booster.predict напрямую, с фиксированным числом потоков на вызов
+#   numpy   - ансамбль деревьев, скомпилированный в плоские массивы и посчитанный векторно
+
+# порог нуля LightGBM (kZeroThreshold)
+ZERO_THRESHOLD = 1e-35
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+ROWS_PER_BLOCK = 8192
+
+
+def _booster(model):
+    return model.booster_ if hasattr(model, "booster_") else model
+
+
+class SklearnEngine:
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        return self.model.predict_proba(X)[:, 1]
+
+
+class BoosterEngine:
+    # num_threads=1: параллельные запросы и так идут в разных воркерах пула,
+    # потоки OpenMP внутри каждого вызова только переподписывают CPU
+    def __init__(self, model, num_threads=1):
+        self.booster = _booster(model)
+        self.num_threads = num_threads
+
+    def predict(self, X):
+        if self.num_threads > 0:
+            return self.booster.predict(X, num_threads=self.num_threads)
+        return self.booster.predict(X)
+
+
+class NumpyTreeEngine:
+    def __init__(self, model):
+        dump = _booster(model).dump_model()
+        objective = dump["objective"].split()
+        if objective[0] != "binary" or dump["num_tree_per_iteration"] != 1 or dump.get("average_output"):
+            raise ValueError(f"numpy engine supports only binary gbdt models, got {dump['objective']}")
+        self.sigmoid = 1.0
+        for param in objective[1:]:
+            if param.startswith("sigmoid:"):
+                self.sigmoid = float(param.split(":", 1)[1])
+        self.n_features = dump["max_feature_idx"] + 1
+        self._compile([tree["tree_structure"] for tree in dump["tree_info"]])
+
+    def _compile(self, trees):
+        # все деревья в общих массивах узлов; лист ссылается сам на себя,
+        # поэтому после max_depth шагов каждая строка стоит в своём листе
+        feature, threshold, left, right = [], [], [], []
+        value, default_left, missing_type = [], [], []
+        roots = []
+        max_depth = 0
+
+        def add(node, depth):
+            nonlocal max_depth
+            pos = len(feature)
+            feature.append(0)
+            threshold.append(0.0)
+            left.append(pos)
+            right.append(pos)
+            value.append(0.0)
+            default_left.append(False)
+            missing_type.append(0)
+            if "split_feature" not in node:
+                value[pos] = node["leaf_value"]
+                max_depth = max(max_depth, depth)
+                return pos
+            if node["decision_type"] != "<=":
+                raise ValueError("numpy engine does not support categorical splits")
+            feature[pos] = node["split_feature"]
+            threshold[pos] = node["threshold"]
+            default_left[pos] = node["default_left"]
+            missing_type[pos] = MISSING_TYPES[node["missing_type"]]
+            left[pos] = add(node["left_child"], depth + 1)
+            right[pos] = add(node["right_child"], depth + 1)
+            return pos
+
+        for tree in trees:
+            roots.append(add(tree, 0))
+
+        self.feature = np.array(feature, dtype=np.intp)
+        self.threshold = np.array(threshold, dtype=np.float64)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.value = np.array(value, dtype=np.float64)
+        self.default_left = np.array(default_left, dtype=bool)
+        self.missing_type = np.array(missing_type, dtype=np.int8)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        self.has_zero_missing = bool((self.missing_type == MISSING_TYPES["Zero"]).any())
+
+    def raw_score(self, X):
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+        scores = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), ROWS_PER_BLOCK):
+            block = X[start:start + ROWS_PER_BLOCK]
+            scores[start:start + len(block)] = self._raw_block(block)
+        return scores
+
+    def _raw_block(self, X):
+        # сравнение в float64, как в LightGBM; индексы строк плоские, чтобы брать значения через take
+        values = np.ascontiguousarray(X, dtype=np.float64).ravel()
+        row_offset = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        check_missing = self.has_zero_missing or np.isnan(values).any()
+        for _ in range(self.max_depth):
+            x = values.take(row_offset + self.feature.take(node))
+            if check_missing:
+                mtype = self.missing_type[node]
+                is_nan = np.isnan(x)
+                # как в LightGBM: NaN без missing_type=NaN считается нулём
+                x = np.where(is_nan & (mtype != MISSING_TYPES["NaN"]), 0.0, x)
+                use_default = (((mtype == MISSING_TYPES["Zero"]) & (np.abs(x) <= ZERO_THRESHOLD))
+                               | ((mtype == MISSING_TYPES["NaN"]) & is_nan))
+                go_left = np.where(use_default, self.default_left[node], x <= self.threshold.take(node))
+            else:
+                go_left = x <= self.threshold.take(node)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+        return self.value.take(node).sum(axis=1)
+
+    def predict(self, X):
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * self.raw_score(X)))
+
+
+def make_engine(name, model, num_threads=1):
+    if name == "sklearn":
+        return SklearnEngine(model)
+    if name == "booster":
+        return BoosterEngine(model, num_threads=num_threads)
+    if name == "numpy":
+        return NumpyTreeEngine(model)
+    raise ValueError(f"Unknown predict engine: {name}")
@@ -0,0 +1,226 @@
+import argparse
+import logging
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from inference import load_pipeline
+from payload import games_columns, chests_columns, numeric_columns
+
+logger = logging.getLogger(__name__)
+
+# локальное хранилище сырых игр и сундуков (SQLite) с индексами по id и нику обоих игроков,
+# чтобы собрать историю игрока для скоринга без полного прохода по csv
+
+SQL_CHUNK = 400
+
+GAMES_INDEXES = ["users.0._id", "users.1._id", "users.0.username", "users.1.username", "_id"]
+CHESTS_INDEXES = ["user._id", "user.username"]
+# ключи событий: повторная загрузка той же или пересекающейся выгрузки пропускает уже сохранённые
+# строки (INSERT OR IGNORE), а не задваивает игры и сундуки игрока. Ключ - поля события и номер
+# повторения "_n": у сундука своего id нет, и одинаковые открытия (тот же игрок, тип и секунда)
+# законны, поэтому k-е одинаковое открытие в загрузке получает _n = k и хранится отдельно. У игр
+# _n всегда 0 - игра одна на _id. Строки с NULL в ключе не сравниваются (как NULL в UNIQUE у sqlite)
+EVENT_KEYS = {"games": ["_id"], "chests": ["user._id", "chest.type", "opened_with", "open_at"]}
+REPEAT_COLUMN = "_n"
+
+
+def _q(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+class EventStore:
+    def __init__(self, path="events.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        games_cols = ", ".join(_q(c) for c in games_columns + [REPEAT_COLUMN])
+        chests_cols = ", ".join(_q(c) for c in chests_columns + [REPEAT_COLUMN])
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS games ({games_cols});
+            CREATE TABLE IF NOT EXISTS chests ({chests_cols});
+        """)
+        for table in EVENT_KEYS:
+            self._add_repeat_column(table)
+        statements = []
+        for table, cols in (("games", GAMES_INDEXES), ("chests", CHESTS_INDEXES)):
+            for col in cols:
+                name = f"idx_{table}_{col.replace('.', '_')}"
+                statements.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({_q(col)})")
+        for table, key in EVENT_KEYS.items():
+            # uniq_* - прежние ключи без номера повторения: удаляется только индекс, не строки
+            statements.append(f"DROP INDEX IF EXISTS uniq_{table}")
+            cols = ", ".join(_q(c) for c in key + [REPEAT_COLUMN])
+            statements.append(f"CREATE UNIQUE INDEX IF NOT EXISTS key_{table} ON {table} ({cols})")
+        self.conn.executescript(";\n".join(statements) + ";")
+        self.conn.commit()
+
+    def _add_repeat_column(self, table):
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if REPEAT_COLUMN in columns:
+            return
+        # база, собранная без ключей событий: строки остаются как есть, им проставляется номер
+        # повторения по порядку вставки, так что уже сохранённые события при повторной загрузке пропускаются
+        key = ", ".join(_q(c) for c in EVENT_KEYS[table])
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {_q(REPEAT_COLUMN)} INTEGER")
+        self.conn.execute(
+            f"UPDATE {table} SET {_q(REPEAT_COLUMN)} = numbered.n FROM ("
+            f"SELECT rowid AS id, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY rowid) - 1 AS n FROM {table}"
+            f") AS numbered WHERE {table}.rowid = numbered.id"
+        )
+        logger.info(f"{self.path}: numbered repeated events in {table}")
+
+    def close(self):
+        self.conn.close()
+
+    # --- загрузка ---
+
+    def add(self, games_df=None, chests_df=None, repeats=None):
+        # возвращает число новых строк (уже сохранённые события пропускаются).
+        # repeats - счётчик одинаковых сундуков, общий для кусков одной загрузки (load_csv)
+        repeats = Counter() if repeats is None else repeats
+        before = self.conn.total_changes
+        with self.conn:
+            if games_df is not None:
+                self._insert("games", games_df.reindex(columns=games_columns).assign(**{REPEAT_COLUMN: 0}))
+            if chests_df is not None:
+                chests_df = chests_df.reindex(columns=chests_columns)
+                self._insert("chests", chests_df.assign(**{REPEAT_COLUMN: _repeat_numbers(chests_df, repeats)}))
+        return self.conn.total_changes - before
+
+    def _insert(self, table, df):
+        values = df.astype(object).where(df.notna(), None)
+        placeholders = ", ".join("?" * len(df.columns))
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO {table} ({', '.join(_q(c) for c in df.columns)}) VALUES ({placeholders})",
+            values.itertuples(index=False, name=None),
+        )
+
+    def load_csv(self, games_path=None, chests_path=None, chunk_rows=100_000):
+        for path, key in ((games_path, "games_df"), (chests_path, "chests_df")):
+            if path is None:
+                continue
+            repeats = Counter()
+            for chunk in pd.read_csv(path, chunksize=chunk_rows):
+                added = self.add(**{key: chunk}, repeats=repeats)
+                logger.info(f"{path}: {added} of {len(chunk)} rows added, {len(chunk) - added} already stored")
+        self.conn.execute("ANALYZE")
+
+    # --- чтение ---
+
+    def _query_in(self, sql, values, columns):
+        values = [str(v) for v in values]
+        rows = []
+        for i in range(0, len(values), SQL_CHUNK):
+            chunk = values[i:i + SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows.extend(self.conn.execute(sql.format(marks=marks), chunk * sql.count("{marks}")).fetchall())
+        return _to_frame(rows, columns)
+
+    def games_for(self, player_ids):
+        # UNION по двум индексам вместо OR, чтобы sqlite не сканировал таблицу
+        sql = (
+            f"SELECT {', '.join(_q(c) for c in games_columns)} FROM games WHERE rowid IN ("
+            f"SELECT rowid FROM games WHERE {_q('users.0._id')} IN ({{marks}}) "
+            f"UNION SELECT rowid FROM games WHERE {_q('users.1._id')} IN ({{marks}}))"
+        )
+        games = self._query_in(sql, player_ids, games_columns)
+        if len(player_ids) > SQL_CHUNK:
+            games = games.drop_duplicates(ignore_index=True)
+        # в базе, собранной без ключей событий, игра могла сохраниться дважды: берётся одна
+        ids = games["_id"]
+        return games[~(ids.notna() & ids.duplicated())].reset_index(drop=True)
+
+    def chests_for(self, player_ids):
+        sql = f"SELECT {', '.join(_q(c) for c in chests_columns)} FROM chests WHERE {_q('user._id')} IN ({{marks}})"
+        return self._query_in(sql, player_ids, chests_columns)
+
+    def player_ids_by_username(self, username):
+        rows = self.conn.execute(
+            f"SELECT {_q('users.0._id')} FROM games WHERE {_q('users.0.username')} = ? "
+            f"UNION SELECT {_q('users.1._id')} FROM games WHERE {_q('users.1.username')} = ? "
+            f"UNION SELECT {_q('user._id')} FROM chests WHERE {_q('user.username')} = ?",
+            (username, username, username),
+        ).fetchall()
+        return sorted(row[0] for row in rows if row[0] is not None)
+
+
+def _repeat_numbers(chests_df, repeats):
+    # номер повторения одинакового открытия с начала загрузки; repeats дополняется
+    keys = zip(*(chests_df[c].tolist() for c in EVENT_KEYS["chests"]))
+    numbers = []
+    for key in keys:
+        numbers.append(repeats[key])
+        repeats[key] += 1
+    return numbers
+
+
+def _to_frame(rows, columns):
+    # колонки собираем сразу в массивы; NULL в числовых колонках -> NaN, как при разборе json
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for col, col_values in zip(columns, values):
+        if col in numeric_columns:
+            try:
+                data[col] = np.array(col_values, dtype=np.float64)
+                continue
+            except (TypeError, ValueError):
+                pass
+        data[col] = np.array(col_values, dtype=object)
+    return pd.DataFrame(data, columns=columns, copy=False)
+
+
+_stores = threading.local()
+
+
+def get_store(path):
+    # sqlite-соединение на поток пула
+    stores = getattr(_stores, "by_path", None)
+    if stores is None:
+        stores = _stores.by_path = {}
+    if path not in stores:
+        stores[path] = EventStore(path)
+    return stores[path]
+
+
+def score_players(model_path, store_path, player_ids, as_of=None):
+    # вероятности только для запрошенных игроков; соперники в их играх считаются с неполной историей
+    store = get_store(store_path)
+    games_df = store.games_for(player_ids)
+    if games_df.empty:
+        return {}
+    chests_df = store.chests_for(player_ids)
+    proba = load_pipeline(model_path).predict_proba(games_df, chests_df, as_of=as_of)
+    wanted = {str(p) for p in player_ids}
+    return {player_id: prob for player_id, prob in proba.items() if player_id in wanted}
+
+
+def score_username(model_path, store_path, username, as_of=None):
+    player_ids = get_store(store_path).player_ids_by_username(username)
+    if not player_ids:
+        return {}
+    return score_players(model_path, store_path, player_ids, as_of)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальное хранилище игр и сундуков для /predict/{player_id}")
+    parser.add_argument("--db", default="events.db")
+    parser.add_argument("--games", help="csv с играми для загрузки")
+    parser.add_argument("--chests", help="csv с сундуками для загрузки")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = EventStore(args.db)
+    try:
+        store.load_csv(args.games, args.chests)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import logging
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from inference import load_pipeline
+from preprocess import GamesPreprocessor, ChestsPreprocessor, epoch_to_datetime, player_ids as parse_player_ids
+
+logger = logging.getLogger(__name__)
+
+# постоянное хранилище агрегатов по игрокам (SQLite).
+# Хранятся только сливаемые величины: суммы и счётчики для средних, гистограммы часа/дня недели,
+# min/max времени открытия сундуков и счётчики по типам. Новые игры и сундуки добавляются
+# к ним, а фичи собираются из агрегатов теми же finalize, что и в препроцессорах,
+# поэтому стоимость обновления зависит только от новых событий.
+# Дополнительно: время последней игры каждого игрока (для меток оттока) и отметки - максимальное
+# время уже учтённых игр и сундуков, с них train.py --store дочитывает выгрузку. Повторно присланные
+# игры (по _id) и сундуки (по полям и номеру повторения) в агрегаты второй раз не попадают.
+
+HIST_COLUMNS = {"hour": "start_hour", "dow": "start_dow"}
+CATEGORY_COLUMNS = {"chest": "chest.type", "open_with": "opened_with"}
+CHEST_KEY_COLUMNS = ["user._id", "chest.type", "opened_with", "open_at"]
+SQL_CHUNK = 900
+
+
+class FeatureStore:
+    def __init__(self, path="features.db"):
+        self.path = path
+        self.games_processor = GamesPreprocessor()
+        self.chests_processor = ChestsPreprocessor()
+        self.mean_features = list(self.games_processor.mean_features)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        mean_cols = ", ".join(f"sum_{name} REAL NOT NULL DEFAULT 0, cnt_{name} INTEGER NOT NULL DEFAULT 0"
+                              for name in self.mean_features)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS player_games (
+                player_id TEXT PRIMARY KEY,
+                games_played INTEGER NOT NULL DEFAULT 0,
+                wins INTEGER NOT NULL DEFAULT 0,
+                {mean_cols}
+            );
+            CREATE TABLE IF NOT EXISTS player_hist (
+                player_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (player_id, kind, value)
+            );
+            CREATE TABLE IF NOT EXISTS player_chests (
+                player_id TEXT PRIMARY KEY,
+                total_chests INTEGER NOT NULL DEFAULT 0,
+                first_open REAL,
+                last_open REAL
+            );
+            CREATE TABLE IF NOT EXISTS player_categories (
+                player_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                category TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (player_id, kind, category)
+            );
+            CREATE TABLE IF NOT EXISTS seen_games (
+                game_id TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS seen_chests (
+                chest_key TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS player_last_game (
+                player_id TEXT PRIMARY KEY,
+                last_started REAL
+            );
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name TEXT PRIMARY KEY,
+                value REAL
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def watermark(self, name):
+        # "games" - максимальный started_at учтённых игр, "chests" - максимальный open_at; None - пусто
+        row = self.conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _advance_watermark(self, name, value):
+        if value is None or np.isnan(value):
+            return
+        self.conn.execute(
+            "INSERT INTO watermarks (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = max(value, excluded.value)",
+            (name, float(value)),
+        )
+
+    # --- обновление ---
+
+    def update(self, games_df=None, chests_df=None):
+        stats = {"games": 0, "chests": 0}
+        with self.conn:
+            if games_df is not None and len(games_df):
+                stats["games"] = self._update_games(games_df)
+            if chests_df is not None and len(chests_df):
+                stats["chests"] = self._update_chests(chests_df)
+        logger.info(f"Feature store updated: {stats}")
+        return stats
+
+    def _new_games(self, games_df):
+        # игры с уже учтённым _id пропускаем, чтобы повторная доставка не задвоила агрегаты
+        games_df = games_df[~(games_df["_id"].notna() & games_df["_id"].duplicated())]
+        ids = games_df["_id"].dropna().astype(str).unique().tolist()
+        seen = self._mark_seen("seen_games", "game_id", ids)
+        if not seen:
+            return games_df
+        return games_df[~games_df["_id"].astype(str).isin(seen) | games_df["_id"].isna()]
+
+    def _new_chests(self, chests_df):
+        # своего id у сундука нет: ключ - его поля и номер повторения в обновлении, потому что
+        # одинаковые открытия (тот же игрок, тип и секунда) законны; учтённые ключи пропускаем
+        keys = _chest_keys(chests_df)
+        seen = self._mark_seen("seen_chests", "chest_key", keys.tolist())
+        if not seen:
+            return chests_df
+        return chests_df[~keys.isin(seen).to_numpy()]
+
+    def _mark_seen(self, table, column, keys):
+        # возвращает уже учтённые ключи, остальные записывает как учтённые
+        seen = set()
+        for i in range(0, len(keys), SQL_CHUNK):
+            chunk = keys[i:i + SQL_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT {column} FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            seen.update(row[0] for row in rows)
+        self.conn.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)",
+                              [(key,) for key in keys if key not in seen])
+        return seen
+
+    def _update_games(self, games_df):
+        games_df = self._new_games(games_df)
+        if games_df.empty:
+            return 0
+        players_long = self.games_processor.to_long(games_df)
+        grouped = players_long.groupby("player_id")
+
+        deltas = pd.DataFrame({
+            "games_played": grouped["is_win"].count(),
+            "wins": grouped["is_win"].sum(),
+        })
+        for name, col in self.games_processor.mean_features.items():
+            deltas[f"sum_{name}"] = grouped[col].sum()
+            deltas[f"cnt_{name}"] = grouped[col].count()
+
+        cols = list(deltas.columns)
+        self.conn.executemany(
+            f"INSERT INTO player_games (player_id, {', '.join(cols)}) VALUES (?{', ?' * len(cols)}) "
+            f"ON CONFLICT(player_id) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in cols)}",
+            _rows(deltas),
+        )
+
+        for kind, col in HIST_COLUMNS.items():
+            counts = players_long.groupby(["player_id", col]).size()
+            self.conn.executemany(
+                "INSERT INTO player_hist (player_id, kind, value, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(player_id, kind, value) DO UPDATE SET count = count + excluded.count",
+                [(player_id, kind, int(value), int(n)) for (player_id, value), n in counts.items()],
+            )
+
+        # последняя игра: игроки только с незапущенными играми тоже попадают (NULL), как в make_churn_labels
+        started = games_df["started_at"].to_numpy(dtype=np.float64, na_value=np.nan)
+        ids0, valid0 = parse_player_ids(games_df["users.0._id"])
+        ids1, valid1 = parse_player_ids(games_df["users.1._id"])
+        last_started = pd.Series(
+            np.concatenate([started[valid0], started[valid1]]),
+            index=np.concatenate([ids0, ids1]),
+        ).groupby(level=0).max()
+        self.conn.executemany(
+            "INSERT INTO player_last_game (player_id, last_started) VALUES (?, ?) "
+            "ON CONFLICT(player_id) DO UPDATE SET "
+            "last_started = max(coalesce(last_started, excluded.last_started), "
+            "coalesce(excluded.last_started, last_started))",
+            _rows(last_started.to_frame()),
+        )
+        self._advance_watermark("games", np.nanmax(started) if np.isfinite(started).any() else None)
+        return len(games_df)
+
+    def _update_chests(self, chests_df):
+        df = self.chests_processor.normalize(self._new_chests(chests_df))
+        if df.empty:
+            return 0
+        df = df.assign(open_ts=(df["open_at"] - pd.Timestamp(0)) / pd.Timedelta(seconds=1))
+        grouped = df.groupby("user._id")
+        deltas = pd.DataFrame({
+            "total_chests": grouped["chest.type"].count(),
+            "first_open": grouped["open_ts"].min(),
+            "last_open": grouped["open_ts"].max(),
+        })
+        # min/max с учётом NULL: coalesce, чтобы пустое значение не затирало известное
+        self.conn.executemany(
+            "INSERT INTO player_chests (player_id, total_chests, first_open, last_open) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(player_id) DO UPDATE SET "
+            "total_chests = total_chests + excluded.total_chests, "
+            "first_open = min(coalesce(first_open, excluded.first_open), coalesce(excluded.first_open, first_open)), "
+            "last_open = max(coalesce(last_open, excluded.last_open), coalesce(excluded.last_open, last_open))",
+            _rows(deltas),
+        )
+
+        for kind, col in CATEGORY_COLUMNS.items():
+            counts = df.groupby(["user._id", col]).size()
+            self.conn.executemany(
+                "INSERT INTO player_categories (player_id, kind, category, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(player_id, kind, category) DO UPDATE SET count = count + excluded.count",
+                [(player_id, kind, category, int(n)) for (player_id, category), n in counts.items()],
+            )
+        self._advance_watermark("chests", df["open_ts"].max())
+        return len(df)
+
+    # --- чтение ---
+
+    def _select(self, table, columns, player_ids):
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if player_ids is None:
+            return pd.read_sql_query(sql + " ORDER BY player_id", self.conn)
+        player_ids = [str(p) for p in player_ids]
+        parts = []
+        for i in range(0, len(player_ids), SQL_CHUNK):
+            chunk = player_ids[i:i + SQL_CHUNK]
+            parts.append(pd.read_sql_query(
+                sql + f" WHERE player_id IN ({','.join('?' * len(chunk))})", self.conn, params=chunk))
+        frame = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+        return frame.sort_values("player_id", ignore_index=True)
+
+    def games_features(self, player_ids=None):
+        sums = [f"sum_{name}" for name in self.mean_features]
+        cnts = [f"cnt_{name}" for name in self.mean_features]
+        rows = self._select("player_games", ["player_id", "games_played", "wins"] + sums + cnts, player_ids)
+
+        agg_feat = rows[["player_id"]].copy()
+        agg_feat["games_played"] = rows["games_played"].astype("int64")
+        agg_feat["wins"] = rows["wins"].astype("int64")
+        for name in self.mean_features:
+            cnt = rows[f"cnt_{name}"].astype(float)
+            agg_feat[name] = rows[f"sum_{name}"].astype(float) / cnt.where(cnt > 0)
+
+        hist = self._select("player_hist", ["player_id", "kind", "value", "count"], player_ids)
+        for kind, name in (("hour", "start_hour_mode"), ("dow", "start_dow_mode")):
+            part = hist[hist["kind"] == kind]
+            # мода: самое частое значение, при равенстве - меньшее (как groupby_mode)
+            part = part.sort_values(["player_id", "count", "value"], ascending=[True, False, True], kind="mergesort")
+            modes = part.drop_duplicates("player_id").set_index("player_id")["value"].astype("int64")
+            agg_feat[name] = agg_feat["player_id"].map(modes)
+        return self.games_processor.finalize(agg_feat)
+
+    def chests_features(self, player_ids=None, as_of=None):
+        rows = self._select("player_chests", ["player_id", "total_chests", "first_open", "last_open"], player_ids)
+        cats = self._select("player_categories", ["player_id", "kind", "category", "count"], player_ids)
+
+        agg_chests = pd.DataFrame({
+            "user._id": rows["player_id"],
+            "total_chests": rows["total_chests"].astype("int64"),
+            "unique_chests": rows["player_id"].map(
+                cats[(cats["kind"] == "chest") & (cats["count"] > 0)].groupby("player_id").size()
+            ).fillna(0).astype("int64"),
+            "last_open": pd.to_datetime(rows["last_open"].astype(float), unit="s"),
+            "first_open": pd.to_datetime(rows["first_open"].astype(float), unit="s"),
+        })
+        counts = {}
+        for kind, prefix in (("chest", "chest_"), ("open_with", "open_with_")):
+            part = cats[cats["kind"] == kind]
+            table = part.pivot_table(index="player_id", columns="category", values="count", aggfunc="sum", fill_value=0)
+            table = table.reindex(rows["player_id"], fill_value=0).astype("int64")
+            table.columns.name = None
+            table.index.name = "user._id"
+            counts[kind] = table.add_prefix(prefix).reset_index()
+        return self.chests_processor.finalize(agg_chests, counts["chest"], counts["open_with"], as_of)
+
+    def last_games(self, player_ids=None):
+        # player_id, last_game_date - вход utils.churn_from_last_games
+        rows = self._select("player_last_game", ["player_id", "last_started"], player_ids)
+        return pd.DataFrame({
+            "player_id": rows["player_id"],
+            "last_game_date": epoch_to_datetime(rows["last_started"].astype(float)),
+        })
+
+    def features(self, player_ids=None, as_of=None):
+        # то же, что join препроцессоров в ChurnPipeline.transform
+        games_features = self.games_features(player_ids)
+        chests_features = self.chests_features(player_ids, as_of)
+        return games_features.join(chests_features, how="left")
+
+    def predict_proba(self, pipeline, player_ids=None, as_of=None):
+        features = self.features(player_ids, as_of)
+        if features.empty:
+            return pd.Series(dtype=float, name="prob_churn")
+        return pipeline.predict_proba_features(features)
+
+
+def _chest_keys(chests_df):
+    # поля сундука строкой (open_at - как float, чтобы 1700000000 и 1700000000.0 совпали) и номер
+    # повторения такой же строки в этом обновлении
+    frame = chests_df.reindex(columns=CHEST_KEY_COLUMNS)
+    frame["open_at"] = pd.to_numeric(frame["open_at"], errors="coerce").astype(float)
+    fields = frame[CHEST_KEY_COLUMNS[0]].astype(str)
+    for col in CHEST_KEY_COLUMNS[1:]:
+        fields = fields + "\x1f" + frame[col].astype(str)
+    return fields + "\x1f" + fields.groupby(fields).cumcount().astype(str)
+
+
+def _rows(deltas):
+    # object-колонки отдают python-типы, понятные sqlite; NaN -> NULL
+    values = deltas.astype(object).where(deltas.notna(), None)
+    return [(player_id, *row) for player_id, row in zip(values.index, values.itertuples(index=False, name=None))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальное хранилище фич игроков")
+    parser.add_argument("--db", default="features.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    upd = sub.add_parser("update", help="добавить новые игры/сундуки из csv")
+    upd.add_argument("--games")
+    upd.add_argument("--chests")
+    score = sub.add_parser("score", help="посчитать вероятности по агрегатам")
+    score.add_argument("--model", default="churn_pipeline.pkl")
+    score.add_argument("--player", action="append", help="player_id, можно несколько раз; по умолчанию все")
+    score.add_argument("--output")
+    score.add_argument("--as-of", help="дата отсчёта days_since_last, по умолчанию текущее время")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = FeatureStore(args.db)
+    try:
+        if args.command == "update":
+            games_df = pd.read_csv(args.games) if args.games else None
+            chests_df = pd.read_csv(args.chests) if args.chests else None
+            print(store.update(games_df, chests_df))
+        else:
+            probs = store.predict_proba(load_pipeline(args.model), args.player, args.as_of)
+            if args.output:
+                probs.to_csv(args.output)
+            else:
+                print(probs)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import pandas as pd
 import json
 
-games_df = pd.read_csv('data/online-games.csv')
-chests_df = pd.read_csv('data/chests.csv')
+import config
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
+
+# в payload - колонки, которые нужны модели, и ники
+games_df = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS + ["users.0.username", "users.1.username"])
+chests_df = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS + ["user.username"])
 
 # все активные игроки
 users_games_0 = games_df['users.0._id'].dropna().unique()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+
+import config
+from artifact import MANIFEST, is_artifact, load_artifact
+from engines import make_engine
+from metrics import collect, observe_timings, timed
+from payload import games_columns, chests_columns, json_to_games_df, json_to_chests_df
+
+logger = logging.getLogger(__name__)
+
+# пайплайны, загруженные в текущем процессе (в process-пуле у каждого воркера свой):
+# путь -> (отметка файла, пайплайн, прочитан ли файл с этой отметкой), не больше MODEL_CACHE_SIZE
+# последних использованных
+_pipelines = OrderedDict()
+_pipelines_lock = threading.Lock()
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class InferenceTimeout(Exception):
+    pass
+
+
+def model_stamp(model_path):
+    # mtime и размер файла модели (у артефакта - manifest.json, он пишется последним);
+    # None - файла нет
+    path = os.path.join(model_path, MANIFEST) if os.path.isdir(model_path) else model_path
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_pipeline(model_path, keep_previous=True):
+    # файл, перезаписанный на месте, перечитывается при следующем вызове; если новый файл не читается
+    # (ещё дописывается), остаётся прежний пайплайн до следующего изменения файла
+    # (keep_previous=False - ошибка, так реестр не примет недописанную версию)
+    stamp = model_stamp(model_path)
+    with _pipelines_lock:
+        cached = _pipelines.get(model_path)
+        if cached is not None and (stamp is None or cached[0] == stamp and (keep_previous or cached[2])):
+            _pipelines.move_to_end(model_path)
+            return cached[1]
+        try:
+            # каталог с manifest.json - артефакт без pickle, иначе старый joblib-файл
+            if is_artifact(model_path):
+                pipeline = load_artifact(model_path)
+            else:
+                pipeline = joblib.load(model_path)
+        except Exception as e:
+            if cached is None or not keep_previous:
+                raise
+            logger.warning(f"Failed to reload {model_path} ({e}), keeping the previous model")
+            _pipelines[model_path] = (stamp, cached[1], False)
+            return cached[1]
+        pipeline.engine = make_engine(config.PREDICT_ENGINE, pipeline.model, config.PREDICT_THREADS)
+        logger.info(f"Loaded {model_path} with {config.PREDICT_ENGINE} engine")
+        _pipelines[model_path] = (stamp, pipeline, True)
+        _pipelines.move_to_end(model_path)
+        # запросы в полёте держат ссылку на вытесненный пайплайн сами
+        while len(_pipelines) > config.MODEL_CACHE_SIZE:
+            _pipelines.popitem(last=False)
+        return pipeline
+
+
+def payload_frames(games, chests):
+    # json-записи -> DataFrame по схеме; уже разобранные (fingerprint_payload для кэша /predict) - как есть
+    if isinstance(games, pd.DataFrame):
+        return games, chests
+    with timed("flatten"):
+        return json_to_games_df(games, games_columns), json_to_chests_df(chests, chests_columns)
+
+
+def score_payload(model_path, games, chests, as_of=None):
+    games_df, chests_df = payload_frames(games, chests)
+
+    if games_df.empty:
+        raise ValueError("Empty games dataframe - at least 1 game required")
+
+    logger.info(f"Games: {games_df.shape}, Chests: {chests_df.shape}")
+
+    proba_series = load_pipeline(model_path).predict_proba(games_df, chests_df, as_of=as_of)
+    return proba_series.to_dict()
+
+
+class InferencePool:
+    # выносит CPU-работу из event loop; ограничивает число запросов в очереди пула
+    def __init__(self, kind="thread", workers=4, max_pending=32, timeout=10.0, model_path=None):
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        elif kind == "process":
+            # модель грузится один раз в каждом воркере
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=load_pipeline if model_path else None,
+                initargs=(model_path,) if model_path else (),
+            )
+        else:
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+
+    async def run(self, fn, *args):
+        # счётчик меняется только из event loop, поэтому без блокировок
+        if self.pending >= self.max_pending:
+            raise PoolSaturated(f"Inference pool is saturated ({self.pending} pending requests)")
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            # collect возвращает (результат, тайминги стадий) и в thread, и в process пуле
+            cf = self.executor.submit(collect, fn, *args)
+        except Exception:
+            self.pending -= 1
+            raise
+        # слот освобождается, когда работа реально завершилась, а не по таймауту
+        cf.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+        future = asyncio.wrap_future(cf)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result, timings = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # задачу, которая ещё не стартовала, снимаем с очереди
+            cf.cancel()
+            raise InferenceTimeout(f"Inference did not finish in {self.timeout:.1f}s")
+        observe_timings(timings)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _release(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
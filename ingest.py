@@ -0,0 +1,80 @@
+import pandas as pd
+
+from payload import games_columns, numeric_columns
+from preprocess import parse_datetime
+
+# типизированная загрузка истории для больших выгрузок:
+#   id, имена, типы сундуков - category (строка хранится один раз, в строках - коды)
+#   статистика игр и пользователей - float32
+#   ISO-даты - datetime64, разобраны один раз при загрузке, препроцессоры их не парсят повторно
+# started_at/ended_at/open_at остаются числами секунд эпохи (float64/int64): float32 их не вмещает без потерь.
+# Статистика в float32 сдвигает вероятности в пределах ~1e-6 относительно обычного read_csv
+
+GAMES_CATEGORY_COLUMNS = [
+    "game_mode", "creator_id", "winner", "end_stats.game_id",
+    "users.0._id", "users.0.username", "users.1._id", "users.1.username",
+]
+GAMES_DATETIME_COLUMNS = [
+    "updated_at", "created_at", "end_stats.updated_at", "end_stats.created_at",
+    "users.0.created_at", "users.1.created_at",
+]
+EPOCH_COLUMNS = {"started_at", "ended_at", "open_at"}
+GAMES_FLOAT32_COLUMNS = [c for c in games_columns if c in numeric_columns and c not in EPOCH_COLUMNS]
+
+CHESTS_CATEGORY_COLUMNS = ["user._id", "user.username", "chest.type", "opened_with"]
+
+
+def games_dtypes():
+    dtypes = {c: "category" for c in GAMES_CATEGORY_COLUMNS}
+    dtypes.update({c: "float32" for c in GAMES_FLOAT32_COLUMNS})
+    dtypes["_id"] = str
+    return dtypes
+
+
+def chests_dtypes():
+    return {c: "category" for c in CHESTS_CATEGORY_COLUMNS}
+
+
+def read_games_csv(path, **kwargs):
+    # колонки сразу читаются в нужные типы, без промежуточных object-колонок
+    df = pd.read_csv(path, dtype=games_dtypes(), **kwargs)
+    return _parse_dates(df)
+
+
+def read_chests_csv(path, **kwargs):
+    return pd.read_csv(path, dtype=chests_dtypes(), **kwargs)
+
+
+def compact_games(df):
+    # то же для уже загруженного фрейма (json, event store); колонки заменяются по одной, без копии всего df
+    df = df.copy(deep=False)
+    for col, dtype in games_dtypes().items():
+        if col in df.columns and dtype != str:
+            df[col] = df[col].astype(dtype)
+    return _parse_dates(df)
+
+
+def compact_chests(df):
+    df = df.copy(deep=False)
+    for col in CHESTS_CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _parse_dates(df):
+    for col in GAMES_DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_datetime(df[col])
+    return df
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+if __name__ == "__main__":
+    games_df = read_games_csv("data/online-games.csv")
+    chests_df = read_chests_csv("data/chests.csv")
+    print(f"Games: {memory_mb(pd.read_csv('data/online-games.csv')):.1f} MB -> {memory_mb(games_df):.1f} MB")
+    print(f"Chests: {memory_mb(pd.read_csv('data/chests.csv')):.1f} MB -> {memory_mb(chests_df):.1f} MB")
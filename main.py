@@ -1,97 +1,537 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
-import joblib
-import pandas as pd
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional, Union
 
+import asyncio
+import gc
+import json
 import logging
+import os
+import secrets
+import time
+from contextlib import asynccontextmanager
+
+import config
+import metrics
+from batching import (BATCH_FORMATS, MicroBatcher, batch_format, batch_payload, batch_results, encode_arrow,
+                      encode_msgpack)
+from cache import PredictionCache, fingerprint_payload
+from event_store import score_players, score_username
+from inference import InferencePool, PoolSaturated, InferenceTimeout, score_payload
+from streaming import RequestAssembler, ChunkBuffer, aiter_lines, dumps_line, format_results, parse_line, score_items
+from preprocess import reference_time
+from registry import ModelRegistry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
-pipeline = joblib.load('churn_pipeline.pkl')
-
-games_columns = [
-    "_id", "game_mode", "creator_id", "status", "started_at", "ended_at", "winner",
-    "score.0", "score.1", "frames_count", "isRematch", "updated_at", "created_at",
-    "end_stats.rating_points.0", "end_stats.rating_points.1",
-    "end_stats.highest_break.0", "end_stats.highest_break.1",
-    "end_stats.balls_potted.0", "end_stats.balls_potted.1",
-    "end_stats.total_points.0", "end_stats.total_points.1",
-    "end_stats.table_time.0", "end_stats.table_time.1",
-    "end_stats.pot_success.0", "end_stats.pot_success.1",
-    "end_stats.shot_time.0", "end_stats.shot_time.1",
-    "end_stats.game_id", "end_stats.updated_at", "end_stats.created_at",
-    "users.0._id", "users.0.username", "users.0.created_at",
-    "users.0.seconds_in_game", "users.0.online.online_sessions", "users.0.online_game_rating.value", "users.0.energy.count",
-    "users.1._id", "users.1.username", "users.1.created_at",
-    "users.1.seconds_in_game", "users.1.online.online_sessions", "users.1.online_game_rating.value", "users.1.energy.count"
-]
-
-chests_columns = [
-    "user._id", "user.username", "chest.type", "opened_with", "open_at"
-]
+if config.REQUEST_PARSING not in ("strict", "fast"):
+    raise ValueError(f"Unknown REQUEST_PARSING: {config.REQUEST_PARSING}")
+if config.REQUEST_PARSING == "fast":
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError("REQUEST_PARSING=fast requires orjson: pip install orjson")
+
+# активная модель (и теневая) - из каталога версий MODEL_DIR или файл MODEL_PATH;
+# запрос берёт registry.active один раз в начале и считается этой версией до конца.
+# Реестр, пул и микробатчер создаются на старте приложения (lifespan) и закрываются на остановке
+registry = None
+pool = None
+batcher = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global registry, pool, batcher
+    registry = ModelRegistry(config.MODEL_DIR, config.MODEL_PATH, config.SHADOW_MODEL or None,
+                             config.SHADOW_SAMPLE_RATE)
+    pool = InferencePool(
+        kind=config.INFERENCE_EXECUTOR,
+        workers=config.INFERENCE_WORKERS,
+        max_pending=config.INFERENCE_MAX_PENDING,
+        timeout=config.INFERENCE_TIMEOUT_SEC,
+        model_path=registry.active.path,
+    )
+    batcher = None
+    if config.BATCH_MAX_SIZE > 1:
+        batcher = MicroBatcher(
+            pool,
+            registry.active.path,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS,
+            max_queue=config.INFERENCE_MAX_PENDING * config.BATCH_MAX_SIZE,
+        )
+    # новые версии в MODEL_DIR и перезаписанные на месте файлы подхватываются без перезапуска
+    watcher = None
+    if config.MODEL_POLL_SEC > 0:
+        watcher = asyncio.get_running_loop().create_task(registry.watch(config.MODEL_POLL_SEC))
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if batcher is not None:
+            batcher.close()
+        pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class MetricsMiddleware:
+    # ASGI-обёртка без перехвата receive, чтобы не мешать потоковому чтению тела в /predict/stream;
+    # время считается до конца ответа, путь - шаблон маршрута (/predict/{player_id})
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        scope.setdefault("state", {})["started"] = start
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, path=path, method=scope["method"])
+            metrics.REQUESTS.inc(path=path, method=scope["method"], status=status["code"])
+
+
+app.add_middleware(MetricsMiddleware)
+
+cache = None
+if config.PREDICT_CACHE_SIZE > 0:
+    cache = PredictionCache(
+        max_size=config.PREDICT_CACHE_SIZE,
+        ttl_sec=config.PREDICT_CACHE_TTL_SEC,
+        freshness_sec=config.PREDICT_CACHE_FRESHNESS_SEC,
+    )
+
+# фоновые задачи теневой модели (ссылки, чтобы задачи не собрал сборщик мусора)
+_shadow_tasks = set()
+
+def _fast_as_of(obj):
+    as_of = obj.get("as_of")
+    if as_of is not None and (isinstance(as_of, bool) or not isinstance(as_of, (int, float, str))):
+        raise ValueError("as_of must be a string or a number")
+    return as_of
+
 
 class RequestData(BaseModel):
     games: List[Dict[str, Any]]
     chests: List[Dict[str, Any]]
+    # дата отсчёта days_since_last (ISO-строка или секунды эпохи); без неё - время запроса
+    as_of: Optional[Union[float, str]] = None
+
+    @classmethod
+    def from_fast(cls, obj):
+        # REQUEST_PARSING=fast: проверяется только структура, вложенные записи не копируются
+        if not isinstance(obj, dict):
+            raise ValueError("Body must be a JSON object")
+        games, chests = batch_payload(obj)
+        return cls.model_construct(games=games, chests=chests, as_of=_fast_as_of(obj))
+
+
+class BatchRequestData(BaseModel):
+    # элементы - {"id": ..., "games": [...], "chests": [...]}; структура проверяется поэлементно
+    # (batch_payload), чтобы один кривой элемент не давал 422 на всё тело
+    items: List[Any]
+    as_of: Optional[Union[float, str]] = None
+
+    @classmethod
+    def from_fast(cls, obj):
+        if not isinstance(obj, dict) or not isinstance(obj.get("items"), list):
+            raise ValueError("Body must be a JSON object with an items list")
+        return cls.model_construct(items=obj["items"], as_of=_fast_as_of(obj))
+
+
+def _body_schema(model):
+    # тело читается вручную (_read_request), схема для OpenAPI задаётся явно
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
 
-def flatten_nested_arrays(obj: Dict[str, Any], parent_key: str = "", sep: str = ".") -> Dict[str, Any]:
-    # поддерживает dict + list -> плоские ключи типа users.0._id, score.1, end_stats.rating_points.0
-    items = []
-    for k, v in obj.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_nested_arrays(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            for i, item in enumerate(v):
-                idx_key = f"{new_key}{sep}{i}"
-                if isinstance(item, dict):
-                    items.extend(flatten_nested_arrays(item, idx_key, sep=sep).items())
-                else:
-                    items.append((idx_key, item))
-        else:
-            items.append((new_key, v))
-    return dict(items)
-
-def json_to_games_df(json_list: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
-    flattened_data = [flatten_nested_arrays(item) for item in json_list]
-    df = pd.DataFrame(flattened_data)
-    for col in columns:
-        if col not in df.columns:
-            df[col] = None
-    return df[columns]
-
-def json_to_chests_df(json_list: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
-    flattened_data = [flatten_nested_arrays(item) for item in json_list]
-    df = pd.DataFrame(flattened_data)
-    for col in columns:
-        if col not in df.columns:
-            df[col] = None
-    return df[columns]
-
-
-@app.post("/predict")
-async def predict(data: RequestData):
+
+def _fast_loads(body):
+    # в разобранном json нет циклов, а сборщик мусора на сотнях тысяч новых dict/list раз за разом
+    # обходит всю кучу процесса (модель, pandas): на время разбора он выключается, это в разы быстрее
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return orjson.loads(body)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+async def _read_request(request, model):
+    # strict: json.loads и полная валидация pydantic, как у обычного тела FastAPI (те же 422);
+    # fast: orjson + model.from_fast, без валидации каждого поля каждой игры
+    body = await request.body()
+    if config.REQUEST_PARSING == "strict":
+        try:
+            obj = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestValidationError([{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error",
+                                           "input": {}, "ctx": {"error": e.msg}}])
+        try:
+            return model.model_validate(obj)
+        except ValidationError as e:
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+    try:
+        return model.from_fast(_fast_loads(body))
+    except ValueError as e:
+        # orjson.JSONDecodeError - тоже ValueError
+        raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(e)}])
+
+
+def _parse_as_of(value):
+    if value is None:
+        return None
+    try:
+        return reference_time(value)
+    except (ValueError, TypeError) as e:
+        metrics.ERRORS.inc(kind="invalid")
+        raise HTTPException(status_code=400, detail=f"Error: invalid as_of: {e}")
+
+
+def _response(body, as_of, model):
+    body["model_version"] = model.version
+    if as_of is not None:
+        body["as_of"] = as_of.isoformat()
+    return body
+
+
+def _json(body):
+    # в fast ответ сериализуется orjson сразу, без jsonable_encoder и json.dumps
+    if config.REQUEST_PARSING != "fast":
+        return body
+    return Response(orjson.dumps(body, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY),
+                    media_type="application/json")
+
+
+def _probabilities(result):
+    # {игрок: вероятность}; у score_items - список результатов элементов, ключ (номер элемента, игрок)
+    if isinstance(result, dict):
+        return result
+    return {(i, player): prob for i, r in enumerate(result) if isinstance(r, dict) for player, prob in r.items()}
+
+
+async def _run_shadow(shadow, model, primary, fn, args):
     try:
-        games_df = json_to_games_df(data.games, games_columns)
-        chests_df = json_to_chests_df(data.chests, chests_columns)
+        result = _probabilities(await pool.run(fn, shadow.path, *args))
+    except Exception as e:
+        logger.warning(f"Shadow model {shadow.version} failed: {e}")
+        metrics.SHADOW_REQUESTS.inc(outcome="error")
+        return
+    metrics.SHADOW_REQUESTS.inc(outcome="scored")
+    primary = _probabilities(primary)
+    diffs = [abs(prob - primary[player]) for player, prob in result.items() if player in primary]
+    for diff in diffs:
+        metrics.SHADOW_ABS_DIFF.observe(diff)
+    if diffs:
+        logger.info(f"Shadow model {shadow.version} vs {model.version}: {len(diffs)} players, "
+                    f"max abs diff {max(diffs):.4f}")
 
-        if games_df.empty:
-            raise ValueError("Empty games dataframe - at least 1 game required")
 
-        logger.info(f"Games: {games_df.shape}, Chests: {chests_df.shape}")
-        
-        proba_series = pipeline.predict_proba(games_df, chests_df)
+def _shadow(model, primary, fn, *args):
+    # тот же вызов теневой моделью - в фоне, после ответа основной, поэтому задержку ответа не добавляет;
+    # только при свободных воркерах, чтобы не отнимать их у основных запросов
+    shadow = registry.sample_shadow()
+    if shadow is None:
+        return
+    if pool.pending >= pool.workers:
+        metrics.SHADOW_REQUESTS.inc(outcome="skipped")
+        return
+    task = asyncio.get_running_loop().create_task(_run_shadow(shadow, model, primary, fn, args))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
 
-        result = proba_series.to_dict()
-        
-        logger.info(f"Predictions for {len(result)} players")
-        
-        return {"probabilities": result}
 
+async def _await_scoring(job):
+    # общий перевод ошибок пула в http-коды
+    try:
+        return await job
+    except PoolSaturated as e:
+        logger.warning(f"Rejected: {e}")
+        metrics.ERRORS.inc(kind="saturated")
+        raise HTTPException(status_code=503, detail=f"Error: {e}", headers={"Retry-After": "1"})
+    except InferenceTimeout as e:
+        logger.error(f"Timeout: {e}")
+        metrics.ERRORS.inc(kind="timeout")
+        raise HTTPException(status_code=504, detail=f"Error: {e}")
     except Exception as e:
         logger.error(f"Error: {e}")
+        metrics.ERRORS.inc(kind="invalid")
         raise HTTPException(status_code=400, detail=f"Error: {e}")
+
+
+@app.post("/predict", openapi_extra=_body_schema(RequestData))
+async def predict(request: Request):
+    # чтение тела и разбор (pydantic или orjson) - от входа в приложение до готового RequestData
+    data = await _read_request(request, RequestData)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - request.state.started, stage="parse")
+    metrics.PAYLOAD_GAMES.observe(len(data.games))
+    metrics.PAYLOAD_CHESTS.observe(len(data.chests))
+    as_of = _parse_as_of(data.as_of)
+    model = registry.active
+    games, chests = data.games, data.chests
+    fingerprints = None
+    if cache is not None:
+        # при промахе дальше считаются уже разобранные DataFrame, json не разбирается второй раз
+        fingerprints, (games, chests) = await _await_scoring(pool.run(fingerprint_payload, games, chests))
+        # ключ кэша - digest модели: после смены версии старые записи не находятся
+        result = cache.lookup(fingerprints, model.digest, as_of) if fingerprints else None
+        if result is not None:
+            logger.info(f"Cached predictions for {len(result)} players")
+            metrics.PLAYERS_SCORED.inc(len(result), endpoint="predict_cached")
+            return _json(_response({"probabilities": result}, as_of, model))
+
+    if batcher is not None:
+        job = batcher.submit(games, chests, as_of, model.path)
+    else:
+        job = pool.run(score_payload, model.path, games, chests, as_of)
+    result = await _await_scoring(job)
+    if fingerprints:
+        cache.store(fingerprints, model.digest, result, as_of)
+
+    logger.info(f"Predictions for {len(result)} players")
+    metrics.PLAYERS_SCORED.inc(len(result), endpoint="predict")
+    _shadow(model, result, score_payload, games, chests, as_of)
+
+    return _json(_response({"probabilities": result}, as_of, model))
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "model_version": registry.active.version, **cache.stats()}
+
+
+@app.post("/predict/batch", openapi_extra=_body_schema(BatchRequestData))
+async def predict_batch(request: Request, format: Optional[str] = None):
+    # много независимых запросов в одном теле: результат или ошибка по каждому элементу,
+    # элементы считаются пачками score_batch (один проход пайплайна на пачку)
+    data = await _read_request(request, BatchRequestData)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - request.state.started, stage="parse")
+    try:
+        fmt = batch_format(format, request.headers.get("accept"))
+    except (ValueError, ImportError) as e:
+        raise HTTPException(status_code=406, detail=f"Error: {e}")
+    if len(data.items) > config.PREDICT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Error: {len(data.items)} items, "
+                                                    f"at most {config.PREDICT_BATCH_MAX_ITEMS} per request")
+    as_of = _parse_as_of(data.as_of)
+    model = registry.active
+
+    results = [None] * len(data.items)
+    ids = [item.get("id") if isinstance(item, dict) else None for item in data.items]
+    buffer = ChunkBuffer(config.STREAM_CHUNK_SIZE, config.STREAM_CHUNK_ROWS)
+    chunks = []
+    for index, item in enumerate(data.items):
+        try:
+            games, chests = batch_payload(item)
+        except ValueError as e:
+            results[index] = e
+            continue
+        metrics.PAYLOAD_GAMES.observe(len(games))
+        metrics.PAYLOAD_CHESTS.observe(len(chests))
+        if buffer.add((index, ids[index], games, chests, as_of)):
+            chunks.append(buffer.take())
+    if buffer.items:
+        chunks.append(buffer.take())
+
+    # пачки параллельно, но не больше, чем воркеров в пуле
+    slots = asyncio.Semaphore(pool.workers)
+
+    async def run(chunk):
+        async with slots:
+            return chunk, await _score_chunk(chunk, "batch", model.path)
+
+    for chunk, chunk_results in await asyncio.gather(*(run(chunk) for chunk in chunks)):
+        for (index, *_), result in zip(chunk, chunk_results):
+            results[index] = result
+        _shadow(model, chunk_results, score_items, chunk)
+
+    failed = sum(isinstance(r, Exception) for r in results)
+    if failed:
+        metrics.ERRORS.inc(failed, kind="batch_item")
+    scored = sum(len(r) for r in results if isinstance(r, dict))
+    metrics.PLAYERS_SCORED.inc(scored, endpoint="predict_batch")
+    logger.info(f"Batch of {len(results)} items: {scored} players, {failed} failed items")
+
+    body = _response({"results": batch_results(ids, results), "failed": failed}, as_of, model)
+    if fmt == "msgpack":
+        return Response(encode_msgpack(body), media_type=BATCH_FORMATS[fmt])
+    if fmt == "arrow":
+        return Response(encode_arrow(body), media_type=BATCH_FORMATS[fmt])
+    return _json(body)
+
+
+def _check_event_store():
+    if not os.path.exists(config.EVENT_STORE_PATH):
+        raise HTTPException(status_code=503, detail=f"Error: event store {config.EVENT_STORE_PATH} not found")
+
+
+# история игрока берётся из локального хранилища, а не из тела запроса
+@app.get("/predict/by-username/{username}")
+async def predict_by_username(username: str, as_of: Optional[str] = None):
+    _check_event_store()
+    as_of = _parse_as_of(as_of)
+    model = registry.active
+    result = await _await_scoring(
+        pool.run(score_username, model.path, config.EVENT_STORE_PATH, username, as_of))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Error: no games for username {username}")
+    metrics.PLAYERS_SCORED.inc(len(result), endpoint="predict_by_username")
+    _shadow(model, result, score_username, config.EVENT_STORE_PATH, username, as_of)
+    return _json(_response({"username": username, "probabilities": result}, as_of, model))
+
+
+@app.get("/predict/{player_id}")
+async def predict_by_player(player_id: str, as_of: Optional[str] = None):
+    _check_event_store()
+    as_of = _parse_as_of(as_of)
+    model = registry.active
+    result = await _await_scoring(
+        pool.run(score_players, model.path, config.EVENT_STORE_PATH, [player_id], as_of))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Error: no games for player {player_id}")
+    metrics.PLAYERS_SCORED.inc(len(result), endpoint="predict_by_player")
+    _shadow(model, result, score_players, config.EVENT_STORE_PATH, [player_id], as_of)
+    return _json(_response({"probabilities": result}, as_of, model))
+
+
+class BodyStreamingResponse(StreamingResponse):
+    # StreamingResponse параллельно ждёт disconnect через receive() и забирает куски тела запроса,
+    # которые генератор ещё не прочитал; здесь тело читает только сам генератор
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _score_chunk(items, kind, model_path):
+    # items: [(номер, id, games, chests, as_of)]; ошибка пачки (таймаут, сбой воркера) становится ошибкой её элементов
+    while True:
+        try:
+            return await pool.run(score_items, model_path, items)
+        except PoolSaturated:
+            # пачку не отбрасываем: ждём, пока пул освободится (в потоке - и не читаем тело дальше)
+            await asyncio.sleep(0.05)
+        except Exception as e:
+            logger.error(f"{kind.capitalize()} chunk error: {e}")
+            metrics.ERRORS.inc(kind=kind)
+            return [e] * len(items)
+
+
+async def _score_stream_chunk(items, model):
+    results = await _score_chunk(items, "stream", model.path)
+    metrics.PLAYERS_SCORED.inc(sum(len(r) for r in results if isinstance(r, dict)), endpoint="predict_stream")
+    return "".join(dumps_line(line) for line in format_results(items, results))
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request, as_of: Optional[str] = None):
+    # весь поток считается одной версией; она же в заголовке ответа (тело уже идёт строками).
+    # as_of - дата отсчёта для запросов потока без своего "as_of"
+    model = registry.active
+    as_of = _parse_as_of(as_of)
+
+    async def results():
+        assembler = RequestAssembler(config.STREAM_CHUNK_ROWS, as_of, config.STREAM_MAX_REQUEST_ROWS)
+        buffer = ChunkBuffer(config.STREAM_CHUNK_SIZE, config.STREAM_CHUNK_ROWS)
+        line_no = 0
+        async for line in aiter_lines(request.stream()):
+            line_no += 1
+            try:
+                obj = parse_line(line)
+            except ValueError as e:
+                yield dumps_line({"line": line_no, "error": str(e)})
+                continue
+            for item in assembler.feed(obj):
+                if buffer.add(item):
+                    yield await _score_stream_chunk(buffer.take(), model)
+        for item in assembler.flush():
+            buffer.add(item)
+        if buffer.items:
+            yield await _score_stream_chunk(buffer.take(), model)
+        logger.info(f"Stream finished: {assembler.count} requests")
+
+    return BodyStreamingResponse(results(), media_type="application/x-ndjson", headers={"X-Model-Version": model.version})
+
+
+class ActivateRequest(BaseModel):
+    version: str
+
+
+class ShadowRequest(BaseModel):
+    # version: None - выключить теневую модель; sample_rate: None - оставить прежнюю долю
+    version: Optional[str] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+
+
+def _check_admin(token):
+    # без ADMIN_TOKEN управление моделями выключено
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Error: admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if token is None or not secrets.compare_digest(token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Error: invalid admin token")
+
+
+async def _await_registry(job):
+    try:
+        await job
+    except (KeyError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=f"Error: {e.args[0] if isinstance(e, KeyError) else e}")
+    except Exception as e:
+        logger.error(f"Model load failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Error: failed to load model: {e}")
+    return registry.status()
+
+
+@app.get("/admin/models")
+async def admin_models(x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return registry.status()
+
+
+@app.post("/admin/models/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    # то же, что делает фоновый опрос MODEL_POLL_SEC, но сразу
+    _check_admin(x_admin_token)
+    return await _await_registry(registry.refresh())
+
+
+@app.post("/admin/models/activate")
+async def admin_activate(data: ActivateRequest, x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return await _await_registry(registry.activate(data.version))
+
+
+@app.post("/admin/models/unpin")
+async def admin_unpin(x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return await _await_registry(registry.unpin())
+
+
+@app.post("/admin/models/shadow")
+async def admin_shadow(data: ShadowRequest, x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return await _await_registry(registry.set_shadow(data.version, data.sample_rate))
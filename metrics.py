@@ -0,0 +1,163 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# метрики в текстовом формате Prometheus без сторонних зависимостей.
+# Стадии внутри воркеров пула (в том числе process) собираются в список вызова через collect()
+# и записываются в гистограммы уже в основном процессе
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+DIFF_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> (счётчики по бакетам, сумма, количество)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels_text(names, key + (bound,))} {n}")
+                lines.append(f"{self.name}_bucket{_labels_text(names, key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram("churn_request_seconds", "HTTP request latency", ["path", "method"])
+REQUESTS = Counter("churn_requests_total", "HTTP requests by status", ["path", "method", "status"])
+STAGE_SECONDS = Histogram("churn_stage_seconds", "Scoring stage latency", ["stage"])
+PAYLOAD_GAMES = Histogram("churn_payload_games", "Games per request", buckets=SIZE_BUCKETS)
+PAYLOAD_CHESTS = Histogram("churn_payload_chests", "Chests per request", buckets=SIZE_BUCKETS)
+PLAYERS_SCORED = Counter("churn_players_scored_total", "Players scored", ["endpoint"])
+ERRORS = Counter("churn_errors_total", "Scoring errors by kind", ["kind"])
+SHADOW_REQUESTS = Counter("churn_shadow_requests_total", "Shadow model scoring by outcome", ["outcome"])
+SHADOW_ABS_DIFF = Histogram("churn_shadow_abs_diff", "Absolute difference between shadow and active model probabilities",
+                            buckets=DIFF_BUCKETS)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_local = threading.local()
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        collector = getattr(_local, "timings", None)
+        if collector is not None:
+            collector.append((stage, elapsed))
+        else:
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+def observe_timings(timings):
+    for stage, elapsed in timings:
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+def collect(fn, *args):
+    # выполняется в воркере пула: (результат или исключение, [(стадия, секунды)])
+    _local.timings = timings = []
+    profiler = None
+    # профилируем выборочно и не больше одного вызова за раз на процесс
+    if (config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+            and _profile_lock.acquire(blocking=False)):
+        profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            result = profiler.runcall(fn, *args)
+        else:
+            result = fn(*args)
+    except Exception as e:
+        result = e
+    finally:
+        _local.timings = None
+        if profiler is not None:
+            _profile_lock.release()
+    elapsed = time.perf_counter() - start
+    if profiler is not None and elapsed * 1000 >= config.PROFILE_THRESHOLD_MS:
+        _dump_profile(profiler, fn, elapsed)
+    return result, timings
+
+
+def _dump_profile(profiler, fn, elapsed):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{fn.__name__}_{elapsed * 1000:.0f}ms.prof"
+    path = os.path.join(config.PROFILE_DIR, name)
+    profiler.dump_stats(path)
+    logger.info(f"Profile saved: {path}")
@@ -1,9 +1,12 @@
 import pandas as pd
 import joblib
 
-# загружаем данные
-games_df = pd.read_csv('data/online-games.csv')
-chests_df = pd.read_csv('data/chests.csv')
+import config
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
+
+# загружаем данные: колонки модели и ники для поиска
+games_df = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS + ["users.0.username", "users.1.username"])
+chests_df = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS + ["user.username"])
 pipeline = joblib.load('churn_pipeline.pkl')
 
 username = "Najibelgo"
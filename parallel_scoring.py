@@ -0,0 +1,46 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from batch_scoring import player_bucket
+from inference import load_pipeline
+
+logger = logging.getLogger(__name__)
+
+# параллельный скоринг: игроки делятся на шарды по hash(player_id), как в batch_scoring,
+# каждый шард считается в отдельном процессе; модель грузится один раз на воркер
+
+
+def shard_frames(games_df, chests_df, n_shards):
+    g0 = player_bucket(games_df["users.0._id"], n_shards)
+    g1 = player_bucket(games_df["users.1._id"], n_shards)
+    c0 = player_bucket(chests_df["user._id"], n_shards)
+    for shard in range(n_shards):
+        games_part = games_df[(g0 == shard) | (g1 == shard)]
+        if not games_part.empty:
+            yield shard, games_part, chests_df[c0 == shard]
+
+
+def score_shard(model_path, shard, n_shards, games_df, chests_df, as_of=None):
+    proba = load_pipeline(model_path).predict_proba(games_df, chests_df, as_of=as_of)
+    # соперники из других шардов здесь с неполной историей - их считает свой шард
+    return proba[player_bucket(proba.index.to_series(), n_shards) == shard]
+
+
+def score_parallel(model_path, games_df, chests_df, workers=4, shards_per_worker=4, as_of=None):
+    if workers <= 1:
+        return load_pipeline(model_path).predict_proba(games_df, chests_df, as_of=as_of)
+
+    # шардов больше, чем воркеров, чтобы крупные игроки не держали один процесс до конца
+    n_shards = workers * shards_per_worker
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_pipeline, initargs=(model_path,)) as executor:
+        futures = [
+            executor.submit(score_shard, model_path, shard, n_shards, games_part, chests_part, as_of)
+            for shard, games_part, chests_part in shard_frames(games_df, chests_df, n_shards)
+        ]
+        parts = [future.result() for future in futures]
+    logger.info(f"Scored {len(futures)} shards on {workers} workers")
+
+    # порядок как у последовательного predict_proba (player_id по возрастанию)
+    return pd.concat(parts).sort_index()
@@ -0,0 +1,198 @@
+from typing import List, Dict, Any
+import numpy as np
+import pandas as pd
+
+games_columns = [
+    "_id", "game_mode", "creator_id", "status", "started_at", "ended_at", "winner",
+    "score.0", "score.1", "frames_count", "isRematch", "updated_at", "created_at",
+    "end_stats.rating_points.0", "end_stats.rating_points.1",
+    "end_stats.highest_break.0", "end_stats.highest_break.1",
+    "end_stats.balls_potted.0", "end_stats.balls_potted.1",
+    "end_stats.total_points.0", "end_stats.total_points.1",
+    "end_stats.table_time.0", "end_stats.table_time.1",
+    "end_stats.pot_success.0", "end_stats.pot_success.1",
+    "end_stats.shot_time.0", "end_stats.shot_time.1",
+    "end_stats.game_id", "end_stats.updated_at", "end_stats.created_at",
+    "users.0._id", "users.0.username", "users.0.created_at",
+    "users.0.seconds_in_game", "users.0.online.online_sessions", "users.0.online_game_rating.value", "users.0.energy.count",
+    "users.1._id", "users.1.username", "users.1.created_at",
+    "users.1.seconds_in_game", "users.1.online.online_sessions", "users.1.online_game_rating.value", "users.1.energy.count"
+]
+
+chests_columns = [
+    "user._id", "user.username", "chest.type", "opened_with", "open_at"
+]
+
+# колонки, которые собираются в float64; остальные остаются object
+numeric_columns = {
+    "status", "started_at", "ended_at", "score.0", "score.1", "frames_count", "isRematch",
+    "end_stats.rating_points.0", "end_stats.rating_points.1",
+    "end_stats.highest_break.0", "end_stats.highest_break.1",
+    "end_stats.balls_potted.0", "end_stats.balls_potted.1",
+    "end_stats.total_points.0", "end_stats.total_points.1",
+    "end_stats.table_time.0", "end_stats.table_time.1",
+    "end_stats.pot_success.0", "end_stats.pot_success.1",
+    "end_stats.shot_time.0", "end_stats.shot_time.1",
+    "users.0.seconds_in_game", "users.0.online.online_sessions", "users.0.online_game_rating.value", "users.0.energy.count",
+    "users.1.seconds_in_game", "users.1.online.online_sessions", "users.1.online_game_rating.value", "users.1.energy.count",
+    "open_at",
+}
+
+def flatten_nested_arrays(obj: Dict[str, Any], parent_key: str = "", sep: str = ".") -> Dict[str, Any]:
+    # поддерживает dict + list -> плоские ключи типа users.0._id, score.1, end_stats.rating_points.0
+    items = []
+    for k, v in obj.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flatten_nested_arrays(v, new_key, sep=sep).items())
+        elif isinstance(v, list):
+            for i, item in enumerate(v):
+                idx_key = f"{new_key}{sep}{i}"
+                if isinstance(item, dict):
+                    items.extend(flatten_nested_arrays(item, idx_key, sep=sep).items())
+                else:
+                    items.append((idx_key, item))
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+def json_to_df_flatten(json_list: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    # исходный путь через flatten_nested_arrays, оставлен для сверки и бенчмарков
+    flattened_data = [flatten_nested_arrays(item) for item in json_list]
+    df = pd.DataFrame(flattened_data)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = None
+    return df[columns]
+
+
+def _path(col: str):
+    return tuple(int(part) if part.isdigit() else part for part in col.split("."))
+
+
+class SchemaExtractor:
+    # по списку колонок один раз генерируется функция, которая обходит запись
+    # только по нужным путям и пишет значения сразу в заранее выделенные колонки;
+    # в конце колонки один раз приводятся к float64/object
+    def __init__(self, columns: List[str], numeric=frozenset()):
+        self.columns = list(columns)
+        self.numeric = [col in numeric for col in self.columns]
+        self.tree = {}
+        for i, col in enumerate(self.columns):
+            node = self.tree
+            parts = _path(col)
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            node[parts[-1]] = i
+        self.source = self._generate()
+        namespace = {}
+        exec(compile(self.source, f"<extractor {len(self.columns)} columns>", "exec"), namespace)
+        self._extract = namespace["extract"]
+
+    def to_frame(self, records: List[Dict[str, Any]]) -> pd.DataFrame:
+        n = len(records)
+        columns = [[None] * n for _ in self.columns]
+        for row in self._extract(records, columns):
+            # в записи есть незнакомые ключи - например, плоские "users.0._id" из to_dict по csv
+            for key, value in records[row].items():
+                if key not in self.tree:
+                    node = self._lookup(key)
+                    if node is not None:
+                        self._put(node, value, row, columns)
+        data = {}
+        for col, values, is_num in zip(self.columns, columns, self.numeric):
+            data[col] = self._typed(values) if is_num else np.array(values, dtype=object)
+        # массивы только что созданы, копировать и консолидировать их незачем
+        return pd.DataFrame(data, copy=False)
+
+    @staticmethod
+    def _typed(values):
+        try:
+            # None -> nan
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            # нечисловое значение в числовой колонке - колонка остаётся object, как раньше
+            return np.array(values, dtype=object)
+
+    def _generate(self):
+        names = ", ".join(f"c{i}" for i in range(len(self.columns)))
+        lines = [
+            "def extract(records, columns):",
+            f"    {names}, = columns",
+            "    unknown = []",
+            "    for row, rec in enumerate(records):",
+            "        hits = 0",
+        ]
+        for key, child in self.tree.items():
+            if isinstance(key, int):
+                continue
+            lines.append(f"        if {key!r} in rec:")
+            lines.append("            hits += 1")
+            lines.append(f"            v0 = rec[{key!r}]")
+            self._emit(lines, child, "v0", 1, "            ")
+        lines.append("        if len(rec) > hits:")
+        lines.append("            unknown.append(row)")
+        lines.append("    return unknown")
+        return "\n".join(lines) + "\n"
+
+    def _emit(self, lines, node, var, depth, indent):
+        if not isinstance(node, dict):
+            lines.append(f"{indent}if {var} is not None and {var}.__class__ is not dict and {var}.__class__ is not list:")
+            lines.append(f"{indent}    c{node}[row] = {var}")
+            return
+        child_var = f"v{depth}"
+        str_keys = [(k, ch) for k, ch in node.items() if not isinstance(k, int)]
+        int_keys = [(k, ch) for k, ch in node.items() if isinstance(k, int)]
+        branch = "if"
+        if str_keys:
+            lines.append(f"{indent}if {var}.__class__ is dict:")
+            for key, child in str_keys:
+                lines.append(f"{indent}    {child_var} = {var}.get({key!r})")
+                self._emit(lines, child, child_var, depth + 1, indent + "    ")
+            branch = "elif"
+        if int_keys:
+            lines.append(f"{indent}{branch} {var}.__class__ is list:")
+            lines.append(f"{indent}    n{depth} = len({var})")
+            for key, child in int_keys:
+                lines.append(f"{indent}    if n{depth} > {key}:")
+                lines.append(f"{indent}        {child_var} = {var}[{key}]")
+                self._emit(lines, child, child_var, depth + 1, indent + "        ")
+
+    def _lookup(self, key):
+        if "." not in key:
+            return None
+        node = self.tree
+        for part in _path(key):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    # медленный путь для записей с плоскими ключами
+    def _put(self, node, value, row, columns):
+        if isinstance(node, dict):
+            if isinstance(value, dict):
+                for key, child in node.items():
+                    if key in value:
+                        self._put(child, value[key], row, columns)
+            elif isinstance(value, list):
+                for key, child in node.items():
+                    if isinstance(key, int) and key < len(value):
+                        self._put(child, value[key], row, columns)
+        elif value is not None and not isinstance(value, (dict, list)):
+            columns[node][row] = value
+
+
+_extractors = {}
+
+def get_extractor(columns: List[str]) -> SchemaExtractor:
+    key = tuple(columns)
+    if key not in _extractors:
+        _extractors[key] = SchemaExtractor(columns, numeric_columns)
+    return _extractors[key]
+
+def json_to_games_df(json_list: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    return get_extractor(columns).to_frame(json_list)
+
+def json_to_chests_df(json_list: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    return get_extractor(columns).to_frame(json_list)
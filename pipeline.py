@@ -2,6 +2,7 @@ import warnings
 import pandas as pd
 import numpy as np
 from lightgbm import LGBMClassifier
+from metrics import timed
 from preprocess import GamesPreprocessor, ChestsPreprocessor
 from sklearn.preprocessing import StandardScaler
 
@@ -17,17 +18,24 @@ class ChurnPipeline:
         )
         self.feature_names_ = None
 
-    def fit(self, games_df, chests_df, churn_labels):
+    def fit(self, games_df, chests_df, churn_labels, as_of=None):
+        # as_of - дата отсчёта days_since_last (по умолчанию текущее время), см. preprocess.reference_time
         games_features = self.games_processor.fit_transform(games_df)
-        chests_features = self.chests_processor.fit_transform(chests_df)
+        chests_features = self.chests_processor.fit(chests_df).transform(chests_df, as_of=as_of)
 
         games_features.index = games_features.index.astype(str)
         chests_features.index = chests_features.index.astype(str)
 
         features = games_features.join(chests_features, how="left")
+        return self.fit_features(features, churn_labels)
+
+    def fit_features(self, features, churn_labels, init_from=None):
+        # обучение на готовых агрегатах игроков (aggregate_features_for_split, FeatureStore.features)
+        # init_from - обученный пайплайн: его scaler и признаки сохраняются, а деревья self.model
+        # достраиваются к его бустеру (init_model LightGBM)
 
         # inf и NaN
-        features.replace([np.inf, -np.inf], 0, inplace=True)
+        features = features.replace([np.inf, -np.inf], 0)
         features.fillna(0, inplace=True)
 
         # метки
@@ -41,6 +49,12 @@ class ChurnPipeline:
         features = features.loc[common_index]
         y = y.loc[common_index]
 
+        if init_from is not None:
+            self.scaler = init_from.scaler
+            self.feature_names_ = list(init_from.feature_names_)
+            self.model.fit(self.transform_features(features), y, init_model=init_from.model.booster_)
+            return self
+
         # масштабирование
         features_scaled = self.scaler.fit_transform(features)
         features_scaled = pd.DataFrame(features_scaled, columns=features.columns, index=features.index)
@@ -49,19 +63,25 @@ class ChurnPipeline:
         self.model.fit(features_scaled, y)
         return self
 
-    def transform(self, games_df, chests_df):
+    def transform(self, games_df, chests_df, as_of=None):
         if self.feature_names_ is None:
             raise AttributeError("Pipeline not fitted")
 
         games_features = self.games_processor.transform(games_df)
-        chests_features = self.chests_processor.transform(chests_df)
+        chests_features = self.chests_processor.transform(chests_df, as_of=as_of)
 
         games_features.index = games_features.index.astype(str)
         chests_features.index = chests_features.index.astype(str)
 
         features = games_features.join(chests_features, how="left")
+        return self.transform_features(features)
 
-        features.replace([np.inf, -np.inf], 0, inplace=True)
+    def transform_features(self, features):
+        # готовые агрегаты игрока (как после join препроцессоров) -> масштабированная матрица модели
+        if self.feature_names_ is None:
+            raise AttributeError("Pipeline not fitted")
+
+        features = features.replace([np.inf, -np.inf], 0)
         features.fillna(0, inplace=True)
 
         for col in self.feature_names_:
@@ -72,13 +92,64 @@ class ChurnPipeline:
         features_scaled = self.scaler.transform(features)
         return pd.DataFrame(features_scaled, columns=self.feature_names_, index=features.index)
 
-    def predict_proba(self, games_df, chests_df):
-        features = self.transform(games_df, chests_df)
-        proba = self.model.predict_proba(features)[:, 1]
-        return pd.Series(proba, index=features.index, name='prob_churn')
+    def feature_matrix(self, games_features, chests_features=None):
+        # быстрый путь инференса: фичи сразу пишутся в float32-матрицу в порядке feature_names_
+        # и масштабируются на месте, без join/fillna/reindex и промежуточных DataFrame
+        if self.feature_names_ is None:
+            raise AttributeError("Pipeline not fitted")
+
+        index = games_features.index.astype(str)
+        X = np.zeros((len(index), len(self.feature_names_)), dtype=np.float32)
+        rows = None
+        if chests_features is not None:
+            # позиции строк сундуков для игроков из игр (-1 - нет сундуков), как left join
+            rows = chests_features.index.astype(str).get_indexer(index)
+            has_chests = rows >= 0
+
+        for j, col in enumerate(self.feature_names_):
+            if col in games_features.columns:
+                X[:, j] = games_features[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            elif rows is not None and col in chests_features.columns:
+                values = chests_features[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                X[has_chests, j] = values[rows[has_chests]]
+
+        # inf и NaN -> 0, как replace + fillna
+        X[~np.isfinite(X)] = 0
+        X -= self.scaler.mean_.astype(np.float32)
+        X /= self.scaler.scale_.astype(np.float32)
+        return X, index
+
+    def predict_proba(self, games_df, chests_df, as_of=None):
+        with timed("games_transform"):
+            games_features = self.games_processor.transform(games_df)
+        with timed("chests_transform"):
+            chests_features = self.chests_processor.transform(chests_df, as_of=as_of)
+        with timed("assemble"):
+            X, index = self.feature_matrix(games_features, chests_features)
+        with timed("model"):
+            return self._predict_matrix(X, index)
+
+    def predict_proba_features(self, features):
+        with timed("assemble"):
+            X, index = self.feature_matrix(features)
+        with timed("model"):
+            return self._predict_matrix(X, index)
+
+    def _predict_matrix(self, X, index):
+        # сырая матрица сразу в бустер, без проверок sklearn-обёртки; движок задаётся при загрузке
+        engine = getattr(self, "engine", None)
+        if not len(X):
+            proba = np.empty(0)
+        elif engine is not None:
+            proba = engine.predict(X)
+        else:
+            # без движка: бустер LightGBM напрямую, любая другая модель - через predict_proba
+            booster = getattr(self.model, "booster_", None)
+            proba = booster.predict(X) if booster is not None else self.model.predict_proba(X)[:, 1]
+        return pd.Series(proba, index=index, name='prob_churn')
 
     @staticmethod
-    def aggregate_features_for_split(games_df, chests_df):
+    def aggregate_features_for_split(games_df, chests_df, as_of=None):
         gproc = GamesPreprocessor()
         cproc = ChestsPreprocessor()
         try:
@@ -87,10 +158,10 @@ class ChurnPipeline:
             warnings.warn("GamesPreprocessor failed, using fit_transform")
             g_feats = gproc.fit_transform(games_df.copy())
         try:
-            c_feats = cproc.transform(chests_df)
+            c_feats = cproc.transform(chests_df, as_of=as_of)
         except:
             warnings.warn("ChestsPreprocessor failed, using fit_transform")
-            c_feats = cproc.fit_transform(chests_df.copy())
+            c_feats = cproc.fit(chests_df.copy()).transform(chests_df.copy(), as_of=as_of)
 
         g_feats.index = g_feats.index.astype(str)
         c_feats.index = c_feats.index.astype(str)
@@ -2,10 +2,149 @@ import pandas as pd
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 
+INVALID_IDS = ["unknown", "nan", "none"]
+# NaT в int64-представлении datetime64[ns]: меньше любого времени
+NAT = np.iinfo(np.int64).min
+
 def to_datetime_safe(df, col, unit='s'):
-    return pd.to_datetime(df[col], unit=unit, errors='coerce')
+    return epoch_to_datetime(df[col], unit=unit)
+
+def epoch_to_datetime(col, unit='s'):
+    # pandas 2.x для float-входа с unit не заполняет дробную часть у NaN и может упасть
+    # на мусоре в памяти с FloatingPointError; поэтому NaN заменяем сами и возвращаем как NaT
+    if pd.api.types.is_integer_dtype(col.dtype):
+        return pd.to_datetime(col, unit=unit, errors='coerce')
+    values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    na = np.isnan(values)
+    result = pd.to_datetime(pd.Series(np.where(na, 0.0, values), index=col.index), unit=unit, errors='coerce')
+    result[na] = pd.NaT
+    return result
+
+def epoch_to_ns(col):
+    # секунды эпохи -> int64-наносекунды datetime64[ns] (NAT - пропуск); целые секунды в диапазоне
+    # datetime64[ns] переводятся умножением, дробные и выход за диапазон - через epoch_to_datetime
+    values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    known = values[~np.isnan(values)]
+    if not ((np.abs(known) < 9.2e9) & (known == np.floor(known))).all():
+        return epoch_to_datetime(col).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    ns = np.full(len(values), NAT)
+    dated = ~np.isnan(values)
+    ns[dated] = values[dated].astype(np.int64) * 10 ** 9
+    return ns
+
+def parse_datetime(col):
+    # ISO-строки парсятся здесь; уже типизированная колонка (см. ingest.py) не разбирается повторно
+    if pd.api.types.is_datetime64_any_dtype(col):
+        if getattr(col.dt, "tz", None) is not None:
+            return col.dt.tz_convert(None)
+        return col
+    return pd.to_datetime(col, errors='coerce').dt.tz_localize(None)
+
+def reference_time(as_of=None):
+    # дата отсчёта для days_since_last: None - текущее время; строка/datetime или секунды эпохи
+    if as_of is None:
+        return pd.Timestamp.now()
+    if isinstance(as_of, (int, float, np.integer, np.floating)) and not isinstance(as_of, bool):
+        ts = pd.Timestamp(as_of, unit='s')
+    else:
+        ts = pd.Timestamp(as_of)
+    if pd.isna(ts):
+        raise ValueError(f"Invalid as_of: {as_of!r}")
+    return ts.tz_convert(None) if ts.tzinfo is not None else ts
+
+def player_ids(col):
+    # id к строке и фильтр "unknown"/"nan"/"none" считаются по уникальным значениям, а не по строкам;
+    # строки результата - ссылки на общие str, без отдельного объекта на каждую игру
+    codes, uniques = pd.factorize(col)
+    uniques = pd.Index(uniques).astype(str)
+    invalid = uniques.str.lower().str.strip().isin(INVALID_IDS)
+    # пропуск (код -1) при astype(str) становится "nan" и тоже отбрасывается
+    valid = codes >= 0
+    valid[valid] = ~invalid[codes[valid]]
+    return np.asarray(uniques, dtype=object)[codes[valid]], valid
+
+def player_codes(col):
+    # то же, что player_ids, но коды: (коды валидных строк, id по возрастанию, маска валидных строк);
+    # разные исходные значения с одинаковой строкой (5 и "5") получают один код
+    codes, uniques = pd.factorize(col)
+    uniques = pd.Index(uniques).astype(str)
+    invalid = np.asarray(uniques.str.lower().str.strip().isin(INVALID_IDS))
+    valid = codes >= 0
+    valid[valid] = ~invalid[codes[valid]]
+    merged, ids = pd.factorize(np.asarray(uniques[~invalid], dtype=object), sort=True)
+    remap = np.full(len(uniques), -1, dtype=np.intp)
+    remap[~invalid] = merged
+    return remap[codes[valid]], np.asarray(ids, dtype=object), valid
+
+def category_values(col, normalize, missing=None):
+    # normalize применяется к строковым уникальным значениям; пропуски заменяются на missing,
+    # а без него приводятся к строке поштучно, как в astype(str) ("nan" и "None" различаются)
+    codes, uniques = pd.factorize(col)
+    values = np.append(np.asarray(normalize(pd.Index(uniques).astype(str)), dtype=object), missing)[codes]
+    na = codes < 0
+    if missing is None and na.any():
+        values[na] = np.asarray(normalize(pd.Index(col[na]).astype(str)), dtype=object)
+    return values
+
+def category_codes(col, normalize, missing=None):
+    # категории после normalize как коды и отсортированные значения (как столбцы crosstab);
+    # значения, совпавшие после нормализации, сливаются; пропуски - как в category_values
+    codes, uniques = pd.factorize(col)
+    values = np.asarray(normalize(pd.Index(uniques).astype(str)), dtype=object)
+    na = codes < 0
+    if na.any():
+        if missing is None:
+            na_values = np.asarray(normalize(pd.Index(col[na]).astype(str)), dtype=object)
+        else:
+            na_values = np.full(int(na.sum()), missing, dtype=object)
+        na_codes, na_uniques = pd.factorize(na_values)
+        codes = codes.copy()
+        codes[na] = len(values) + na_codes
+        values = np.concatenate([values, np.asarray(na_uniques, dtype=object)])
+    merged, categories = pd.factorize(values, sort=True)
+    return merged[codes], np.asarray(categories, dtype=object)
+
+def normalize_chest_type(values):
+    return values.str.strip().str.lower()
+
+def normalize_opened_with(values):
+    return values.str.strip().str.lower().to_series().replace({"game store": "store", "gamestore": "store", "shop": "store"})
+
+def pair_counts(rows, cols, n_rows, n_cols):
+    # таблица сопряжённости по кодам, как crosstab: bincount по плоскому индексу строка * n_cols + столбец
+    return np.bincount(rows * n_cols + cols, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+def groupby_mode(df, by, col):
+    # мода по группам без lambda: считаем пары (by, col) и берём самую частую,
+    # при равенстве - наименьшее значение, как Series.mode().iloc[0]
+    counts = df.groupby([by, col], sort=False).size().reset_index(name="_count")
+    counts.sort_values([by, "_count", col], ascending=[True, False, True], inplace=True, kind="mergesort")
+    return counts.drop_duplicates(by).set_index(by)[col]
 
 class GamesPreprocessor(BaseEstimator, TransformerMixin):
+    # фича -> колонка long-формата, по которой считается среднее
+    mean_features = {
+        "rematch_rate": "isRematch",
+        "avg_duration_sec": "duration_sec",
+        "avg_points": "end_stats.total_points.0",
+        "avg_highest_break": "end_stats.highest_break.0",
+        "avg_pot_success": "end_stats.pot_success.0",
+        "avg_shot_time": "end_stats.shot_time.0",
+        "avg_table_time": "end_stats.table_time.0",
+        "avg_rating_delta": "end_stats.rating_points.0",
+        "user_account_age_days": "user0_account_age_days",
+    }
+    # статистика игры, которая попадает в long-формат (только сторона users.0)
+    p0_stats_cols = [
+        "end_stats.total_points.0", "end_stats.highest_break.0", "end_stats.pot_success.0",
+        "end_stats.shot_time.0", "end_stats.table_time.0", "end_stats.rating_points.0",
+    ]
+    # колонки X, которые читает transform; остальные можно не загружать
+    input_columns = [
+        "started_at", "ended_at", "winner", "isRematch",
+        "users.0._id", "users.1._id", "users.0.created_at",
+    ] + p0_stats_cols
+
     def __init__(self):
         self.end_stats_cols = [
             "end_stats.rating_points.0", "end_stats.rating_points.1",
@@ -22,90 +161,53 @@ class GamesPreprocessor(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        df = X.copy()
-
-        # ID к строке
-        df["users.0._id"] = df["users.0._id"].astype(str)
-        df["users.1._id"] = df["users.1._id"].astype(str)
-
-        # флаги и пропуски
-        df["isRematch"] = df["isRematch"].fillna(0).astype(int)
-        for col in self.end_stats_cols:
-            df[col + "_missing"] = df[col].isna().astype(int)
-            df[col] = df[col].fillna(0)
-
-        df.drop(columns=self.exclude_dt, inplace=True, errors='ignore')
-        df["game_finished"] = df["ended_at"].notna().astype(int)
-        df["has_winner"] = df["winner"].notna().astype(int)
-
-        # users.1
-        cat_cols_u1 = ["users.1.username", "users.1._id", "users.1.created_at"]
-        for c in cat_cols_u1:
-            df[c] = df[c].fillna("unknown")
-        num_cols_u1 = [
-            "users.1.seconds_in_game", "users.1.online.online_sessions",
-            "users.1.online_game_rating.value", "users.1.energy.count"
-        ]
-        for c in num_cols_u1:
-            df[c + "_missing"] = df[c].isna().astype(int)
-            df[c] = df[c].fillna(0)
-
-        # users.0
-        df["users.0.username"] = df["users.0.username"].fillna("unknown")
-        df["users.0.online_game_rating.value_missing"] = df["users.0.online_game_rating.value"].isna().astype(int)
-        df["users.0.online_game_rating.value"] = df["users.0.online_game_rating.value"].fillna(0)
-
-        # даты
-        df["started_at_dt"] = pd.to_datetime(df["started_at"], unit='s', errors='coerce').dt.tz_localize(None)
-        df["ended_at_dt"] = pd.to_datetime(df["ended_at"], unit='s', errors='coerce').dt.tz_localize(None)
-        df["users.0.created_at"] = pd.to_datetime(df["users.0.created_at"], errors='coerce').dt.tz_localize(None)
-        df["users.1.created_at"] = pd.to_datetime(df["users.1.created_at"], errors='coerce').dt.tz_localize(None)
-
-        df["duration_sec"] = (df["ended_at_dt"] - df["started_at_dt"]).dt.total_seconds().clip(lower=0).fillna(0)
-        df["start_hour"] = df["started_at_dt"].dt.hour.fillna(-1).astype(int)
-        df["start_dow"] = df["started_at_dt"].dt.dayofweek.fillna(-1).astype(int)
-        df["user0_account_age_days"] = (df["started_at_dt"] - df["users.0.created_at"]).dt.days.fillna(0)
-        df["user1_account_age_days"] = (df["started_at_dt"] - df["users.1.created_at"]).dt.days.fillna(0)
-
-        # long format
-        p0_cols = [
-            "users.0._id", "isRematch", "game_finished", "has_winner", "duration_sec",
-            "end_stats.total_points.0", "end_stats.highest_break.0", "end_stats.pot_success.0",
-            "end_stats.shot_time.0", "end_stats.table_time.0", "end_stats.rating_points.0",
-            "start_hour", "start_dow", "user0_account_age_days"
-        ]
-        p0 = df[p0_cols].rename(columns={"users.0._id": "player_id"}).copy()
-        p0 = p0[p0["player_id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
-
-        p1_cols = [
-            "users.1._id", "isRematch", "game_finished", "has_winner", "duration_sec",
-            "end_stats.total_points.1", "end_stats.highest_break.1", "end_stats.pot_success.1",
-            "end_stats.shot_time.1", "end_stats.table_time.1", "end_stats.rating_points.1",
-            "start_hour", "start_dow", "user1_account_age_days"
-        ]
-        p1 = df[p1_cols].rename(columns={"users.1._id": "player_id"}).copy()
-        p1 = p1[p1["player_id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
-
-        players_long = pd.concat([p0, p1], ignore_index=True)
-        players_long["is_win"] = (players_long["has_winner"] == 1).astype(int)
+        players_long = self.to_long(X)
 
         # agg
         agg_feat = players_long.groupby("player_id", as_index=False).agg(
             games_played=("is_win", "count"),
             wins=("is_win", "sum"),
-            rematch_rate=("isRematch", "mean"),
-            avg_duration_sec=("duration_sec", "mean"),
-            avg_points=("end_stats.total_points.0", "mean"),
-            avg_highest_break=("end_stats.highest_break.0", "mean"),
-            avg_pot_success=("end_stats.pot_success.0", "mean"),
-            avg_shot_time=("end_stats.shot_time.0", "mean"),
-            avg_table_time=("end_stats.table_time.0", "mean"),
-            avg_rating_delta=("end_stats.rating_points.0", "mean"),
-            user_account_age_days=("user0_account_age_days", "mean"),
-            start_hour_mode=("start_hour", lambda x: x.mode().iloc[0] if not x.mode().empty else -1),
-            start_dow_mode=("start_dow", lambda x: x.mode().iloc[0] if not x.mode().empty else -1),
+            **{name: (col, "mean") for name, col in self.mean_features.items()},
         )
-
+        # в long-формате час и день недели - int8, фичи остаются int64
+        for name, col in (("start_hour_mode", "start_hour"), ("start_dow_mode", "start_dow")):
+            agg_feat[name] = agg_feat["player_id"].map(groupby_mode(players_long, "player_id", col).astype("int64"))
+        return self.finalize(agg_feat)
+
+    def to_long(self, X):
+        # одна строка на (игра, игрок); из X берутся только колонки, нужные агрегатам, без копии всего фрейма
+        started = epoch_to_datetime(X["started_at"])
+        ended = epoch_to_datetime(X["ended_at"])
+        created0 = parse_datetime(X["users.0.created_at"])
+
+        # общие для обеих сторон игры колонки
+        shared = {
+            "isRematch": X["isRematch"].fillna(0).to_numpy().astype(np.int8),
+            "has_winner": X["winner"].notna().to_numpy().astype(np.int8),
+            "duration_sec": (ended - started).dt.total_seconds().clip(lower=0).fillna(0).to_numpy(),
+            "start_hour": started.dt.hour.fillna(-1).to_numpy().astype(np.int8),
+            "start_dow": started.dt.dayofweek.fillna(-1).to_numpy().astype(np.int8),
+        }
+
+        # статистика и возраст аккаунта в агрегатах берутся только со стороны users.0,
+        # у строк users.1 эти колонки остаются NaN после concat
+        ids0, valid0 = player_ids(X["users.0._id"])
+        p0 = {"player_id": ids0}
+        p0.update({col: values[valid0] for col, values in shared.items()})
+        for col in self.p0_stats_cols:
+            p0[col] = X[col].fillna(0).to_numpy()[valid0]
+        p0["user0_account_age_days"] = (started - created0).dt.days.fillna(0).to_numpy()[valid0]
+
+        ids1, valid1 = player_ids(X["users.1._id"])
+        p1 = {"player_id": ids1}
+        p1.update({col: values[valid1] for col, values in shared.items()})
+
+        players_long = pd.concat([pd.DataFrame(p0), pd.DataFrame(p1)], ignore_index=True)
+        players_long["is_win"] = players_long["has_winner"]
+        return players_long
+
+    def finalize(self, agg_feat):
+        # agg_feat: player_id + агрегаты в порядке transform
         # защита от деления на 0
         agg_feat["winrate"] = agg_feat["wins"] / np.clip(agg_feat["games_played"], 1, None)
 
@@ -125,33 +227,60 @@ class GamesPreprocessor(BaseEstimator, TransformerMixin):
         return agg_feat
 
 class ChestsPreprocessor(BaseEstimator, TransformerMixin):
+    input_columns = ["user._id", "chest.type", "opened_with", "open_at"]
+
     def fit(self, X, y=None):
         return self
 
-    def transform(self, X):
-        df = X.copy()
-
-        df["user._id"] = df["user._id"].astype(str)
-        df["opened_with"] = (
-            df["opened_with"]
-            .fillna("unknown")
-            .astype(str)
-            .str.strip()
-            .str.lower()
-            .replace({"game store": "store", "gamestore": "store", "shop": "store"})
-        )
-        df["chest.type"] = df["chest.type"].astype(str).str.strip().str.lower()
-        df["open_at"] = pd.to_datetime(df["open_at"], unit="s", errors="coerce")
-
-        df = df[df["user._id"].str.lower().str.strip().isin(["unknown", "nan", "none"]) == False]
-
-        agg_chests = df.groupby("user._id").agg(
-            total_chests=("chest.type", "count"),
-            unique_chests=("chest.type", "nunique"),
-            last_open=("open_at", "max"),
-            first_open=("open_at", "min")
-        ).reset_index()
-
+    def transform(self, X, as_of=None):
+        # один проход по кодам: игроки и обе категории факторизуются один раз, счётчики по типам,
+        # nunique и min/max открытия - через bincount, без groupby/crosstab по строкам
+        users, ids, valid = player_codes(X["user._id"])
+        chest_codes, chest_types = category_codes(X["chest.type"], normalize_chest_type)
+        with_codes, open_with = category_codes(X["opened_with"], normalize_opened_with, missing="unknown")
+        open_at = epoch_to_ns(X["open_at"])[valid]
+
+        n = len(ids)
+        type_counts = pair_counts(users, chest_codes[valid], n, len(chest_types))
+        with_counts = pair_counts(users, with_codes[valid], n, len(open_with))
+
+        # min/max по строкам с известным временем; у игрока без них остаётся NaT, как в groupby
+        dated = open_at != NAT
+        first_open = np.full(n, np.iinfo(np.int64).max)
+        last_open = np.full(n, NAT)
+        np.minimum.at(first_open, users[dated], open_at[dated])
+        np.maximum.at(last_open, users[dated], open_at[dated])
+        first_open[last_open == NAT] = NAT
+
+        agg_chests = pd.DataFrame({
+            "user._id": ids,
+            "total_chests": np.bincount(users, minlength=n),
+            "unique_chests": np.count_nonzero(type_counts, axis=1),
+            "last_open": last_open.view("datetime64[ns]"),
+            "first_open": first_open.view("datetime64[ns]"),
+        })
+        chest_type_counts = pd.DataFrame(type_counts, columns=chest_types).add_prefix("chest_")
+        open_with_counts = pd.DataFrame(with_counts, columns=open_with).add_prefix("open_with_")
+        return self.finalize(agg_chests, chest_type_counts, open_with_counts, as_of)
+
+    def normalize(self, X):
+        # нормализация категорий - по уникальным значениям; копии всего X нет
+        ids, valid = player_ids(X["user._id"])
+        opened_with = category_values(X["opened_with"], normalize_opened_with, missing="unknown")
+        chest_type = category_values(X["chest.type"], normalize_chest_type)
+
+        return pd.DataFrame({
+            "user._id": ids,
+            "chest.type": chest_type[valid],
+            "opened_with": opened_with[valid],
+            "open_at": epoch_to_datetime(X["open_at"]).to_numpy()[valid],
+        }, index=X.index[valid])
+
+    def finalize(self, agg_chests, chest_type_counts, open_with_counts, as_of=None):
+        # agg_chests: user._id, total_chests, unique_chests, last_open, first_open;
+        # chest_type_counts/open_with_counts: user._id + счётчики chest_*/open_with_* (или только счётчики
+        # в порядке строк agg_chests);
+        # as_of - дата отсчёта days_since_last (reference_time), с ней фичи не зависят от часов машины
         agg_chests["last_open"] = pd.to_datetime(agg_chests["last_open"], errors='coerce')
         agg_chests["first_open"] = pd.to_datetime(agg_chests["first_open"], errors='coerce')
 
@@ -160,13 +289,14 @@ class ChestsPreprocessor(BaseEstimator, TransformerMixin):
         agg_chests["first_open_dow"] = agg_chests["first_open"].dt.dayofweek.fillna(-1).astype(int)
         agg_chests["first_open_month"] = agg_chests["first_open"].dt.month.fillna(-1).astype(int)
 
-        chest_type_counts = pd.crosstab(df["user._id"], df["chest.type"]).add_prefix("chest_").reset_index()
-        open_with_counts = pd.crosstab(df["user._id"], df["opened_with"]).add_prefix("open_with_").reset_index()
-
-        df_feat = agg_chests.merge(chest_type_counts, on="user._id", how="left").merge(open_with_counts, on="user._id", how="left")
+        if "user._id" in chest_type_counts.columns:
+            df_feat = agg_chests.merge(chest_type_counts, on="user._id", how="left").merge(open_with_counts, on="user._id", how="left")
+        else:
+            # счётчики без user._id уже выровнены по строкам agg_chests
+            df_feat = pd.concat([agg_chests, chest_type_counts, open_with_counts], axis=1)
 
         df_feat["days_between_first_last"] = (agg_chests["last_open"] - agg_chests["first_open"]).dt.days.fillna(0)
-        df_feat["days_since_last"] = (pd.Timestamp.now() - agg_chests["last_open"]).dt.days.fillna(0)
+        df_feat["days_since_last"] = (reference_time(as_of) - agg_chests["last_open"]).dt.days.fillna(0)
 
         # клиппинг
         df_feat["total_chests"] = np.clip(df_feat["total_chests"], 0, 1e5)
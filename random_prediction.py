@@ -2,6 +2,8 @@ import pandas as pd
 import joblib
 import random
 
+import config
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
 from pipeline import ChurnPipeline
 
 def json_to_games_df(json_list, columns):
@@ -20,8 +22,8 @@ def json_to_chests_df(json_list, columns):
 
 if __name__ == "__main__":
     # загрузка полных таблиц
-    games_full = pd.read_csv('data/online-games.csv')
-    chests_full = pd.read_csv('data/chests.csv')
+    games_full = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS)
+    chests_full = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS)
 
     # список всех user_id (player_id) из игр и сундуков
     ids_from_games = pd.concat([games_full["users.0._id"], games_full["users.1._id"]], ignore_index=True).dropna().unique()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import namedtuple
+
+from artifact import export_artifact, is_artifact
+from cache import model_version
+from inference import load_pipeline, model_stamp
+
+logger = logging.getLogger(__name__)
+
+# реестр моделей сервиса: версии лежат в каталоге как <версия>.pkl или <версия>/ (артефакт, artifact.py),
+# активна новейшая по имени (имена publish - время, поэтому сортируются по порядку выкладки) или
+# закреплённая через activate. Переключение атомарное: новая модель сначала загружается в отдельном
+# потоке, потом подменяется ссылка на активную версию; запросы в полёте досчитываются прежней.
+# Без каталога реестр держит одну модель MODEL_PATH и перечитывает её, если файл изменился.
+#   python registry.py churn_pipeline.pkl --model-dir models        - выложить новую версию
+
+# version - имя в каталоге (без каталога - digest), digest - sha256 файлов (ключ кэша предсказаний),
+# stamp - mtime и размер (model_stamp), по ним видно, что файл перезаписан на месте
+ModelVersion = namedtuple("ModelVersion", ["version", "path", "digest", "stamp"])
+
+
+def list_versions(model_dir):
+    # скрытые (в том числе недописанные .<версия>.tmp от publish) пропускаются
+    versions = {}
+    for name in os.listdir(model_dir):
+        if name.startswith("."):
+            continue
+        path = os.path.join(model_dir, name)
+        if name.endswith(".pkl") and os.path.isfile(path):
+            versions[name[:-len(".pkl")]] = path
+        elif is_artifact(path):
+            versions[name] = path
+    return dict(sorted(versions.items()))
+
+
+def publish(pipeline, model_dir, version=None):
+    # артефакт пишется во временный каталог рядом и переименовывается целиком:
+    # реестр не увидит версию, у которой записана только часть файлов
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(model_dir, version)
+    if os.path.exists(target) or os.path.exists(target + ".pkl"):
+        raise FileExistsError(f"Model version {version} already exists in {model_dir}")
+    os.makedirs(model_dir, exist_ok=True)
+    tmp = os.path.join(model_dir, f".{version}.tmp")
+    export_artifact(pipeline, tmp)
+    os.replace(tmp, target)
+    logger.info(f"Published model version {version} to {model_dir}")
+    return version
+
+
+def _describe(entry):
+    if entry is None:
+        return None
+    return {"version": entry.version, "path": entry.path, "digest": entry.digest}
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=None, model_path=None, shadow=None, shadow_rate=0.0):
+        self.model_dir = model_dir or None
+        self.model_path = model_path
+        self.pinned = None
+        self.shadow_rate = shadow_rate
+        self._refresh_lock = None
+        # при старте загрузка синхронная: сервис не должен подняться без модели
+        self.active = self._load(*self._target())
+        self.shadow = self._load(*self._resolve(shadow)) if shadow else None
+
+    def versions(self):
+        if self.model_dir is None:
+            return {self.active.version: self.model_path}
+        return list_versions(self.model_dir)
+
+    def _resolve(self, version):
+        # версия из каталога или путь к модели вне его
+        if self.model_dir is not None:
+            versions = list_versions(self.model_dir)
+            if version in versions:
+                return version, versions[version]
+        if os.path.exists(version):
+            return None, version
+        raise KeyError(f"Unknown model version: {version}")
+
+    def _target(self):
+        if self.model_dir is None:
+            return None, self.model_path
+        if self.pinned is not None:
+            return self._resolve(self.pinned)
+        versions = list_versions(self.model_dir)
+        if not versions:
+            raise FileNotFoundError(f"No model versions in {self.model_dir}")
+        return list(versions.items())[-1]
+
+    def _load(self, version, path):
+        stamp = model_stamp(path)
+        digest = model_version(path)
+        load_pipeline(path, keep_previous=False)
+        entry = ModelVersion(version or digest, path, digest, stamp)
+        logger.info(f"Model version {entry.version} loaded from {path}")
+        return entry
+
+    @staticmethod
+    def _named(entry):
+        # версия из каталога или модель по пути (тогда version - digest и меняется вместе с файлом)
+        return None if entry.version == entry.digest else entry.version
+
+    def _refresh(self):
+        # в потоке: активная - новая версия в каталоге или перезаписанный файл; теневая - перезаписанный файл
+        version, path = self._target()
+        active = self.active
+        changed = active.path != path or model_stamp(path) != active.stamp or (
+            version is not None and active.version != version)
+        if changed:
+            self.active = self._load(version, path)
+            logger.info(f"Active model {active.version} -> {self.active.version}")
+        shadow = self.shadow
+        if shadow is not None and model_stamp(shadow.path) != shadow.stamp:
+            self.shadow = self._load(self._named(shadow), shadow.path)
+        return changed
+
+    def _activate(self, version):
+        entry = self._load(*self._resolve(version))
+        self.pinned, self.active = version, entry
+        logger.info(f"Active model pinned to {entry.version}")
+        return entry
+
+    def _unpin(self):
+        self.pinned = None
+        self._refresh()
+        return self.active
+
+    def _set_shadow(self, version, rate):
+        self.shadow = self._load(*self._resolve(version)) if version else None
+        if rate is not None:
+            self.shadow_rate = rate
+        logger.info(f"Shadow model: {self.shadow.version if self.shadow else None}, sample rate {self.shadow_rate}")
+        return self.shadow
+
+    async def _run(self, fn, *args):
+        # загрузка модели - вне event loop; смены версии идут по одной, ссылки подменяются целиком,
+        # поэтому запрос всегда видит согласованную пару (версия, путь)
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def refresh(self):
+        return await self._run(self._refresh)
+
+    async def activate(self, version):
+        # закрепить версию: новые версии в каталоге не переключают активную модель до unpin
+        return await self._run(self._activate, version)
+
+    async def unpin(self):
+        return await self._run(self._unpin)
+
+    async def set_shadow(self, version, rate=None):
+        return await self._run(self._set_shadow, version, rate)
+
+    def sample_shadow(self):
+        # теневая модель, если этот запрос попал в выборку
+        shadow = self.shadow
+        if shadow is None or shadow.path == self.active.path or random.random() >= self.shadow_rate:
+            return None
+        return shadow
+
+    async def watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Model refresh failed, keeping {self.active.version}: {e}")
+
+    def status(self):
+        return {
+            "active": _describe(self.active),
+            "pinned": self.pinned,
+            "shadow": _describe(self.shadow),
+            "shadow_sample_rate": self.shadow_rate,
+            "model_dir": self.model_dir,
+            "versions": list(self.versions()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выложить модель в каталог версий реестра")
+    parser.add_argument("model", nargs="?", default="churn_pipeline.pkl", help="pkl или каталог артефакта")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--version", help="имя версии; по умолчанию - текущее время")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(publish(load_pipeline(args.model), args.model_dir, args.version))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import json
+import sys
+
+from batching import score_batch
+from preprocess import reference_time
+
+# NDJSON-скоринг: каждая строка - либо запрос {"games": [...], "chests": [...]} (обычно один игрок),
+# либо отдельная запись игры/сундука. Отдельные записи копятся в один запрос до пустой строки,
+# строки {} или следующего запроса, но не больше max_rows записей: дальше запрос закрывается на первой
+# записи другого игрока (выгрузку, сгруппированную по игрокам, это не режет). Записи одного игрока
+# не делятся между запросами: запрос без смены игрока больше max_request_rows записей не копится,
+# а завершается ошибкой RequestTooLarge. Запросы считаются пачками
+# через score_batch, поэтому память ограничена размером пачки, а не всего потока.
+# Дата отсчёта: "as_of" в строке запроса, иначе общая для потока (?as_of= / --as-of).
+
+DEFAULT_CHUNK_SIZE = 256
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_MAX_REQUEST_ROWS = 500_000
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+def parse_line(line):
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if not line:
+        return None
+    obj = json.loads(line)
+    if not isinstance(obj, dict):
+        raise ValueError("Each line must be a JSON object")
+    return obj
+
+
+def is_chest_record(obj):
+    return "chest" in obj or "chest.type" in obj or "open_at" in obj
+
+
+def record_players(obj):
+    # id игроков отдельной записи: вложенные users/user или плоские ключи users.0._id, user._id
+    if is_chest_record(obj):
+        user = obj.get("user")
+        ids = [user.get("_id") if isinstance(user, dict) else obj.get("user._id")]
+    else:
+        users = obj.get("users")
+        if isinstance(users, list):
+            ids = [u.get("_id") for u in users if isinstance(u, dict)]
+        else:
+            ids = [obj.get("users.0._id"), obj.get("users.1._id")]
+    return {str(i) for i in ids if i is not None}
+
+
+class RequestAssembler:
+    def __init__(self, max_rows=DEFAULT_CHUNK_ROWS, as_of=None, max_request_rows=DEFAULT_MAX_REQUEST_ROWS):
+        self.count = 0
+        self.max_rows = max_rows
+        self.max_request_rows = max_request_rows
+        self.as_of = as_of
+        self._games = []
+        self._chests = []
+        self._rows = 0
+        self._last_players = set()
+
+    def feed(self, obj):
+        # возвращает список готовых запросов [(номер, id, games, chests, as_of)]
+        if not obj:
+            return self.flush()
+        if "games" in obj or "chests" in obj:
+            ready = self.flush()
+            ready.append(self._make(obj.get("id"), obj.get("games") or [], obj.get("chests") or [],
+                                    obj.get("as_of", self.as_of)))
+            return ready
+        ready = []
+        players = record_players(obj)
+        if self._rows >= self.max_rows and not players & self._last_players:
+            ready = self.flush()
+        self._last_players = players
+        self._rows += 1
+        if self._rows > self.max_request_rows:
+            # резать нельзя: у игрока были бы строки из двух запросов по неполной истории.
+            # Записи дальше не копятся, запрос до границы игрока завершится ошибкой
+            self._games, self._chests = [], []
+        elif is_chest_record(obj):
+            self._chests.append(obj)
+        else:
+            self._games.append(obj)
+        return ready
+
+    def flush(self):
+        if not self._rows:
+            return []
+        if self._rows > self.max_request_rows:
+            # вместо игр - ошибка запроса, score_items отдаёт её как результат
+            error = RequestTooLarge(f"Request too large: {self._rows} records without a player boundary, "
+                                    f"limit {self.max_request_rows}")
+            ready = [self._make(None, error, [], self.as_of)]
+        else:
+            ready = [self._make(None, self._games, self._chests, self.as_of)]
+        self._games, self._chests, self._rows = [], [], 0
+        return ready
+
+    def _make(self, request_id, games, chests, as_of):
+        item = (self.count, request_id, games, chests, as_of)
+        self.count += 1
+        return item
+
+
+class ChunkBuffer:
+    # пачка запросов ограничена и числом запросов, и числом игр
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.chunk_size = chunk_size
+        self.chunk_rows = chunk_rows
+        self.items = []
+        self.rows = 0
+
+    def add(self, item):
+        self.items.append(item)
+        if not isinstance(item[2], Exception):
+            self.rows += len(item[2])
+        return len(self.items) >= self.chunk_size or self.rows >= self.chunk_rows
+
+    def take(self):
+        items, self.items, self.rows = self.items, [], 0
+        return items
+
+
+def format_results(items, results):
+    lines = []
+    for (index, request_id, *_), result in zip(items, results):
+        base = {"request": index}
+        if request_id is not None:
+            base["id"] = request_id
+        if isinstance(result, Exception):
+            lines.append({**base, "error": str(result)})
+            continue
+        # у каждого запроса есть хотя бы одна строка ответа
+        if not result:
+            lines.append({**base, "error": "No players scored"})
+            continue
+        for player_id, prob in result.items():
+            lines.append({**base, "player_id": player_id, "prob_churn": prob})
+    return lines
+
+
+def score_items(model_path, items):
+    # as_of общий на вызов score_batch, поэтому запросы пачки с разной датой отсчёта считаются
+    # отдельными вызовами; неразборчивая дата - ошибка только своего запроса
+    results = [None] * len(items)
+    groups = {}
+    for pos, (_, _, games, _, as_of) in enumerate(items):
+        if isinstance(games, Exception):
+            results[pos] = games
+            continue
+        try:
+            key = None if as_of is None else reference_time(as_of)
+        except (ValueError, TypeError) as e:
+            results[pos] = ValueError(f"invalid as_of: {e}")
+            continue
+        groups.setdefault(key, []).append(pos)
+    for as_of, positions in groups.items():
+        payloads = [(items[pos][2], items[pos][3]) for pos in positions]
+        for pos, result in zip(positions, score_batch(model_path, payloads, as_of)):
+            results[pos] = result
+    return results
+
+
+def score_chunk(model_path, items):
+    return format_results(items, score_items(model_path, items))
+
+
+def score_lines(lines, model_path, chunk_size=DEFAULT_CHUNK_SIZE, chunk_rows=DEFAULT_CHUNK_ROWS, as_of=None,
+                max_request_rows=DEFAULT_MAX_REQUEST_ROWS):
+    # синхронный вариант для CLI: строки на входе, dict-результаты на выходе
+    assembler = RequestAssembler(chunk_rows, as_of, max_request_rows)
+    buffer = ChunkBuffer(chunk_size, chunk_rows)
+    for line_no, line in enumerate(lines, start=1):
+        try:
+            obj = parse_line(line)
+        except ValueError as e:
+            yield {"line": line_no, "error": str(e)}
+            continue
+        for item in assembler.feed(obj):
+            if buffer.add(item):
+                yield from score_chunk(model_path, buffer.take())
+    for item in assembler.flush():
+        buffer.add(item)
+    if buffer.items:
+        yield from score_chunk(model_path, buffer.take())
+
+
+async def aiter_lines(byte_chunks):
+    pending = b""
+    async for chunk in byte_chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def dumps_line(obj):
+    return json.dumps(obj) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Churn scoring for NDJSON games/chests")
+    parser.add_argument("input", nargs="?", default="-", help="NDJSON файл, по умолчанию stdin")
+    parser.add_argument("-o", "--output", default="-", help="куда писать NDJSON с вероятностями")
+    parser.add_argument("--model", default="churn_pipeline.pkl")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--max-request-rows", type=int, default=DEFAULT_MAX_REQUEST_ROWS,
+                        help="предел записей запроса без смены игрока; больше - ошибка запроса")
+    parser.add_argument("--as-of", help="дата отсчёта для запросов без своего as_of; по умолчанию - текущее время")
+    args = parser.parse_args()
+    as_of = reference_time(args.as_of) if args.as_of else None
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for result in score_lines(src, args.model, args.chunk_size, args.chunk_rows, as_of, args.max_request_rows):
+            dst.write(dumps_line(result))
+            dst.flush()
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+
+if __name__ == "__main__":
+    main()
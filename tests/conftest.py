@@ -0,0 +1,51 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from inference import load_pipeline
+
+# общие данные тестов: выгрузка из data/ (несколько тысяч игр и сундуков) и обученная модель из корня
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(ROOT, "churn_pipeline.pkl")
+
+
+@pytest.fixture(scope="session")
+def games():
+    return pd.read_csv(os.path.join(ROOT, "data", "online-games.csv"))
+
+
+@pytest.fixture(scope="session")
+def chests():
+    return pd.read_csv(os.path.join(ROOT, "data", "chests.csv"))
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    return load_pipeline(MODEL_PATH)
+
+
+@pytest.fixture(scope="session")
+def model_path():
+    return MODEL_PATH
+
+
+@pytest.fixture(scope="session")
+def records(games, chests):
+    # records(player_id) -> игры и сундуки игрока в виде json-записей тела /predict
+    def make(player_id):
+        player_games = games[(games["users.0._id"] == player_id) | (games["users.1._id"] == player_id)]
+        player_chests = chests[chests["user._id"] == player_id]
+        # через json, чтобы NaN стали null, как в настоящем теле запроса
+        return (json.loads(player_games.to_json(orient="records")),
+                json.loads(player_chests.to_json(orient="records")))
+    return make
+
+
+@pytest.fixture(scope="session")
+def players_with_chests(games, chests):
+    # игроки, у которых есть сундуки и не меньше двух игр: вероятность зависит от as_of и от части истории
+    counts = pd.concat([games["users.0._id"], games["users.1._id"]]).value_counts()
+    return sorted(set(counts[counts >= 2].index) & set(chests["user._id"].dropna()))[:5]
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from streaming import score_lines
+
+# даты после конца выгрузки: days_since_last у игроков с сундуками заметно различается
+STREAM_AS_OF = "2025-12-01"
+LINE_AS_OF = "2026-03-01"
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def stream_lines(records, player):
+    games, chests = records(player)
+    return [
+        json.dumps({"id": "own", "games": games, "chests": chests, "as_of": LINE_AS_OF}),
+        json.dumps({"id": "default", "games": games, "chests": chests}),
+        json.dumps({"id": "bad", "games": games, "chests": chests, "as_of": "garbage"}),
+    ]
+
+
+def by_request(results):
+    probabilities, errors = {}, {}
+    for result in results:
+        if "error" in result:
+            errors[result["id"]] = result["error"]
+        else:
+            probabilities.setdefault(result["id"], {})[result["player_id"]] = result["prob_churn"]
+    return probabilities, errors
+
+
+def predict(client, records, player, as_of):
+    games, chests = records(player)
+    response = client.post("/predict", json={"games": games, "chests": chests, "as_of": as_of})
+    assert response.status_code == 200
+    return response.json()["probabilities"]
+
+
+def check_stream(probabilities, errors, client, records, player):
+    # as_of строки важнее as_of потока; без своего - as_of потока; ответы как у /predict
+    assert probabilities["own"] == pytest.approx(predict(client, records, player, LINE_AS_OF))
+    assert probabilities["default"] == pytest.approx(predict(client, records, player, STREAM_AS_OF))
+    assert probabilities["own"][player] != pytest.approx(probabilities["default"][player])
+    # плохой as_of - ошибка только своего запроса
+    assert list(errors) == ["bad"] and "as_of" in errors["bad"]
+
+
+def test_score_lines_honours_as_of(client, model_path, records, players_with_chests):
+    player = players_with_chests[0]
+    results = score_lines(stream_lines(records, player), model_path, as_of=STREAM_AS_OF)
+    check_stream(*by_request(results), client, records, player)
+
+
+def test_predict_stream_honours_as_of(client, records, players_with_chests):
+    player = players_with_chests[0]
+    response = client.post(f"/predict/stream?as_of={STREAM_AS_OF}", content="\n".join(stream_lines(records, player)))
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines() if line]
+    check_stream(*by_request(results), client, records, player)
+
+
+def test_predict_stream_rejects_bad_query_as_of(client):
+    assert client.post("/predict/stream?as_of=garbage", content="").status_code == 400
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backfill import as_of_dates, backfill
+from columnar import load_chests, load_games
+
+DATES = ["2025-06-15", "2025-08-01", "2025-10-01", "2025-12-01"]
+
+
+@pytest.fixture(scope="module")
+def undated_chests(chests):
+    # в выгрузке у всех сундуков есть open_at; часть делаем без него
+    chests = chests.copy()
+    chests.loc[chests.index[::7], "open_at"] = np.nan
+    return chests
+
+
+def per_date(pipeline, games, chests, as_of):
+    # эталон: predict_proba по событиям не позже as_of (без времени - всегда)
+    t = as_of.timestamp()
+    games = games[games["started_at"].isna() | (games["started_at"] <= t)]
+    chests = chests[chests["open_at"].isna() | (chests["open_at"] <= t)]
+    return pipeline.predict_proba(games, chests, as_of=as_of)
+
+
+def check_backfill(result, pipeline, games, chests, dates):
+    assert sorted(result["as_of"].unique()) == dates
+    for as_of in dates:
+        got = result[result["as_of"] == as_of].set_index("player_id")["prob_churn"].sort_index()
+        expected = per_date(pipeline, games, chests, as_of).sort_index()
+        pd.testing.assert_series_equal(got, expected, check_names=False)
+
+
+def test_backfill_matches_per_date_loop(pipeline, games, undated_chests):
+    dates = as_of_dates(DATES)
+    check_backfill(backfill(pipeline, games, undated_chests, dates), pipeline, games, undated_chests, dates)
+
+
+def test_backfill_from_csv_keeps_undated_events(tmp_path, pipeline, games, undated_chests):
+    # путь CLI: загрузка с окном по последней дате, undated=True
+    games_path, chests_path = tmp_path / "games.csv", tmp_path / "chests.csv"
+    games.to_csv(games_path, index=False)
+    undated_chests.to_csv(chests_path, index=False)
+    dates = as_of_dates(DATES[:2])
+    until = dates[-1] + pd.Timedelta(seconds=1)
+
+    games_df = load_games(str(games_path), end=until, undated=True)
+    chests_df = load_chests(str(chests_path), end=until, undated=True)
+    assert chests_df["open_at"].isna().sum() == undated_chests["open_at"].isna().sum()
+    assert load_chests(str(chests_path), end=until)["open_at"].notna().all()
+
+    check_backfill(backfill(pipeline, games_df, chests_df, dates), pipeline, games, undated_chests, dates)
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from batching import MicroBatcher
+from inference import InferencePool, score_payload
+
+AS_OF = "2025-12-01"
+
+
+def run_batched(model_path, requests, max_batch_size=8):
+    # requests: [(games, chests, as_of)] -> результаты submit и число вызовов пула
+    async def run():
+        pool = InferencePool(kind="thread", workers=2, max_pending=16, timeout=60, model_path=model_path)
+        batcher = MicroBatcher(pool, model_path, max_batch_size=max_batch_size, max_wait_ms=200)
+        calls = []
+        run_pool = pool.run
+
+        async def counting_run(fn, *args):
+            calls.append(fn.__name__)
+            return await run_pool(fn, *args)
+
+        pool.run = counting_run
+        try:
+            results = await asyncio.gather(*(batcher.submit(g, c, as_of) for g, c, as_of in requests),
+                                           return_exceptions=True)
+        finally:
+            pool.shutdown()
+        return results, calls
+
+    return asyncio.run(run())
+
+
+def test_same_player_in_one_batch_is_scored_per_request(model_path, records, players_with_chests):
+    player = players_with_chests[0]
+    games, chests = records(player)
+    # тот же player_id с разной историей в одном батче: результат каждого запроса - только по своей истории
+    requests = [(games, chests, AS_OF), (games[:1], [], AS_OF), (games[1:], chests[:1], AS_OF)]
+
+    results, calls = run_batched(model_path, requests)
+
+    assert calls == ["score_batch"]
+    for (g, c, as_of), result in zip(requests, results):
+        assert result == pytest.approx(score_payload(model_path, g, c, as_of), abs=1e-12)
+    assert results[0][player] != pytest.approx(results[1][player], abs=1e-9)
+
+
+def test_requests_with_different_as_of_are_scored_separately(model_path, records, players_with_chests):
+    games, chests = records(players_with_chests[0])
+    requests = [(games, chests, "2026-03-01"), (games, chests, AS_OF), (games, chests, "2026-03-01")]
+
+    results, calls = run_batched(model_path, requests)
+
+    # одна пачка, два вызова score_batch: по одному на дату отсчёта
+    assert calls == ["score_batch", "score_batch"]
+    for (g, c, as_of), result in zip(requests, results):
+        assert result == pytest.approx(score_payload(model_path, g, c, as_of), abs=1e-12)
+    assert results[0] == results[2]
+    assert results[0] != pytest.approx(results[1], abs=1e-9)
+
+
+def test_bad_request_does_not_fail_its_batch(model_path, records, players_with_chests):
+    games, chests = records(players_with_chests[0])
+
+    results, _ = run_batched(model_path, [(games, chests, AS_OF), ([], [], AS_OF)])
+
+    assert results[0] == pytest.approx(score_payload(model_path, games, chests, AS_OF), abs=1e-12)
+    assert isinstance(results[1], ValueError)
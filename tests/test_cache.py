@@ -0,0 +1,93 @@
+import pandas as pd
+
+from cache import PredictionCache, fingerprint_payload
+
+AS_OF = "2025-12-01"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fingerprints(games, chests):
+    return fingerprint_payload(games, chests)[0]
+
+
+def test_fingerprint_ignores_record_order_and_unknown_fields(records, players_with_chests):
+    games, chests = records(players_with_chests[0])
+    base = fingerprints(games, chests)
+    assert players_with_chests[0] in base
+    assert fingerprints(games[::-1], chests[::-1]) == base
+    # поля вне схемы отбрасываются при разборе и в отпечаток не попадают
+    assert fingerprints([{**g, "extra": 1} for g in games], chests) == base
+
+
+def test_fingerprint_changes_with_player_history(records, players_with_chests):
+    player = players_with_chests[0]
+    games, chests = records(player)
+    base = fingerprints(games, chests)[player]
+    changed = [{**games[0], "winner": "someone-else"}] + games[1:]
+    assert fingerprints(changed, chests)[player] != base
+    assert fingerprints(games[1:], chests)[player] != base
+    assert fingerprints(games, chests[1:])[player] != base
+
+
+def test_fingerprint_payload_returns_parsed_frames(records, players_with_chests):
+    games, chests = records(players_with_chests[0])
+    _, (games_df, chests_df) = fingerprint_payload(games, chests)
+    assert isinstance(games_df, pd.DataFrame) and len(games_df) == len(games)
+    assert isinstance(chests_df, pd.DataFrame) and len(chests_df) == len(chests)
+
+
+def test_keys_separate_model_version_and_as_of():
+    cache = PredictionCache(clock=FakeClock())
+    fps = {"p1": (1, 2, 3, 1)}
+    cache.store(fps, "v1", {"p1": 0.25}, as_of=AS_OF)
+    assert cache.lookup(fps, "v1", as_of=AS_OF) == {"p1": 0.25}
+    assert cache.lookup(fps, "v2", as_of=AS_OF) is None
+    assert cache.lookup(fps, "v1", as_of="2026-03-01") is None
+    assert cache.lookup(fps, "v1") is None
+    assert cache.lookup({"p1": (1, 2, 3, 2)}, "v1", as_of=AS_OF) is None
+
+
+def test_player_missing_from_model_output_is_cached():
+    cache = PredictionCache(clock=FakeClock())
+    fps = {"p1": (1, 1, 0, 0), "p2": (2, 1, 0, 0)}
+    cache.store(fps, "v1", {"p1": 0.5}, as_of=AS_OF)
+    assert cache.lookup(fps, "v1", as_of=AS_OF) == {"p1": 0.5}
+
+
+def test_ttl_and_freshness_window():
+    clock = FakeClock()
+    cache = PredictionCache(ttl_sec=300, freshness_sec=60, clock=clock)
+    with_chests, without_chests = {"p1": (1, 1, 5, 1)}, {"p2": (2, 1, 0, 0)}
+    cache.store(with_chests, "v1", {"p1": 0.1})
+    cache.store(without_chests, "v1", {"p2": 0.2})
+    cache.store(with_chests, "v1", {"p1": 0.3}, as_of=AS_OF)
+
+    clock.now = 61
+    # без as_of days_since_last зависит от текущего времени - запись игрока с сундуками живёт только окно
+    assert cache.lookup(with_chests, "v1") is None
+    assert cache.lookup(without_chests, "v1") == {"p2": 0.2}
+    assert cache.lookup(with_chests, "v1", as_of=AS_OF) == {"p1": 0.3}
+
+    clock.now = 301
+    assert cache.lookup(without_chests, "v1") is None
+    assert cache.lookup(with_chests, "v1", as_of=AS_OF) is None
+    assert cache.stats()["expirations"] == 3
+
+
+def test_lru_eviction_and_disabled_cache():
+    cache = PredictionCache(max_size=2, clock=FakeClock())
+    for i in range(3):
+        cache.store({f"p{i}": (i, 1, 0, 0)}, "v1", {f"p{i}": 0.5}, as_of=AS_OF)
+    assert cache.lookup({"p0": (0, 1, 0, 0)}, "v1", as_of=AS_OF) is None
+    assert cache.stats()["evictions"] == 1
+
+    disabled = PredictionCache(max_size=0, clock=FakeClock())
+    disabled.store({"p1": (1, 1, 0, 0)}, "v1", {"p1": 0.5}, as_of=AS_OF)
+    assert disabled.stats()["size"] == 0
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from event_store import EventStore, _q, score_players
+from payload import games_columns, chests_columns
+
+AS_OF = "2025-12-01"
+
+
+def test_reingest_does_not_duplicate_events(tmp_path, games, chests):
+    store = EventStore(str(tmp_path / "events.db"))
+    try:
+        assert store.add(games, chests) == len(games) + len(chests)
+        # та же выгрузка и пересекающийся кусок - ни одной новой строки
+        assert store.add(games, chests) == 0
+        assert store.add(games.iloc[:100], chests.iloc[:100]) == 0
+        assert store.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0] == len(games)
+        assert store.conn.execute("SELECT COUNT(*) FROM chests").fetchone()[0] == len(chests)
+    finally:
+        store.close()
+
+
+def test_identical_chest_opens_are_kept(tmp_path, chests):
+    # два открытия одного типа одним игроком в ту же секунду - два события, а не дубль
+    opened = pd.concat([chests.iloc[:3], chests.iloc[[0]]], ignore_index=True)
+    path = tmp_path / "chests.csv"
+    opened.to_csv(path, index=False)
+    store = EventStore(str(tmp_path / "events.db"))
+    try:
+        store.load_csv(chests_path=str(path), chunk_rows=2)
+        player = opened.loc[0, "user._id"]
+        stored = store.chests_for([player])
+        assert len(stored) == (opened["user._id"] == player).sum()
+        # повторная загрузка (и выгрузка с тем же открытием один раз) ничего не добавляет
+        store.load_csv(chests_path=str(path))
+        assert store.add(chests_df=chests.iloc[[0]]) == 0
+        assert store.conn.execute("SELECT COUNT(*) FROM chests").fetchone()[0] == 4
+    finally:
+        store.close()
+
+
+def test_old_database_keeps_its_rows(tmp_path, games, chests, pipeline, model_path, players_with_chests):
+    # база в прежней схеме: без ключей событий, выгрузка загружена дважды
+    path = str(tmp_path / "events.db")
+    conn = sqlite3.connect(path)
+    for table, columns, df in (("games", games_columns, games), ("chests", chests_columns, chests)):
+        conn.execute(f"CREATE TABLE {table} ({', '.join(_q(c) for c in columns)})")
+        values = df.reindex(columns=columns).astype(object)
+        values = values.where(values.notna(), None)
+        rows = list(values.itertuples(index=False, name=None))
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", rows + rows)
+    conn.execute(f"CREATE INDEX idx_games__id ON games ({_q('_id')})")
+    conn.commit()
+    conn.close()
+
+    store = EventStore(path)
+    try:
+        # при открытии строки не удаляются
+        assert store.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0] == 2 * len(games)
+        assert store.conn.execute("SELECT COUNT(*) FROM chests").fetchone()[0] == 2 * len(chests)
+        assert store.add(games, chests) == 0
+        # игра на чтении берётся одна на _id
+        player = players_with_chests[0]
+        player_games = games[(games["users.0._id"] == player) | (games["users.1._id"] == player)]
+        assert len(store.games_for([player])) == len(player_games)
+    finally:
+        store.close()
+
+
+def test_score_players_matches_pipeline_on_player_history(tmp_path, games, chests, pipeline, model_path,
+                                                          records, players_with_chests):
+    path = str(tmp_path / "events.db")
+    store = EventStore(path)
+    store.add(games, chests)
+    store.close()
+
+    for player in players_with_chests:
+        player_games, player_chests = records(player)
+        expected = pipeline.predict_proba(pd.DataFrame(player_games), pd.DataFrame(player_chests), as_of=AS_OF)
+        scored = score_players(model_path, path, [player], as_of=AS_OF)
+        assert list(scored) == [player]
+        assert scored[player] == pytest.approx(expected[player])
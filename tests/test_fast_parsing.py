@@ -0,0 +1,43 @@
+import json
+import warnings
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+
+orjson = pytest.importorskip("orjson")
+
+AS_OF = "2025-12-01"
+
+
+@pytest.fixture
+def fast(monkeypatch):
+    monkeypatch.setattr(config, "REQUEST_PARSING", "fast")
+    monkeypatch.setattr(main, "orjson", orjson, raising=False)
+
+
+def test_fast_response_uses_no_deprecated_classes(fast):
+    # FastAPIDeprecationWarning - наследник UserWarning, поэтому ошибкой становится любое предупреждение
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        response = main._json({"probabilities": {"p": np.float64(0.25)}, "failed": np.int64(0)})
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"probabilities": {"p": 0.25}, "failed": 0}
+
+
+def test_fast_predict_matches_strict(monkeypatch, records, players_with_chests):
+    games, chests = records(players_with_chests[0])
+    body = {"games": games, "chests": chests, "as_of": AS_OF}
+    with TestClient(main.app) as client:
+        strict = client.post("/predict", json=body)
+        monkeypatch.setattr(config, "REQUEST_PARSING", "fast")
+        monkeypatch.setattr(main, "orjson", orjson, raising=False)
+        fast = client.post("/predict", json=body)
+
+    assert fast.status_code == strict.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == strict.json()
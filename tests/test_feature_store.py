@@ -0,0 +1,55 @@
+import pandas as pd
+
+from feature_store import FeatureStore
+
+AS_OF = "2025-12-01"
+
+
+def test_incremental_store_matches_full_pipeline(tmp_path, games, chests, pipeline):
+    store = FeatureStore(str(tmp_path / "features.db"))
+    try:
+        third = len(games) // 3
+        store.update(games.iloc[:third], chests.iloc[:2000])
+        store.update(games.iloc[third:], None)
+        # повторная доставка уже учтённых игр и сундуков не должна задвоить агрегаты
+        store.update(games.iloc[:100], chests.iloc[2000:])
+        assert store.update(None, chests.iloc[1500:2500])["chests"] == 0
+        from_store = store.predict_proba(pipeline, as_of=AS_OF)
+    finally:
+        store.close()
+
+    expected = pipeline.predict_proba(games, chests, as_of=AS_OF)
+    pd.testing.assert_series_equal(from_store.sort_index(), expected.sort_index(), check_names=False)
+
+
+def test_store_survives_reopen_and_filters_players(tmp_path, games, chests, pipeline, players_with_chests):
+    path = str(tmp_path / "features.db")
+    store = FeatureStore(path)
+    store.update(games, chests)
+    store.close()
+
+    store = FeatureStore(path)
+    try:
+        assert store.update(games, chests) == {"games": 0, "chests": 0}
+        from_store = store.predict_proba(pipeline, players_with_chests, as_of=AS_OF)
+    finally:
+        store.close()
+
+    expected = pipeline.predict_proba(games, chests, as_of=AS_OF).loc[players_with_chests]
+    pd.testing.assert_series_equal(from_store.sort_index(), expected.sort_index(), check_names=False)
+
+
+def test_identical_chest_opens_are_counted(tmp_path, chests):
+    # два одинаковых открытия в одной выгрузке - два сундука; повторная выгрузка ничего не добавляет
+    opened = pd.concat([chests.iloc[:3], chests.iloc[[0]]], ignore_index=True)
+    store = FeatureStore(str(tmp_path / "features.db"))
+    try:
+        assert store.update(None, opened)["chests"] == 4
+        assert store.update(None, opened)["chests"] == 0
+        assert store.update(None, chests.iloc[[0]])["chests"] == 0
+        player = opened.loc[0, "user._id"]
+        total = store.conn.execute("SELECT total_chests FROM player_chests WHERE player_id = ?", (player,)).fetchone()[0]
+    finally:
+        store.close()
+
+    assert total == (opened["user._id"] == player).sum()
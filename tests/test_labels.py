@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from preprocess import epoch_to_datetime
+from utils import make_churn_labels, make_churn_labels_multi
+
+REFERENCE_DATES = [pd.Timestamp(d) for d in ("2025-06-15", "2025-08-01", "2025-09-20 12:30", "2025-11-12", "2026-01-01")]
+WINDOWS = (14, 30, 60)
+
+
+@pytest.fixture(scope="module")
+def games_cleaned(games):
+    games = games.copy()
+    games["started_at_dt"] = epoch_to_datetime(games["started_at"])
+    return games
+
+
+def test_multi_matches_per_date_labels(games_cleaned):
+    multi = make_churn_labels_multi(games_cleaned, REFERENCE_DATES, WINDOWS)
+    assert set(multi["churn"]) == {0, 1}
+
+    for reference in REFERENCE_DATES:
+        # игры с неизвестным started_at в make_churn_labels_multi не участвуют
+        before = games_cleaned[games_cleaned["started_at_dt"] <= reference].copy()
+        for window in WINDOWS:
+            expected = make_churn_labels(before.copy(), window, reference).sort_values("player_id")
+            got = multi[(multi["reference_date"] == reference) & (multi["window_days"] == window)]
+            got = got.sort_values("player_id")
+            assert got["player_id"].tolist() == expected["player_id"].tolist()
+            assert got["churn"].tolist() == expected["churn"].tolist()
+
+
+def test_multi_accepts_unsorted_and_repeated_dates(games_cleaned):
+    ordered = make_churn_labels_multi(games_cleaned, REFERENCE_DATES, WINDOWS)
+    shuffled = make_churn_labels_multi(games_cleaned, REFERENCE_DATES[::-1] + REFERENCE_DATES[:2], WINDOWS[::-1])
+    pd.testing.assert_frame_equal(shuffled, ordered)
+
+
+def test_multi_without_dates_is_empty(games_cleaned):
+    assert make_churn_labels_multi(games_cleaned, []).empty
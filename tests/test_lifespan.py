@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+
+AS_OF = "2025-12-01"
+
+
+def predict(client, records, player):
+    games, chests = records(player)
+    response = client.post("/predict", json={"games": games, "chests": chests, "as_of": AS_OF})
+    assert response.status_code == 200
+    return response.json()["probabilities"]
+
+
+def test_app_restarts_with_fresh_pool_and_batcher(monkeypatch, records, players_with_chests):
+    # реестр, пул и микробатчер создаются на старте каждого запуска и закрываются на остановке
+    monkeypatch.setattr(config, "BATCH_MAX_SIZE", 4)
+    monkeypatch.setattr(config, "MODEL_POLL_SEC", 0)
+    player = players_with_chests[0]
+    answers = []
+    for _ in range(2):
+        with TestClient(main.app) as client:
+            pool, batcher = main.pool, main.batcher
+            assert batcher is not None and batcher.pool is pool
+            answers.append(predict(client, records, player))
+        assert batcher._collector is None
+        with pytest.raises(RuntimeError):
+            pool.executor.submit(int)
+
+    assert answers[0] == answers[1]
@@ -0,0 +1,111 @@
+import json
+
+from streaming import RequestAssembler, RequestTooLarge, format_results, score_lines
+
+
+def game(player, opponent):
+    return {"users": [{"_id": player}, {"_id": opponent}], "started_at": 1758207817}
+
+
+def chest(player):
+    return {"user": {"_id": player}, "chest": {"type": "daily"}, "open_at": 1758207817}
+
+
+def feed_all(assembler, records):
+    ready = []
+    for record in records:
+        ready.extend(assembler.feed(record))
+    return ready + assembler.flush()
+
+
+def test_raw_records_are_split_at_player_boundary_after_limit():
+    records = [game("a", "x"), game("a", "y"), game("a", "z"), chest("a"),
+               game("b", "x"), chest("b"), game("c", "y")]
+
+    requests = feed_all(RequestAssembler(max_rows=2), records)
+
+    # после лимита запрос закрывается только на записи другого игрока: игрок не делится между запросами
+    assert [(len(games), len(chests)) for _, _, games, chests, *_ in requests] == [(3, 1), (1, 1), (1, 0)]
+    assert [index for index, *_ in requests] == [0, 1, 2]
+
+
+def largest_request(records, max_rows, max_request_rows):
+    assembler = RequestAssembler(max_rows=max_rows, max_request_rows=max_request_rows)
+    largest = 0
+    ready = []
+    for record in records:
+        ready.extend(assembler.feed(record))
+        largest = max(largest, len(assembler._games) + len(assembler._chests))
+    return largest, ready + assembler.flush()
+
+
+def test_raw_records_memory_is_bounded():
+    # выгрузка по игрокам: лимит плюс записи одного игрока
+    largest, _ = largest_request([game(f"p{i // 10}", f"x{i}") for i in range(10_000)], 100, 300)
+    assert largest <= 110
+    # записи без смены игрока (общий соперник у всех игр): не больше предела, дальше - ошибка запроса
+    largest, requests = largest_request([game(f"p{i // 10}", "x") for i in range(10_000)], 100, 300)
+    assert largest <= 300
+    assert len(requests) == 1
+    assert isinstance(requests[0][2], RequestTooLarge)
+
+
+def test_one_player_is_not_split_across_requests(model_path):
+    # записей одного игрока больше двойного лимита: один запрос, одна строка на игрока
+    records = [game("a", f"x{i}") for i in range(25)] + [chest("a")] + [game("b", "y")]
+    lines = [json.dumps(record) for record in records]
+
+    requests = feed_all(RequestAssembler(max_rows=10), records)
+    out = list(score_lines(lines, model_path, chunk_rows=10))
+
+    assert [(len(games), len(chests)) for _, _, games, chests, *_ in requests] == [(25, 1), (1, 0)]
+    assert [line["player_id"] for line in out].count("a") == 1
+
+
+def test_too_large_request_gets_one_error_line(model_path):
+    records = [game("a", f"x{i}") for i in range(30)] + [game("b", "y")]
+    lines = [json.dumps(record) for record in records]
+
+    out = list(score_lines(lines, model_path, chunk_rows=10, max_request_rows=20))
+
+    assert out[0]["request"] == 0 and out[0]["error"].startswith("Request too large: 30 records")
+    assert [line.get("player_id") for line in out[1:]] == ["b", "y"]
+
+
+def test_request_lines_close_pending_records():
+    records = [game("a", "x"), {"id": "r", "games": [game("b", "y")], "chests": []}, {}, game("c", "z")]
+
+    requests = feed_all(RequestAssembler(), records)
+
+    assert [(request_id, len(games)) for _, request_id, games, *_ in requests] == [(None, 1), ("r", 1), (None, 1)]
+
+
+def test_every_request_gets_an_output_line():
+    items = [(0, "empty", [], [], None), (1, None, [], [], None), (2, "err", [], [], None)]
+
+    lines = format_results(items, [{}, {"p": 0.25}, ValueError("boom")])
+
+    assert lines == [
+        {"request": 0, "id": "empty", "error": "No players scored"},
+        {"request": 1, "player_id": "p", "prob_churn": 0.25},
+        {"request": 2, "id": "err", "error": "boom"},
+    ]
+
+
+def test_score_lines_answers_each_request(model_path, records, players_with_chests):
+    lines = []
+    for player in players_with_chests[:3]:
+        games, chests = records(player)
+        lines.append(json.dumps({"id": player, "games": games, "chests": chests}))
+    # игры только с невалидными id: игроков нет, но строка ответа есть
+    lines.append(json.dumps({"id": "nobody", "games": [{"users.0._id": "unknown", "users.1._id": "unknown"}]}))
+    lines.append("not json")
+
+    out = list(score_lines(lines, model_path))
+
+    answered = {line.get("id") for line in out if "request" in line}
+    assert answered == set(players_with_chests[:3]) | {"nobody"}
+    assert {"request": 3, "id": "nobody", "error": "No players scored"} in out
+    assert any(line.get("line") == 5 and "error" in line for line in out)
+    for player in players_with_chests[:3]:
+        assert any(line.get("id") == player and line.get("player_id") == player for line in out)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+import tune
+
+
+@pytest.fixture
+def fold_data(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = (X[:, 0] + rng.normal(scale=0.5, size=400) > 0).astype(np.int64)
+    np.save(tmp_path / "X.npy", X)
+    np.save(tmp_path / "y.npy", y)
+    tune._init_worker(str(tmp_path / "X.npy"), str(tmp_path / "y.npy"))
+    return X, y
+
+
+def test_stopping_split_partitions_fold_train(fold_data):
+    _, y = fold_data
+    train_idx = np.arange(0, 400, 2)
+
+    fit_idx, stop_idx = tune.stopping_split(train_idx, y, 0.2, seed=0)
+
+    assert sorted(np.concatenate([fit_idx, stop_idx]).tolist()) == train_idx.tolist()
+    assert len(stop_idx) == 40
+    assert y[stop_idx].mean() == pytest.approx(y[train_idx].mean(), abs=0.05)
+
+
+def test_early_stopping_never_sees_the_scored_fold(monkeypatch, fold_data):
+    X, y = fold_data
+    seen = {}
+
+    class RecordingClassifier(tune.LGBMClassifier):
+        def fit(self, X, y, eval_set=None, **kwargs):
+            seen["eval_set"] = eval_set
+            return super().fit(X, y, eval_set=eval_set, **kwargs)
+
+    monkeypatch.setattr(tune, "LGBMClassifier", RecordingClassifier)
+    train_idx, valid_idx = np.arange(300), np.arange(300, 400)
+
+    score = tune.run_fold({"num_leaves": 7}, 0, train_idx, valid_idx, n_estimators=50, early_stopping_rounds=5)
+
+    # early stopping - по отложенной части train, valid-фолд только для AUC
+    fit_idx, stop_idx = tune.stopping_split(train_idx, y, tune.EARLY_STOPPING_FRACTION, 0)
+    (X_stop, y_stop), = seen["eval_set"]
+    expected = StandardScaler().fit(X[fit_idx]).transform(X[stop_idx])
+    np.testing.assert_allclose(X_stop, expected)
+    np.testing.assert_array_equal(y_stop, y[stop_idx])
+    assert 0.5 < score["auc"] <= 1.0
@@ -1,68 +1,113 @@
+import argparse
 import pandas as pd
 import numpy as np
 import joblib
+import config
+from artifact import export_artifact, is_artifact, load_artifact
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
+from feature_store import FeatureStore
 from pipeline import ChurnPipeline
-from utils import make_churn_labels
+from preprocess import epoch_to_datetime
+from utils import churn_from_last_games, last_game_dates
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
 
-games_df = pd.read_csv('data/online-games.csv')
-chests_df = pd.read_csv('data/chests.csv')
-games_df['started_at_dt'] = pd.to_datetime(games_df['started_at'], unit='s', errors='coerce').dt.tz_localize(None)
+# обучение: фичи игроков строятся один раз и делятся на train/test.
+#   python train.py                          - вся история из GAMES_DATA/CHESTS_DATA
+#   python train.py --store train_features.db
+#       агрегаты игроков копятся в FeatureStore; из выгрузки читаются только игры и сундуки
+#       новее сохранённых отметок, фичи и метки собираются из агрегатов
+#   python train.py --store train_features.db --warm-start churn_pipeline.pkl
+#       вдобавок модель не учится заново: к бустеру предыдущей достраиваются --warm-trees деревьев
+#       на игроках, активных за последние --recent-days дней; scaler и признаки - прежние
+parser = argparse.ArgumentParser()
+parser.add_argument("--store", help="SQLite с агрегатами игроков для инкрементального обучения")
+parser.add_argument("--lookback-days", type=float, default=1.0,
+                    help="игры перечитываются с отметки минус столько дней (опоздавшие игры; дубли отсекаются по _id)")
+parser.add_argument("--warm-start", metavar="MODEL", help="предыдущая модель: pkl или каталог артефакта")
+parser.add_argument("--warm-trees", type=int, default=50)
+parser.add_argument("--recent-days", type=int, default=120)
+args = parser.parse_args()
+
+WINDOW_DAYS = 60
+
+
+def full_history():
+    # только колонки, которые нужны препроцессорам
+    games_df = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS)
+    chests_df = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS)
+    games_df['started_at_dt'] = epoch_to_datetime(games_df['started_at'])
+    X = ChurnPipeline.aggregate_features_for_split(games_df, chests_df)
+    return X, last_game_dates(games_df)
+
+
+def from_store(path):
+    store = FeatureStore(path)
+    try:
+        games_start = store.watermark("games")
+        chests_start = store.watermark("chests")
+        if games_start is not None:
+            games_start = pd.Timestamp(games_start, unit='s') - pd.Timedelta(days=args.lookback_days)
+        if chests_start is not None:
+            # у сундуков нет id для отсева дублей: строго после отметки (open_at - целые секунды)
+            chests_start = pd.Timestamp(chests_start + 1, unit='s')
+        # игры без started_at в окно не попадают, читаются всегда и отсекаются по _id
+        games_df = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS + ["_id"], start=games_start, undated=True)
+        chests_df = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS, start=chests_start)
+        print(f"New since watermark: {store.update(games_df, chests_df)}")
+        del games_df, chests_df
+
+        X = store.features()
+        X.replace([np.inf, -np.inf], 0, inplace=True)
+        X.fillna(0, inplace=True)
+        return X, store.last_games()
+    finally:
+        store.close()
+
+
+X, last_games = from_store(args.store) if args.store else full_history()
+X.index = X.index.astype(str)
 
 # метки
-churn_labels = make_churn_labels(games_df, window_days=60)
-churn_labels['player_id'] = churn_labels['player_id'].astype(str)
+churn_labels = churn_from_last_games(last_games, window_days=WINDOW_DAYS)
 churn_labels.set_index('player_id', inplace=True)
 
-# сплит
-X = ChurnPipeline.aggregate_features_for_split(games_df, chests_df)
-X.index = X.index.astype(str)
-
 y = churn_labels['churn'].reindex(X.index)
 mask = y.notna()
+if args.warm_start:
+    # дообучение только на недавней когорте: у неё метки успели измениться
+    last_dates = last_games.set_index(last_games['player_id'].astype(str))['last_game_date']
+    recent_from = last_dates.max() - pd.Timedelta(days=args.recent_days)
+    mask &= (last_dates.reindex(X.index) >= recent_from).to_numpy()
 X = X.loc[mask]
 y = y.loc[mask]
 
+# сплит
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
 
-X_train.index = X_train.index.astype(str)
-X_test.index = X_test.index.astype(str)
-y_train.index = y_train.index.astype(str)
-y_test.index = y_test.index.astype(str)
-
 # веса
 pos = y_train.sum()
 neg = len(y_train) - pos
 scale_pos_weight = neg / pos if pos > 0 else 1.0
 
-# raw
-train_ids = X_train.index.tolist()
-test_ids = X_test.index.tolist()
-
-def filter_games(df, ids):
-    return df[
-        df['users.0._id'].astype(str).isin(ids) |
-        df['users.1._id'].astype(str).isin(ids)
-    ]
-
-games_train = filter_games(games_df, train_ids)
-games_test = filter_games(games_df, test_ids)
-chests_train = chests_df[chests_df['user._id'].astype(str).isin(train_ids)]
-chests_test = chests_df[chests_df['user._id'].astype(str).isin(test_ids)]
+# строки в порядке X, как после join препроцессоров
+X_train = X.loc[X.index.isin(X_train.index)]
+X_test = X.loc[X.index.isin(X_test.index)]
+# колонки сундуков, которых нет ни у одного игрока train, при обучении на сырых играх не возникают
+counts = [c for c in X.columns if c.startswith(("chest_", "open_with_")) and c != "open_with_paid"]
+X_train = X_train.drop(columns=[c for c in counts if not X_train[c].any()])
 
 # train
 pipeline = ChurnPipeline(scale_pos_weight=scale_pos_weight)
-pipeline.fit(games_train, chests_train, y_train)
+previous = None
+if args.warm_start:
+    previous = load_artifact(args.warm_start) if is_artifact(args.warm_start) else joblib.load(args.warm_start)
+    pipeline.model.set_params(n_estimators=args.warm_trees)
+pipeline.fit_features(X_train, y_train, init_from=previous)
 
 # pred
-X_test_final = pipeline.transform(games_test, chests_test)
-X_test_final.index = X_test_final.index.astype(str)
-y_test.index = y_test.index.astype(str)
-
-common_ids = X_test_final.index.intersection(y_test.index)
-X_test_final = X_test_final.loc[common_ids]
-y_test_final = y_test.loc[common_ids]
+X_test_final = pipeline.transform_features(X_test)
+y_test_final = y_test.loc[X_test_final.index]
 
 # results
 y_pred = pipeline.model.predict(X_test_final)
@@ -74,4 +119,6 @@ print(f"ROC AUC: {roc_auc_score(y_test_final, y_proba):.4f}")
 
 # сейвим обученный пайплайн
 joblib.dump(pipeline, 'churn_pipeline.pkl')
-print('Model is learned, tested, and saved')
\ No newline at end of file
+# тот же пайплайн в формате без pickle (MODEL_PATH=churn_model)
+export_artifact(pipeline, 'churn_model')
+print('Model is learned, tested, and saved')
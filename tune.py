@@ -0,0 +1,222 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMClassifier
+from scipy.stats import loguniform, randint, uniform
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+import config
+from artifact import export_artifact
+from columnar import CHESTS_FEATURE_COLUMNS, GAMES_FEATURE_COLUMNS, load_chests, load_games
+from feature_store import FeatureStore
+from pipeline import ChurnPipeline
+from preprocess import epoch_to_datetime
+from utils import churn_from_last_games, last_game_dates
+
+logger = logging.getLogger(__name__)
+
+# подбор гиперпараметров LightGBM: фичи игроков считаются один раз, сохраняются в .npy
+# и открываются воркерами через mmap (страницы общие, без копии матрицы на процесс).
+# Каждая пара (параметры, фолд) - отдельная задача пула; внутри задачи LightGBM в один поток,
+# поэтому время растёт обратно числу процессов. Сплит train/test тот же, что в train.py:
+# CV идёт на train-части, лучшая модель дообучается на ней целиком и проверяется на test.
+# Early stopping в фолде - по отложенной доле его train-части: valid-фолд, по которому считается
+# AUC, в выборе числа деревьев не участвует, иначе оценка завышена и ранжирование кандидатов сбито.
+#   python tune.py --workers 8
+#   python tune.py --search random --n-iter 40 --workers 8
+
+WINDOW_DAYS = 60
+EARLY_STOPPING_FRACTION = 0.2
+BASE_PARAMS = {"random_state": 42, "metric": "auc", "subsample_freq": 1, "verbose": -1}
+
+PARAM_GRID = {
+    "learning_rate": [0.01, 0.03, 0.1],
+    "num_leaves": [15, 31, 63],
+    "min_child_samples": [10, 20, 50],
+    "colsample_bytree": [0.7, 1.0],
+}
+PARAM_DISTRIBUTIONS = {
+    "learning_rate": loguniform(0.005, 0.2),
+    "num_leaves": randint(7, 128),
+    "min_child_samples": randint(5, 100),
+    "colsample_bytree": uniform(0.5, 0.5),
+    "subsample": uniform(0.5, 0.5),
+    "reg_lambda": loguniform(1e-3, 10.0),
+}
+
+_X = None
+_y = None
+
+
+def load_features(store=None):
+    # фичи и метки как в train.py: из выгрузки (GAMES_DATA/CHESTS_DATA) или готовые агрегаты FeatureStore
+    if store:
+        feature_store = FeatureStore(store)
+        try:
+            X, last_games = feature_store.features(), feature_store.last_games()
+        finally:
+            feature_store.close()
+    else:
+        games_df = load_games(config.GAMES_DATA, GAMES_FEATURE_COLUMNS)
+        chests_df = load_chests(config.CHESTS_DATA, CHESTS_FEATURE_COLUMNS)
+        games_df['started_at_dt'] = epoch_to_datetime(games_df['started_at'])
+        X = ChurnPipeline.aggregate_features_for_split(games_df, chests_df)
+        last_games = last_game_dates(games_df)
+    X = X.replace([np.inf, -np.inf], 0).fillna(0)
+    X.index = X.index.astype(str)
+
+    y = churn_from_last_games(last_games, window_days=WINDOW_DAYS).set_index('player_id')['churn'].reindex(X.index)
+    mask = y.notna()
+    return X.loc[mask], y.loc[mask].astype(int)
+
+
+def candidates(search, n_iter, seed):
+    if search == "grid":
+        return list(ParameterGrid(PARAM_GRID))
+    # значения numpy -> python, чтобы параметры читались в логе и csv
+    return [{k: v.item() if hasattr(v, "item") else v for k, v in params.items()}
+            for params in ParameterSampler(PARAM_DISTRIBUTIONS, n_iter, random_state=seed)]
+
+
+def _init_worker(x_path, y_path):
+    global _X, _y
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+
+
+def stopping_split(train_idx, y, fraction, seed):
+    # train-часть фолда -> (строки для деревьев, строки для early stopping), со стратификацией
+    fit_idx, stop_idx = train_test_split(train_idx, test_size=fraction, stratify=y[train_idx], random_state=seed)
+    return np.sort(fit_idx), np.sort(stop_idx)
+
+
+def run_fold(params, fold, train_idx, valid_idx, n_estimators, early_stopping_rounds,
+             stopping_fraction=EARLY_STOPPING_FRACTION):
+    # фолд как в ChurnPipeline.fit: scaler и scale_pos_weight - по строкам, на которых строятся деревья
+    fit_idx, stop_idx = stopping_split(train_idx, _y, stopping_fraction, fold)
+    X_train, y_train = _X[fit_idx], _y[fit_idx]
+    X_stop, y_stop = _X[stop_idx], _y[stop_idx]
+    X_valid, y_valid = _X[valid_idx], _y[valid_idx]
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_stop = scaler.transform(X_stop)
+    X_valid = scaler.transform(X_valid)
+
+    pos = y_train.sum()
+    model = LGBMClassifier(**BASE_PARAMS, **params, n_estimators=n_estimators, n_jobs=1,
+                           scale_pos_weight=(len(y_train) - pos) / pos if pos > 0 else 1.0)
+    start = time.perf_counter()
+    model.fit(X_train, y_train, eval_set=[(X_stop, y_stop)],
+              callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)])
+    proba = model.predict_proba(X_valid)[:, 1]
+    return {
+        "fold": fold,
+        "auc": roc_auc_score(y_valid, proba),
+        "best_iteration": model.best_iteration_ or n_estimators,
+        "fit_s": time.perf_counter() - start,
+    }
+
+
+def cross_validate(X, y, param_list, folds=5, workers=4, n_estimators=2000, early_stopping_rounds=100,
+                   stopping_fraction=EARLY_STOPPING_FRACTION):
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
+    tasks = [(i, fold, train_idx, valid_idx) for i in range(len(param_list))
+             for fold, (train_idx, valid_idx) in enumerate(splits)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        x_path, y_path = os.path.join(tmp, "X.npy"), os.path.join(tmp, "y.npy")
+        np.save(x_path, np.ascontiguousarray(X, dtype=np.float64))
+        np.save(y_path, np.asarray(y, dtype=np.int64))
+
+        if workers <= 1:
+            _init_worker(x_path, y_path)
+            scores = [run_fold(param_list[i], fold, tr, va, n_estimators, early_stopping_rounds, stopping_fraction)
+                      for i, fold, tr, va in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(x_path, y_path)) as executor:
+                futures = [executor.submit(run_fold, param_list[i], fold, tr, va, n_estimators,
+                                           early_stopping_rounds, stopping_fraction)
+                           for i, fold, tr, va in tasks]
+                scores = [future.result() for future in futures]
+
+    rows = []
+    for (i, _, _, _), score in zip(tasks, scores):
+        rows.append({"candidate": i, **score})
+    per_fold = pd.DataFrame(rows)
+    summary = per_fold.groupby("candidate").agg(
+        auc_mean=("auc", "mean"), auc_std=("auc", "std"),
+        best_iteration=("best_iteration", "mean"), fit_s=("fit_s", "sum"),
+    )
+    summary["best_iteration"] = summary["best_iteration"].round().astype(int)
+    summary["params"] = [param_list[i] for i in summary.index]
+    return summary.sort_values("auc_mean", ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор гиперпараметров ChurnPipeline кросс-валидацией")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=30, help="число кандидатов для --search random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--n-estimators", type=int, default=2000, help="потолок числа деревьев при early stopping")
+    parser.add_argument("--early-stopping-rounds", type=int, default=100)
+    parser.add_argument("--early-stopping-fraction", type=float, default=EARLY_STOPPING_FRACTION,
+                        help="доля train-части фолда, отложенная для early stopping")
+    parser.add_argument("--store", help="брать фичи из FeatureStore (train.py --store) вместо выгрузки")
+    parser.add_argument("--results", default="tune_results.csv")
+    parser.add_argument("--output", default="churn_pipeline.pkl")
+    parser.add_argument("--artifact", default="churn_model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    X, y = load_features(args.store)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+    # строки в порядке X, как в train.py
+    X_train = X.loc[X.index.isin(X_train.index)]
+    y_train = y.loc[X_train.index]
+
+    param_list = candidates(args.search, args.n_iter, args.seed)
+    logger.info(f"{len(param_list)} candidates x {args.folds} folds on {args.workers} workers, "
+                f"{X_train.shape[0]} players x {X_train.shape[1]} features")
+    start = time.perf_counter()
+    summary = cross_validate(X_train.to_numpy(dtype=np.float64), y_train.to_numpy(), param_list, args.folds,
+                             args.workers, args.n_estimators, args.early_stopping_rounds,
+                             args.early_stopping_fraction)
+    logger.info(f"CV done in {time.perf_counter() - start:.1f}s")
+    summary.to_csv(args.results)
+
+    print(summary.head(10).to_string())
+    best = summary.iloc[0]
+    print(f"Best CV ROC AUC: {best['auc_mean']:.4f} +- {best['auc_std']:.4f}, "
+          f"{best['best_iteration']} trees, {best['params']}")
+
+    # лучшая модель: вся train-часть, число деревьев - среднее по фолдам
+    pos = y_train.sum()
+    pipeline = ChurnPipeline(scale_pos_weight=(len(y_train) - pos) / pos if pos > 0 else 1.0)
+    pipeline.model.set_params(**{k: v for k, v in BASE_PARAMS.items() if k != "metric"}, **best["params"],
+                              n_estimators=int(best["best_iteration"]))
+    pipeline.fit_features(X_train, y_train)
+
+    X_test_final = pipeline.transform_features(X_test)
+    y_proba = pipeline.model.predict_proba(X_test_final)[:, 1]
+    print(f"Test ROC AUC: {roc_auc_score(y_test.loc[X_test_final.index], y_proba):.4f}")
+
+    joblib.dump(pipeline, args.output)
+    export_artifact(pipeline, args.artifact)
+    print(f"Saved {args.output} and {args.artifact}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
+import numpy as np
 import pandas as pd
 
+from preprocess import NAT, player_ids
+
+DAY_NS = 86_400 * 10 ** 9
+
+
 def make_churn_labels(df_cleaned, window_days=60, reference_date=None):
     if reference_date is None:
         reference_date = df_cleaned['started_at_dt'].max()
-    if hasattr(reference_date, 'tzinfo') and reference_date.tzinfo is not None:
-        reference_date = reference_date.tz_localize(None)
     if pd.api.types.is_datetime64tz_dtype(df_cleaned['started_at_dt']):
         df_cleaned['started_at_dt'] = df_cleaned['started_at_dt'].dt.tz_localize(None)
 
+    return churn_from_last_games(last_game_dates(df_cleaned), window_days, reference_date)
+
+
+def last_game_dates(df_cleaned):
     tmp = (
         df_cleaned
         .melt(id_vars=['started_at_dt'],
@@ -20,18 +28,72 @@ def make_churn_labels(df_cleaned, window_days=60, reference_date=None):
     invalid_ids = ['unknown', 'nan', 'none']
     tmp = tmp[~tmp['player_id'].astype(str).str.lower().str.strip().isin(invalid_ids)]
 
-    last_games = (
+    return (
         tmp
         .groupby('player_id', as_index=False)['started_at_dt']
         .max()
         .rename(columns={'started_at_dt': 'last_game_date'})
     )
 
+
+def churn_from_last_games(last_games, window_days=60, reference_date=None):
+    # last_games: player_id, last_game_date (как из last_game_dates или FeatureStore.last_games)
+    last_games = last_games.copy()
     if pd.api.types.is_datetime64tz_dtype(last_games['last_game_date']):
         last_games['last_game_date'] = last_games['last_game_date'].dt.tz_localize(None)
+    if reference_date is None:
+        reference_date = last_games['last_game_date'].max()
+    if hasattr(reference_date, 'tzinfo') and reference_date.tzinfo is not None:
+        reference_date = reference_date.tz_localize(None)
 
     last_games['days_since_last_game'] = (reference_date - last_games['last_game_date']).dt.days
     last_games['churn'] = (last_games['days_since_last_game'] > window_days).astype(int)
     last_games['player_id'] = last_games['player_id'].astype(str)
 
-    return last_games[['player_id', 'churn']]
\ No newline at end of file
+    return last_games[['player_id', 'churn']]
+
+
+def make_churn_labels_multi(df_cleaned, reference_dates, windows=(60,)):
+    # метки сразу для многих дат отсчёта и окон: игры один раз сортируются по времени,
+    # для каждой даты searchsorted даёт префикс игр до неё, а последняя игра игрока
+    # докатывается по приросту префикса. Для reference_date совпадает с make_churn_labels
+    # на играх до этой даты; игроки без игр с известным started_at не попадают
+    started = df_cleaned['started_at_dt']
+    if pd.api.types.is_datetime64tz_dtype(started):
+        started = started.dt.tz_localize(None)
+    started = started.to_numpy(dtype='datetime64[ns]').view('int64')
+    ids0, valid0 = player_ids(df_cleaned['users.0._id'])
+    ids1, valid1 = player_ids(df_cleaned['users.1._id'])
+    times = np.concatenate([started[valid0], started[valid1]])
+    codes, players = pd.factorize(np.concatenate([ids0, ids1]), sort=True)
+
+    dated = times != NAT
+    order = np.argsort(times[dated], kind='stable')
+    times, codes = times[dated][order], codes[dated][order]
+
+    references = pd.DatetimeIndex(pd.to_datetime(reference_dates)).tz_localize(None).sort_values().unique()
+    windows = np.asarray(sorted(set(windows)), dtype='int64')
+    ends = np.searchsorted(times, references.asi8, side='right')
+
+    last = np.full(len(players), NAT, dtype='int64')
+    frames = []
+    prev = 0
+    for reference, end in zip(references, ends):
+        # игры (prev, end] уже отсортированы по времени: последняя по игроку - последнее вхождение
+        if end > prev:
+            chunk_codes = codes[prev:end][::-1]
+            uniq, first = np.unique(chunk_codes, return_index=True)
+            last[uniq] = times[prev:end][::-1][first]
+            prev = end
+        seen = np.flatnonzero(last != NAT)
+        days = (reference.value - last[seen]) // DAY_NS
+        frames.append(pd.DataFrame({
+            'player_id': np.tile(players[seen], len(windows)),
+            'reference_date': reference,
+            'window_days': np.repeat(windows, len(seen)),
+            'days_since_last_game': np.tile(days, len(windows)),
+            'churn': (np.tile(days, len(windows)) > np.repeat(windows, len(seen))).astype(int),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['player_id', 'reference_date', 'window_days', 'days_since_last_game', 'churn'])
+    return pd.concat(frames, ignore_index=True)